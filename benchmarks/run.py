@@ -0,0 +1,333 @@
+"""
+Stallion benchmark suite.
+
+It measures the Stallion hot paths against synthetic environments with
+different numbers of installed distributions and saves the results as
+JSON, so the results of different commits can be compared:
+
+    $ python benchmarks/run.py --sizes 10,1000 --output before.json
+    $ python benchmarks/run.py --sizes 10,1000 --compare before.json
+"""
+import os
+import sys
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from stallion import main
+from stallion import console
+from stallion import render
+from stallion import storage
+from stallion import metadata
+from stallion import backends
+from stallion import pypi
+from stallion import updates
+from stallion import depgraph
+from stallion.distindex import DistributionIndex
+from stallion.snapshot import DistributionSnapshot
+from stallion.entrypoints import EntryPointIndex
+from stallion.depgraph import DependencyGraph
+
+DESCRIPTION_LINE = '        Some description text of the package, ``code`` and *emphasis*.\n'
+
+PKG_INFO_TEMPLATE = '''Metadata-Version: 1.1
+Name: %(name)s
+Version: %(version)s
+Summary: Synthetic package number %(number)d
+Home-page: http://example.com/%(name)s
+Author: Stallion Benchmarks
+Author-email: stallion@example.com
+License: BSD
+Description: %(name)s
+        %(underline)s
+        
+%(description)s
+Platform: UNKNOWN
+Classifier: Development Status :: 5 - Production/Stable
+Classifier: License :: OSI Approved :: BSD License
+Classifier: Programming Language :: Python :: 2
+Classifier: Topic :: Software Development :: Libraries :: Python Modules
+'''
+
+ENTRY_POINTS_TEMPLATE = '''[console_scripts]
+%(name)s = %(name)s.cli:main
+'''
+
+REQUIRES_TEMPLATE = '''%(previous)s>=1.0
+%(half)s<2.0,>=1.0
+
+[test]
+pytest
+'''
+
+
+def make_environment(path, size):
+    """ Creates a site directory with `size` synthetic distributions.
+
+    :param path: the site directory
+    :param size: the number of distributions
+    :rtype: list
+    :return: the distribution names
+    """
+    names = []
+    for number in range(size):
+        name = 'synthpkg%05d' % number
+        version = '1.%d' % (number % 50)
+        lines = 20 if number % 10 else 2000
+        egg_info = os.path.join(path, '%s-%s.egg-info' % (name, version))
+        os.mkdir(egg_info)
+
+        f = open(os.path.join(egg_info, 'PKG-INFO'), 'w')
+        f.write(PKG_INFO_TEMPLATE % {
+            'name': name, 'version': version, 'number': number,
+            'underline': '=' * len(name),
+            'description': DESCRIPTION_LINE * lines})
+        f.close()
+
+        if number > 0:
+            f = open(os.path.join(egg_info, 'requires.txt'), 'w')
+            f.write(REQUIRES_TEMPLATE % {'previous': names[number - 1],
+                                         'half': names[number // 2]})
+            f.close()
+
+        if number % 10 == 0:
+            f = open(os.path.join(egg_info, 'entry_points.txt'), 'w')
+            f.write(ENTRY_POINTS_TEMPLATE % {'name': name})
+            f.close()
+
+        names.append(name)
+    return names
+
+
+def measure(func, repeat):
+    """ Runs the function `repeat` times.
+
+    :rtype: dict
+    :return: the min, median and mean times in seconds
+    """
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    times.sort()
+    return {'repeat': repeat, 'min': times[0],
+            'median': times[len(times) // 2], 'mean': sum(times) / len(times)}
+
+
+def metadata_corpus(dist_index):
+    """ Returns the raw metadata of the installed distributions plus the
+    synthetic ones.
+    """
+    corpus = []
+    for dist in DistributionIndex().distributions() + dist_index.distributions():
+        try:
+            corpus.append(metadata.get_metadata_text(dist))
+        except Exception:
+            pass
+    return corpus
+
+
+def quiet(func):
+    """ Runs the function discarding what it prints. """
+    def wrapper():
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            func()
+        finally:
+            sys.stdout = stdout
+    return wrapper
+
+
+def run_size(size, repeat, results):
+    """ Runs the benchmarks against an environment of `size` distributions. """
+    site_dir = tempfile.mkdtemp(prefix='stallion-site-')
+    home_dir = tempfile.mkdtemp(prefix='stallion-home-')
+    saved_index = main.DIST_INDEX
+    saved_graph = main.DEP_GRAPH
+    saved_fetcher = main.PYPI_FETCHER
+    saved_store = main.UPDATE_STORE
+    saved_snapshot = console.DistributionSnapshot
+    saved_entry_points = main.ENTRY_POINT_INDEX
+    saved_home = os.environ.get(storage.STALLION_HOME_ENV)
+
+    def record(name, func, times=repeat):
+        result = measure(func, times)
+        result.update({'name': name, 'size': size})
+        results.append(result)
+        sys.stderr.write('  %-32s %8.4fs (median of %d)\n' %
+                         (name, result['median'], times))
+
+    try:
+        names = make_environment(site_dir, size)
+        os.environ[storage.STALLION_HOME_ENV] = home_dir
+        sys.stderr.write('%d distributions\n' % size)
+
+        record('dist_index_full_scan', lambda: DistributionIndex([site_dir]).refresh())
+
+        dist_index = DistributionIndex([site_dir])
+        dist_index.refresh()
+        record('dist_index_refresh_unchanged', dist_index.refresh)
+
+        corpus = metadata_corpus(dist_index)
+
+        def parse_corpus():
+            for pkg_metadata in corpus:
+                parsed, key_known = metadata.parse_metadata(pkg_metadata)
+                metadata.metadata_to_dict(parsed, key_known)
+        record('parse_metadata_corpus', parse_corpus)
+
+        huge = DESCRIPTION_LINE * (size * 20)
+        record('clean_lead_ws_description', lambda:
+               metadata.clean_lead_ws_description(huge, 'description'))
+
+        # The views and plp only see the synthetic environment
+        main.DIST_INDEX = DistributionIndex([site_dir])
+        main.DEP_GRAPH = DependencyGraph(main.DIST_INDEX)
+        main.PYPI_FETCHER = pypi.ReleaseFetcher(backends.FakeIndex(
+            dict((name, ['1.0', '2.0']) for name in names)))
+        # The store creates its tables once, in the home of this size
+        main.UPDATE_STORE = updates.UpdateStore()
+        console.DistributionSnapshot = lambda: DistributionSnapshot(path=[site_dir])
+        main.ENTRY_POINT_INDEX = EntryPointIndex(DistributionSnapshot(path=[site_dir]))
+        client = main.app.test_client()
+
+        def view(url):
+            def get():
+                metadata.METADATA_CACHE.clear()
+                render.RENDER_CACHE.clear()
+                main.PAGE_CACHE.clear()
+                assert client.get(url).status_code == 200
+            return get
+
+        def cached_view(url):
+            etag = client.get(url).headers['ETag']
+            def get():
+                assert client.get(url).status_code == 200
+                assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+            return get
+
+        record('view_index', view('/'))
+        record('view_distribution', view('/distribution/%s' % names[0]))
+        record('view_console_scripts', view('/console_scripts'))
+        record('view_verify', view('/verify'))
+        record('view_distribution_cached_and_304',
+               cached_view('/distribution/%s' % names[0]))
+
+        def verify_cold():
+            depgraph.REQUIREMENT_CACHE.clear()
+            depgraph.MARKER_CACHE.clear()
+            graph = DependencyGraph(dist_index)
+            graph.refresh()
+            graph.problems()
+        record('dep_graph_verify_cold', verify_cold)
+
+        args = {'--compact': True, '--rescan': False, '--jobs': '1',
+                '--format': 'text', '<filter>': None}
+        record('plp_list_compact_cold', quiet(lambda: console.cmd_list(
+            dict(args, **{'--rescan': True}))))
+        record('plp_list_compact_cold_jobs4', quiet(lambda: console.cmd_list(
+            dict(args, **{'--rescan': True, '--jobs': '4'}))))
+        record('plp_list_compact_warm', quiet(lambda: console.cmd_list(args)))
+
+        body = json.dumps({'distributions': names})
+
+        def bulk_update_check():
+            response = client.post('/pypi/check_updates', data=body,
+                                   content_type='application/json')
+            assert response.status_code == 200
+            response.get_data()
+        record('bulk_update_check', bulk_update_check)
+    finally:
+        main.DIST_INDEX = saved_index
+        main.DEP_GRAPH = saved_graph
+        main.PYPI_FETCHER = saved_fetcher
+        main.UPDATE_STORE = saved_store
+        console.DistributionSnapshot = saved_snapshot
+        main.ENTRY_POINT_INDEX = saved_entry_points
+        if saved_home is None:
+            os.environ.pop(storage.STALLION_HOME_ENV, None)
+        else:
+            os.environ[storage.STALLION_HOME_ENV] = saved_home
+        shutil.rmtree(site_dir)
+        shutil.rmtree(home_dir)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=ROOT_DIR).decode('ascii').strip()
+    except Exception:
+        return None
+
+
+def compare(results, previous_file):
+    """ Prints the ratio between the current and the previous medians. """
+    previous = {}
+    for result in json.load(open(previous_file))['results']:
+        previous[(result['name'], result['size'])] = result['median']
+
+    sys.stderr.write('\n%-32s %8s %10s %10s %8s\n' %
+                     ('benchmark', 'size', 'before', 'after', 'ratio'))
+    for result in results:
+        before = previous.get((result['name'], result['size']))
+        if not before:
+            continue
+        sys.stderr.write('%-32s %8d %9.4fs %9.4fs %7.2fx\n' %
+                         (result['name'], result['size'], before,
+                          result['median'], result['median'] / before))
+
+
+def run_main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-s', '--sizes', dest='sizes', default='10,1000,10000',
+                      help='Comma separated numbers of distributions of the '
+                           'synthetic environments. Default is 10,1000,10000.')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5,
+                      help='Runs of each benchmark. Default is 5.')
+    parser.add_option('-o', '--output', dest='output',
+                      default='benchmark-results.json',
+                      help='The JSON results file. '
+                           'Default is benchmark-results.json.')
+    parser.add_option('-c', '--compare', dest='compare', metavar='FILE',
+                      help='A previous JSON results file to compare with.')
+    (options, args) = parser.parse_args()
+
+    results = []
+    for size in [int(s) for s in options.sizes.split(',')]:
+        run_size(size, options.repeat, results)
+
+    report = {'meta': {'python': sys.version.split()[0],
+                       'implementation': platform.python_implementation(),
+                       'platform': platform.platform(),
+                       'git_revision': git_revision(),
+                       'timestamp': time.time()},
+              'results': results}
+
+    f = open(options.output, 'w')
+    json.dump(report, f, indent=2, sort_keys=True)
+    f.close()
+    sys.stderr.write('Results saved to %s\n' % options.output)
+
+    if options.compare:
+        compare(results, options.compare)
+
+if __name__ == '__main__':
+    run_main()
@@ -47,6 +47,10 @@ setup(
       'stallion': ['static/*.*', 'templates/*.*'],
     },
     install_requires=install_requirements,
+    extras_require={
+        # The pre-fork server of the --workers serving mode
+        'production': ['gunicorn>=19.0'],
+    },
     tests_require=['nose'],
     test_suite='nose.collector',
     classifiers=[
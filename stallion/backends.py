@@ -0,0 +1,414 @@
+"""
+.. module:: backends
+   :platform: Unix, Windows
+   :synopsis: Package index backends used to look up the releases.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`backends` -- package index backends
+==================================================================
+"""
+import os
+import re
+import socket
+import threading
+
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from urlparse import urlparse, urljoin
+except ImportError:
+    from urllib.parse import urlparse, urljoin
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+PYPI_XMLRPC = 'http://pypi.python.org/pypi'
+PYPI_JSON = 'https://pypi.org/pypi'
+PYPI_SIMPLE = 'https://pypi.org/simple'
+
+# The PEP-0691 json content type, the html one is the PEP-0503 fallback
+SIMPLE_JSON_TYPE = 'application/vnd.pypi.simple.v1+json'
+
+# Distribution file extensions, the longest ones first
+DIST_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip',
+                   '.whl', '.egg', '.exe', '.msi', '.rpm')
+
+# The start of a version in a file name, like '1.0', 'v2' or '1!2.0'
+VERSION_START_RE = re.compile(r'^v?[0-9]', re.IGNORECASE)
+
+ANCHOR_RE = re.compile(r'<a\s[^>]*>\s*([^<]+?)\s*</a>', re.IGNORECASE)
+
+
+class IndexUnavailable(Exception):
+    """ Raised when the package index answers with an error status, only
+    the server errors (5xx) are worth retrying (see :attr:`retryable`).
+    """
+    def __init__(self, url, status):
+        Exception.__init__(self, 'Index error %d at %s' % (status, url))
+        self.url = url
+        self.status = status
+
+    @property
+    def retryable(self):
+        """ True if the error is a server error. """
+        return self.status >= 500
+
+
+def normalize_name(dist_name):
+    """ Returns the normalized project name, as in the PEP-0503.
+
+    :param dist_name: the distribution name
+    :rtype: string
+    :return: the normalized name
+    """
+    return re.sub(r'[-_.]+', '-', dist_name).lower()
+
+
+def version_from_filename(filename, dist_name):
+    """ Returns the version of a distribution file (wheel, sdist, egg,
+    etc) if it belongs to the distribution.
+
+    :param filename: the file name, like 'Flask-0.10.1.tar.gz'
+    :param dist_name: the distribution name
+    :rtype: string
+    :return: the version or None if the file isn't a release of the
+             distribution
+    """
+    lowered = filename.lower()
+    for extension in DIST_EXTENSIONS:
+        if lowered.endswith(extension):
+            stem = filename[:-len(extension)]
+            break
+    else:
+        return None
+
+    target = normalize_name(dist_name)
+    parts = stem.split('-')
+
+    # The name may be the prefix of a sibling project (ie. 'flask' of
+    # 'flask-login-0.6.2.tar.gz'), so the rest must start with a version
+    for i in range(1, len(parts)):
+        if normalize_name('-'.join(parts[:i])) == target and \
+                VERSION_START_RE.match(parts[i]):
+            return parts[i]
+
+    return None
+
+
+def get_proxy(url=PYPI_XMLRPC, timeout=None):
+    """ Returns a RPC ServerProxy whose connections use a timeout.
+
+    :param url: the XML-RPC url
+    :param timeout: the timeout in seconds of each request, None to block
+    :rtype: xmlrpclib.ServerProxy
+    :return: the RPC ServerProxy
+    """
+    if url.startswith('https'):
+        base = xmlrpclib.SafeTransport
+    else:
+        base = xmlrpclib.Transport
+
+    class TimeoutTransport(base):
+        def make_connection(self, host):
+            conn = base.make_connection(self, host)
+            conn.timeout = timeout
+            return conn
+
+    return xmlrpclib.ServerProxy(url, transport=TimeoutTransport())
+
+
+class ConnectionPool(object):
+    """ A thread-safe pool of HTTP keep-alive connections, the idle
+    connections are kept per scheme and host.
+    """
+    def __init__(self, timeout=10.0, maxsize=8):
+        """ Instantiates a new pool.
+
+        :param timeout: the timeout in seconds of each request
+        :param maxsize: the maximum number of idle connections per host
+        """
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+
+        scheme, netloc = key
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        return httplib.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, url, headers=None, redirects=3):
+        """ Sends a GET request, reusing an idle connection to the host.
+
+        :param url: the url
+        :param headers: the request headers
+        :param redirects: the maximum number of redirects followed
+        :rtype: tuple
+        :return: (status, content_type, body)
+        """
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        # An idle connection may have been closed by the server
+        for attempt in (0, 1):
+            conn = self._acquire(key)
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                if attempt:
+                    raise
+
+        if (response.getheader('connection') or '').lower() == 'close':
+            conn.close()
+        else:
+            self._release(key, conn)
+
+        location = response.getheader('location')
+        if response.status in (301, 302, 303, 307, 308) and location and redirects:
+            return self.get(urljoin(url, location), headers, redirects - 1)
+
+        return (response.status, response.getheader('content-type') or '', body)
+
+
+class PackageIndex(object):
+    """ The base class of the package index backends. """
+
+    @property
+    def location(self):
+        """ The identifier of the index, the release cache keeps the
+        releases of each index apart.
+        """
+        return self.__class__.__name__
+
+    def releases(self, dist_name):
+        """ Returns the releases of a distribution available at the index.
+
+        :param dist_name: the distribution name
+        :rtype: list
+        :return: a list of version strings, empty if not found
+        """
+        raise NotImplementedError
+
+    def search(self, spec, operator='or'):
+        """ Searches the index, see the :func:`stallion.main.get_pypi_search`.
+
+        :param spec: dict with the search spec
+        :param operator: 'and' or 'or'
+        :rtype: list
+        :return: a list of dicts with the name, version and summary
+        """
+        raise NotImplementedError('%s does not support searching' %
+                                  self.__class__.__name__)
+
+
+class XmlRpcIndex(PackageIndex):
+    """ The PyPI XML-RPC API, each thread keeps its ServerProxy so the
+    connection is reused between calls.
+    """
+    def __init__(self, url=PYPI_XMLRPC, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def location(self):
+        return 'xmlrpc+' + self.url
+
+    def _proxy(self):
+        proxy = getattr(self._local, 'proxy', None)
+        if proxy is None:
+            proxy = self._local.proxy = get_proxy(self.url, self.timeout)
+        return proxy
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self._proxy(), method)(*args)
+        except Exception:
+            # Don't reuse a connection in an unknown state
+            self._local.proxy = None
+            raise
+
+    def releases(self, dist_name):
+        show_hidden = True
+        ret = self._call('package_releases', dist_name, show_hidden)
+
+        if not ret:
+            ret = self._call('package_releases', dist_name.capitalize(), show_hidden)
+
+        return list(ret or [])
+
+    def search(self, spec, operator='or'):
+        ret = self._call('search', spec, operator)
+        ret.sort(key=lambda v: v.get('_pypi_ordering', 0), reverse=True)
+        return ret
+
+
+class JsonIndex(PackageIndex):
+    """ The PyPI JSON API ('<url>/<project>/json'). """
+
+    def __init__(self, url=PYPI_JSON, timeout=10.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout)
+
+    @property
+    def location(self):
+        return 'json+' + self.url
+
+    def releases(self, dist_name):
+        url = '%s/%s/json' % (self.url, dist_name)
+        status, content_type, body = self.pool.get(url, {'Accept': 'application/json'})
+
+        if status == 404:
+            return []
+        if status >= 400:
+            raise IndexUnavailable(url, status)
+
+        return list(json.loads(body.decode('utf-8')).get('releases', {}))
+
+
+class SimpleIndex(PackageIndex):
+    """ A PEP-0503 simple repository, like an internal mirror, the
+    PEP-0691 json responses are preferred when the index supports them.
+    """
+    def __init__(self, url=PYPI_SIMPLE, timeout=10.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout)
+
+    @property
+    def location(self):
+        return 'simple+' + self.url
+
+    def releases(self, dist_name):
+        url = '%s/%s/' % (self.url, normalize_name(dist_name))
+        accept = '%s, text/html;q=0.1' % SIMPLE_JSON_TYPE
+        status, content_type, body = self.pool.get(url, {'Accept': accept})
+
+        if status == 404:
+            return []
+        if status >= 400:
+            raise IndexUnavailable(url, status)
+
+        body = body.decode('utf-8')
+        if content_type.startswith(SIMPLE_JSON_TYPE):
+            data = json.loads(body)
+            if 'versions' in data:
+                return list(data['versions'])
+            filenames = [f['filename'] for f in data.get('files', [])]
+        else:
+            filenames = ANCHOR_RE.findall(body)
+
+        versions = set()
+        for filename in filenames:
+            version = version_from_filename(filename, dist_name)
+            if version:
+                versions.add(version)
+
+        return list(versions)
+
+
+class LocalIndex(PackageIndex):
+    """ A local directory of wheels and sdists, the files may also be
+    inside a sub-directory per project.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    @property
+    def location(self):
+        return os.path.abspath(self.directory)
+
+    def releases(self, dist_name):
+        versions = set()
+        for root, dirs, files in os.walk(self.directory):
+            for filename in files:
+                version = version_from_filename(filename, dist_name)
+                if version:
+                    versions.add(version)
+        return list(versions)
+
+
+class FakeIndex(PackageIndex):
+    """ An in-process index, used by the tests and benchmarks. """
+
+    def __init__(self, releases=None, search_results=None):
+        """ Instantiates a new fake index.
+
+        :param releases: dict mapping project names to release lists
+        :param search_results: the list returned by the searches
+        """
+        self._releases = {}
+        for dist_name, versions in (releases or {}).items():
+            self._releases[normalize_name(dist_name)] = list(versions)
+        self.search_results = search_results or []
+        self.calls = []
+
+    def releases(self, dist_name):
+        self.calls.append(dist_name)
+        return list(self._releases.get(normalize_name(dist_name), []))
+
+    def search(self, spec, operator='or'):
+        return list(self.search_results)
+
+
+def index_from_url(url, timeout=10.0):
+    """ Returns the package index backend of an url. The backend is picked
+    using the url scheme prefix ('xmlrpc+', 'json+' or 'simple+', like in
+    'simple+https://mirror/simple'), local directories and 'file://' urls
+    are a :class:`LocalIndex`, other urls ending in '/simple' are a
+    :class:`SimpleIndex` and the remaining ones are a :class:`XmlRpcIndex`.
+
+    :param url: the index url
+    :param timeout: the timeout in seconds of each request
+    :rtype: PackageIndex
+    :return: the package index backend
+    """
+    backends = {'xmlrpc': XmlRpcIndex, 'json': JsonIndex, 'simple': SimpleIndex}
+
+    prefix, sep, rest = url.partition('+')
+    if sep and prefix in backends:
+        return backends[prefix](rest, timeout)
+
+    if url.startswith('file://'):
+        return LocalIndex(url[len('file://'):])
+
+    if os.path.isdir(url):
+        return LocalIndex(url)
+
+    if url.rstrip('/').endswith('/simple'):
+        return SimpleIndex(url, timeout)
+
+    return XmlRpcIndex(url, timeout)
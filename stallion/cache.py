@@ -0,0 +1,81 @@
+"""
+.. module:: cache
+   :platform: Unix, Windows
+   :synopsis: In-memory caches shared by the Stallion views and console.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`cache` -- in-memory caches
+==================================================================
+"""
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """ A bounded, thread-safe, least recently used cache which keeps
+    the hit and miss counts.
+    """
+    def __init__(self, maxsize=1024):
+        """ Instantiates a new cache.
+
+        :param maxsize: the maximum number of entries kept
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ Returns the cached value, marking it as recently used.
+
+        :param key: the cache key
+        :param default: the value returned on a miss
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """ Stores a value, evicting the least recently used entries
+        when the cache is full.
+
+        :param key: the cache key
+        :param value: the value to cache
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Removes all the entries and resets the counters. """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """ Returns the cache statistics.
+
+        :rtype: dict
+        :return: dictionary with the size, maxsize, hits and misses
+        """
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
@@ -8,17 +8,47 @@
 :mod:`console` -- Stallion entry-point for console commands
 ==================================================================
 '''
+import os
+import sys
+import time
+import errno
+
 import stallion
-from stallion.main import get_shared_data, get_pkg_res
+from stallion.main import get_pkg_res, get_dist_index, get_dep_graph
 from stallion.main import get_pypi_search, get_pypi_releases
+from stallion.main import PYPI_FETCHER, PYPI_XMLRPC, UPDATE_STORE
+from stallion import backends
+from stallion import updates
 from stallion import metadata
+from stallion.output import OutputBuffer, FORMATS, get_writer
+from stallion.snapshot import DistributionSnapshot
+from stallion.entrypoints import EntryPointIndex
 
 from docopt import docopt
 
 from colorama import init
 from colorama import Fore, Back, Style
 
-import pkg_resources
+# Fields of the machine-readable records, in the CSV columns order
+LIST_FIELDS = ('name', 'version', 'location', 'summary', 'author',
+               'author-email', 'home-page', 'license', 'platform')
+CHECK_FIELDS = ('name', 'version', 'last_version', 'status', 'error')
+SCRIPTS_FIELDS = ('name', 'project_name', 'version', 'module_name', 'attrs')
+DEPS_FIELDS = ('name', 'version', 'requirement', 'extra', 'direct')
+VERIFY_FIELDS = ('name', 'version', 'requirement', 'status',
+                 'installed_name', 'installed_version')
+
+# The update check status, in the order of the plp check --all report
+CHECK_STATUS = updates.CHECK_STATUS
+
+# (color, table label, summary label) of each status
+CHECK_STATUS_TEXT = {
+    'outdated': (Fore.RED + Style.BRIGHT, 'outdated', 'outdated'),
+    'up-to-date': (Fore.GREEN + Style.BRIGHT, 'up-to-date', 'up-to-date'),
+    'newer': (Fore.YELLOW + Style.BRIGHT, 'newer than the index', 'newer'),
+    'not found': (Fore.WHITE + Style.DIM, 'not found on the index', 'not found'),
+    'error': (Fore.RED + Style.BRIGHT, 'error', 'failed'),
+}
 
 def ellipsize(msg, max_size=80):
     '''This function will ellipsize the string.
@@ -92,23 +122,73 @@ def get_field_formatted(mdata, key):
     text = get_kv_colored(key, field)
     return text
 
+def show_record(pkg_dist):
+    '''Returns the machine-readable record of the show command.
+
+    :param pkg_dist: the pkg_resources.Distribution
+    :return: the processed metadata dict plus the location, requirements
+             and entry points
+    '''
+    distinfo = metadata.get_distribution_metadata(pkg_dist)
+
+    # The metadata may be cached, the raw description is only removed
+    # from the record
+    record = dict(distinfo)
+    record.pop(metadata.RAW_DESCRIPTION_KEY, None)
+    record['description'] = metadata.get_description(distinfo)
+    record['name'] = pkg_dist.project_name
+    record['version'] = pkg_dist.version
+    record['location'] = pkg_dist.location
+    record['requires'] = [str(req) for req in pkg_dist.requires()]
+
+    record['entry_points'] = {}
+    for group, entries in pkg_dist.get_entry_map().items():
+        record['entry_points'][group] = dict((name, str(entry))
+                                             for name, entry in entries.items())
+    return record
+
+def check_record(proj_name, version, pypi_rel, error=None):
+    '''Returns the machine-readable record of an update check.
+
+    :param proj_name: the project name
+    :param version: the installed version
+    :param pypi_rel: the sorted PyPI releases
+    :param error: the lookup error, if any
+    :return: dict with the name, version, last_version, status and error,
+             the status is one of the :data:`CHECK_STATUS`
+    '''
+    record = {'name': proj_name, 'version': version,
+              'last_version': pypi_rel[0] if pypi_rel and error is None else None,
+              'status': updates.check_status(version, pypi_rel, error),
+              'error': str(error) if error is not None else None}
+    return record
+
 def cmd_show(args, short=False):
     '''This function implements the package show command.
 
     :param args: the docopt parsed arguments
     '''
     proj_name = args['<project_name>']
+    output_format = args['--format']
 
     try:
-        pkg_dist = get_pkg_res().get_distribution(proj_name)
+        pkg_dist = get_dist_index().get_distribution(proj_name)
     except:
-        print Fore.RED + Style.BRIGHT + \
-            'Error: unable to locate the project \'%s\' !' % proj_name
+        if output_format == 'text':
+            print Fore.RED + Style.BRIGHT + \
+                'Error: unable to locate the project \'%s\' !' % proj_name
+        else:
+            sys.stderr.write('Error: unable to locate the project \'%s\' !\n' % proj_name)
         raise RuntimeError('Project not found !')
 
-    pkg_metadata = pkg_dist.get_metadata(metadata.METADATA_NAME)
-    parsed, key_known = metadata.parse_metadata(pkg_metadata)
-    distinfo = metadata.metadata_to_dict(parsed, key_known)
+    if output_format != 'text':
+        if not short:
+            writer = get_writer(output_format, many=False)
+            writer.write(show_record(pkg_dist))
+            writer.close()
+        return
+
+    distinfo = metadata.get_distribution_metadata(pkg_dist)
 
     proj_head = Fore.GREEN + Style.BRIGHT + pkg_dist.project_name
     proj_head += Fore.YELLOW + Style.BRIGHT + ' ' + pkg_dist.version
@@ -122,6 +202,9 @@ def cmd_show(args, short=False):
     if 'description' in distinfo:
         del distinfo['description']
 
+    if metadata.RAW_DESCRIPTION_KEY in distinfo:
+        del distinfo[metadata.RAW_DESCRIPTION_KEY]
+
     if 'summary' in distinfo:
         del distinfo['summary']
 
@@ -172,73 +255,105 @@ def cmd_show(args, short=False):
         distinfo['classifier'] = classifier
         print get_field_formatted(distinfo, 'classifier')
 
-def cmd_list_detail(dist, distinfo):
+def cmd_list_detail(dist, distinfo, out):
     proj_head = Fore.GREEN + Style.BRIGHT + dist.project_name
     proj_head += Fore.YELLOW + Style.BRIGHT + ' ' + dist.version
-    print proj_head,
 
     proj_sum = Fore.WHITE + Style.DIM
     proj_sum += '- ' + parse_dict(distinfo, 'summary', True)
-    print proj_sum
+    out.write(proj_head + ' ' + proj_sum + '\n')
 
-    print get_field_formatted(distinfo, 'Author'),
+    out.write(get_field_formatted(distinfo, 'Author'))
     author_email = distinfo.get('author-email')
     if author_email:
-        print '<%s>' % author_email
-    else: print
+        out.write(' <%s>' % author_email)
+    out.write('\n')
 
-    print get_field_formatted(distinfo, 'Home-page')
-    print get_field_formatted(distinfo, 'License')
-    print get_field_formatted(distinfo, 'Platform')
+    out.write(get_field_formatted(distinfo, 'Home-page') + '\n')
+    out.write(get_field_formatted(distinfo, 'License') + '\n')
+    out.write(get_field_formatted(distinfo, 'Platform') + Style.RESET_ALL + '\n')
 
-def cmd_list_compact(dist, distinfo):
+def cmd_list_compact(dist, distinfo, out):
     proj_head = Fore.GREEN + Style.BRIGHT + dist.project_name.ljust(25)
     proj_head += Fore.WHITE + Style.BRIGHT + ' ' + dist.version.ljust(12)
-    print proj_head,
 
     proj_sum = Fore.WHITE + Style.DIM
     proj_sum += ' ' + parse_dict(distinfo, 'summary', True)
-    print proj_sum.ljust(100)
+    out.write(proj_head + ' ' + proj_sum.ljust(100) + Style.RESET_ALL + '\n')
 
 def cmd_list(args):
-    '''This function implements the package list command.
+    '''This function implements the package list command, the rows are
+    written as soon as the metadata of each package is loaded.
 
     :param args: the docopt parsed arguments
     '''
     compact = args['--compact']
     filt = args['<filter>']
-    distributions = get_shared_data()['distributions']
 
-    if compact:
-        print Fore.YELLOW + Style.BRIGHT + \
-            'Project Name'.ljust(26) + 'Version'.ljust(14) + 'Summary'
-        print '-' * 80
-    
-    for dist in distributions:
-        if filt:
-            if filt.lower() not in dist.project_name.lower():
-                continue
+    match = None
+    if filt:
+        filt = filt.lower()
+        match = lambda project_name: filt in project_name.lower()
+
+    distributions = DistributionSnapshot().iter_records(
+        rebuild=args['--rescan'], jobs=int(args['--jobs']), match=match)
+
+    if args['--format'] != 'text':
+        writer = get_writer(args['--format'], LIST_FIELDS)
+        for dist in distributions:
+            record = dict(dist.distinfo)
+            record.update({'name': dist.project_name, 'version': dist.version,
+                           'location': dist.location})
+            writer.write(record)
+        writer.close()
+        return
 
-        pkg_dist = get_pkg_res().get_distribution(dist.key)
-        pkg_metadata = pkg_dist.get_metadata(metadata.METADATA_NAME)
-        parsed, key_known = metadata.parse_metadata(pkg_metadata)
-        distinfo = metadata.metadata_to_dict(parsed, key_known)
+    out = OutputBuffer()
+    if compact:
+        out.write(Fore.YELLOW + Style.BRIGHT + 'Project Name'.ljust(26) +
+                  'Version'.ljust(14) + 'Summary' + Style.RESET_ALL + '\n')
+        out.write('-' * 80 + '\n')
 
+    for dist in distributions:
         if compact:
-            cmd_list_compact(dist, distinfo)
+            cmd_list_compact(dist, dist.distinfo, out)
         else:
-            cmd_list_detail(dist, distinfo)
-        
+            cmd_list_detail(dist, dist.distinfo, out)
+
+    out.flush()
+
 def cmd_check(args):
     proj_name = args['<project_name>']
     cmd_show(args, short=True)
 
+    if args['--format'] != 'text':
+        pkg_dist = get_dist_index().get_distribution(proj_name)
+        pypi_rel, error = None, None
+        try:
+            pypi_rel = get_pypi_releases(proj_name)
+        except Exception as exc:
+            error = exc
+        UPDATE_STORE.record(pkg_dist.project_name, pkg_dist.version, pypi_rel, error)
+        record = check_record(pkg_dist.project_name, pkg_dist.version, pypi_rel, error)
+
+        writer = get_writer(args['--format'], CHECK_FIELDS, many=False)
+        writer.write(record)
+        writer.close()
+        return
+
     print
     print Fore.GREEN + Style.BRIGHT + 'Searching for updates on PyPI...'
     print
 
-    pkg_dist_version = get_pkg_res().get_distribution(proj_name).version
-    pypi_rel = get_pypi_releases(proj_name)
+    pkg_dist = get_dist_index().get_distribution(proj_name)
+    pkg_dist_version = pkg_dist.version
+    try:
+        pypi_rel = get_pypi_releases(proj_name)
+    except Exception as exc:
+        # The failure is recorded like the ones of the other formats
+        UPDATE_STORE.record(pkg_dist.project_name, pkg_dist_version, None, exc)
+        raise
+    UPDATE_STORE.record(pkg_dist.project_name, pkg_dist_version, pypi_rel)
 
     if pypi_rel:
         pypi_last_version = get_pkg_res().parse_version(pypi_rel[0])
@@ -286,56 +401,343 @@ def cmd_check(args):
     else:
         print 'No versions found on PyPI !'
 
+def cmd_check_all(args):
+    '''This function implements the check of all installed packages, the
+    lookups are done concurrently and use the release cache. The text
+    report is a table sorted by the status (see the :data:`CHECK_STATUS`)
+    and project name, followed by a summary.
+
+    :param args: the docopt parsed arguments
+    '''
+    filt = args['<filter>']
+
+    match = None
+    if filt:
+        filt = filt.lower()
+        match = lambda project_name: filt in project_name.lower()
+
+    versions = dict((dist.project_name, dist.version)
+                    for dist in DistributionSnapshot().iter_records(match=match))
+
+    if args['--format'] != 'text':
+        writer = get_writer(args['--format'], CHECK_FIELDS)
+        checks = []
+        for proj_name, pypi_rel, error in PYPI_FETCHER.iter_releases(versions):
+            checks.append((proj_name, versions[proj_name], pypi_rel, error))
+            writer.write(check_record(proj_name, versions[proj_name], pypi_rel, error))
+        writer.close()
+        UPDATE_STORE.record_many(checks)
+        return
+
+    print Fore.GREEN + Style.BRIGHT + \
+        'Searching for updates of %d packages on PyPI...' % len(versions)
+    print
+
+    cache = PYPI_FETCHER.cache
+    cache_before = cache.stats() if cache is not None else None
+    start = time.time()
+
+    checks = [(proj_name, versions[proj_name], pypi_rel, error)
+              for proj_name, pypi_rel, error in PYPI_FETCHER.iter_releases(versions)]
+    records = [check_record(*check) for check in checks]
+    UPDATE_STORE.record_many(checks)
+
+    elapsed = time.time() - start
+    records.sort(key=lambda r: (CHECK_STATUS.index(r['status']), r['name'].lower()))
+
+    out = OutputBuffer()
+    out.write(Fore.YELLOW + Style.BRIGHT + 'Project Name'.ljust(26) +
+              'Version'.ljust(14) + 'Last Version'.ljust(14) + 'Status' +
+              Style.RESET_ALL + '\n')
+    out.write('-' * 80 + '\n')
+
+    counts = dict((status, 0) for status in CHECK_STATUS)
+    for record in records:
+        counts[record['status']] += 1
+        color, label, summary_label = CHECK_STATUS_TEXT[record['status']]
+        if record['status'] == 'error':
+            label += ': %s' % record['error']
+
+        out.write(Fore.GREEN + Style.BRIGHT + record['name'].ljust(25) + ' ' +
+                  Fore.WHITE + Style.BRIGHT + record['version'].ljust(13) + ' ' +
+                  Fore.WHITE + Style.NORMAL + (record['last_version'] or '-').ljust(13) +
+                  ' ' + color + label + Style.RESET_ALL + '\n')
+
+    out.write('\n' + Fore.WHITE + Style.BRIGHT +
+              ', '.join('%d %s' % (counts[status], CHECK_STATUS_TEXT[status][2])
+                        for status in CHECK_STATUS) + Style.RESET_ALL + '\n')
+
+    summary = 'Checked %d packages in %.2fs' % (len(records), elapsed)
+    if cache_before is not None:
+        cache_after = cache.stats()
+        cached = cache_after['hits'] - cache_before['hits']
+        summary += ' (%d from the cache, %d looked up at the index)' % \
+            (cached, len(records) - cached)
+    out.write(Fore.WHITE + Style.DIM + summary + Style.RESET_ALL + '\n')
+    out.flush()
+
 def cmd_scripts(arguments):
+    '''This function implements the scripts command, the console scripts
+    are looked up in the entry point index (see the
+    :class:`stallion.entrypoints.EntryPointIndex`).
+
+    :param arguments: the docopt parsed arguments
+    '''
     filt = arguments['<filter>']
+    index = EntryPointIndex(DistributionSnapshot())
+
+    if filt:
+        scripts = index.search(filt, 'console_scripts')
+    else:
+        scripts = index.by_group('console_scripts')
+
+    output_format = arguments['--format']
+    if output_format != 'text':
+        writer = get_writer(output_format, SCRIPTS_FIELDS)
+        for entry in scripts:
+            writer.write({'name': entry.name, 'project_name': entry.project_name,
+                          'version': entry.version, 'module_name': entry.module_name,
+                          'attrs': list(entry.attrs)})
+        writer.close()
+        return
+
+    out = OutputBuffer()
+    out.write(Fore.YELLOW + Style.BRIGHT + 'Script Name'.ljust(23) +
+              'Project Name'.ljust(21) + 'Module Name' + Style.RESET_ALL + '\n')
+    out.write('-' * 80 + '\n')
+
+    for entry in scripts:
+        project = '%s %s' % (entry.project_name, entry.version)
+        out.write(Fore.GREEN + Style.BRIGHT + entry.name.ljust(22) + ' ' +
+                  Fore.WHITE + Style.NORMAL + project.ljust(20) + ' ' +
+                  Fore.BLUE + Style.BRIGHT + entry.module_name + ' ' +
+                  Fore.BLUE + Style.NORMAL + '(' + ','.join(entry.attrs) + ')' +
+                  Style.RESET_ALL + '\n')
+
+    out.flush()
+
+def cmd_deps(args, reverse=False):
+    '''This function implements the deps and rdeps commands, the direct
+    requirements are followed by the rest of the transitive closure (see
+    the :class:`stallion.depgraph.DependencyGraph`).
+
+    :param args: the docopt parsed arguments
+    :param reverse: if True, the packages that depend on the project are
+                    listed instead of its dependencies
+    '''
+    proj_name = args['<project_name>']
+    graph = get_dep_graph()
+
+    try:
+        pkg_dist = get_dist_index().get_distribution(proj_name)
+    except:
+        sys.stderr.write('Error: unable to locate the project \'%s\' !\n' % proj_name)
+        raise RuntimeError('Project not found !')
+
+    records = []
+    direct = set()
+    if reverse:
+        edges = graph.required_by(pkg_dist.key, extras=True)
+    else:
+        edges = graph.requires(pkg_dist.key, extras=True)
+
+    for edge in edges:
+        key = edge.source if reverse else edge.target
+        dist = graph.get(key)
+        direct.add(key)
+        records.append({'name': dist.project_name if dist else edge.requirement.project_name,
+                        'version': dist.version if dist else None,
+                        'requirement': str(edge.requirement),
+                        'extra': edge.extra, 'direct': True})
+
+    indirect = []
+    for key in graph.closure(pkg_dist.key, reverse=reverse):
+        if key in direct:
+            continue
+        dist = graph.get(key)
+        indirect.append({'name': dist.project_name if dist else key,
+                         'version': dist.version if dist else None,
+                         'requirement': None, 'extra': None, 'direct': False})
+
+    if args['--format'] != 'text':
+        writer = get_writer(args['--format'], DEPS_FIELDS)
+        for record in records + indirect:
+            writer.write(record)
+        writer.close()
+        return
+
+    out = OutputBuffer()
+    if reverse:
+        title = 'Packages depending on %s %s' % (pkg_dist.project_name, pkg_dist.version)
+    else:
+        title = 'Dependencies of %s %s' % (pkg_dist.project_name, pkg_dist.version)
+    out.write(Fore.GREEN + Style.BRIGHT + title + Style.RESET_ALL + '\n\n')
+    out.write(Fore.YELLOW + Style.BRIGHT + 'Project Name'.ljust(26) +
+              'Version'.ljust(14) + 'Requirement' +
+              Style.RESET_ALL + '\n')
+    out.write('-' * 80 + '\n')
+
+    for record in records + indirect:
+        if record['direct']:
+            detail = record['requirement']
+            if record['extra']:
+                detail += ' [extra: %s]' % record['extra']
+            detail_color = Fore.WHITE + Style.NORMAL
+        else:
+            detail = 'indirect'
+            detail_color = Fore.WHITE + Style.DIM
+
+        if record['version'] is None and record['extra']:
+            version = Fore.WHITE + Style.DIM + 'not installed'.ljust(13)
+        elif record['version'] is None:
+            version = Fore.RED + Style.BRIGHT + 'missing'.ljust(13)
+        else:
+            version = Fore.WHITE + Style.BRIGHT + record['version'].ljust(13)
+
+        out.write(Fore.GREEN + Style.BRIGHT + record['name'].ljust(25) + ' ' +
+                  version + ' ' + detail_color + detail + Style.RESET_ALL + '\n')
+
+    out.write('\n' + Fore.WHITE + Style.DIM + '%d direct, %d indirect' %
+              (len(direct), len(indirect)) + Style.RESET_ALL + '\n')
+    out.flush()
 
-    print Fore.YELLOW + Style.BRIGHT + \
-        'Script Name'.ljust(23) + 'Project Name'.ljust(21) + 'Module Name'
-    print '-' * 80
-    for entry in pkg_resources.iter_entry_points('console_scripts'):
-        if(filt):
-            if filt.lower() not in entry.name.lower():
-                continue 
+def cmd_verify(args):
+    '''This function implements the verify command, the requirements of all
+    the installed packages are checked against the installed versions (see
+    the :meth:`stallion.depgraph.DependencyGraph.problems`).
 
-        print Fore.GREEN + Style.BRIGHT + entry.name.ljust(22),
-        print Fore.WHITE + Style.NORMAL + str(entry.dist).ljust(20),
-        print Fore.BLUE + Style.BRIGHT + entry.module_name,
-        print Fore.BLUE + Style.NORMAL + '(' + entry.attrs[0] + ')'
+    :param args: the docopt parsed arguments
+    :return: the number of problems found
+    '''
+    graph = get_dep_graph()
+    problems = graph.problems()
+
+    if args['--format'] != 'text':
+        writer = get_writer(args['--format'], VERIFY_FIELDS)
+        for problem in problems:
+            installed = problem.installed
+            writer.write({'name': problem.source.project_name,
+                          'version': problem.source.version,
+                          'requirement': str(problem.edge.requirement),
+                          'status': problem.kind,
+                          'installed_name': installed.project_name if installed else None,
+                          'installed_version': installed.version if installed else None})
+        writer.close()
+        return len(problems)
+
+    out = OutputBuffer()
+    for problem in problems:
+        source = '%s %s' % (problem.source.project_name, problem.source.version)
+        out.write(Fore.GREEN + Style.BRIGHT + source.ljust(30) + ' ' +
+                  Fore.WHITE + Style.NORMAL + 'requires ' +
+                  Fore.WHITE + Style.BRIGHT + str(problem.edge.requirement))
+
+        if problem.installed is None:
+            out.write(Fore.RED + Style.BRIGHT + ', not installed')
+        else:
+            out.write(Fore.YELLOW + Style.BRIGHT + ', %s is installed' %
+                      problem.installed.version)
+        out.write(Style.RESET_ALL + '\n')
+
+    if problems:
+        out.write('\n' + Fore.RED + Style.BRIGHT +
+                  '%d broken requirements in %d packages' %
+                  (len(problems), len(set(problem.source.key for problem in problems))))
+    else:
+        out.write(Fore.GREEN + Style.BRIGHT +
+                  'No broken requirements in %d packages' % len(graph.index))
+    out.write(Style.RESET_ALL + '\n')
+    out.flush()
+    return len(problems)
 
 def run_main():
     '''Stallion - Python List Packages (PLP)
 
     Usage:
-      plp list [--compact] [<filter>] 
-      plp show <project_name>
-      plp check <project_name>
-      plp scripts [<filter>]
+      plp list [--compact] [--rescan] [--jobs=<n>] [--format=<format>] [<filter>]
+      plp show <project_name> [--format=<format>]
+      plp check <project_name> [--index-url=<url>] [--workers=<n>] [--timeout=<seconds>] [--cache-ttl=<seconds>] [--format=<format>]
+      plp check --all [--index-url=<url>] [--workers=<n>] [--timeout=<seconds>] [--cache-ttl=<seconds>] [--format=<format>] [<filter>]
+      plp scripts [--format=<format>] [<filter>]
+      plp deps <project_name> [--format=<format>]
+      plp rdeps <project_name> [--format=<format>]
+      plp verify [--format=<format>]
 
       plp (-h | --help)
       plp --version
 
     Options:
-      --compact     Compact list format
-      -h --help     Show this screen.
-      --version     Show version.
+      --compact              Compact list format
+      --rescan               Rebuild the snapshot of the installed packages
+      --jobs=<n>             Processes reading the changed packages
+                             metadata [default: 1]
+      --all                  Check all the installed packages
+      --index-url=<url>      Package index, prefix it with 'xmlrpc+',
+                             'json+' or 'simple+' to pick the API, or use
+                             a directory [default: %s]
+      --workers=<n>          Concurrent PyPI lookups [default: 8]
+      --timeout=<seconds>    Timeout of each PyPI request [default: 10]
+      --cache-ttl=<seconds>  Seconds before the cached PyPI releases
+                             are refreshed [default: 3600]
+      --format=<format>      Output format: text, json, ndjson or csv
+                             [default: text]
+      -h --help              Show this screen.
+      --version              Show version.
     '''
-    init(autoreset=True)
-
-    arguments = docopt(run_main.__doc__,
+    arguments = docopt(run_main.__doc__ % PYPI_XMLRPC,
         version='Stallion v.%s - Python List Packages (PLP)' %
         stallion.__version__)
-    
-    if arguments['list']:
-        cmd_list(arguments)
 
-    if arguments['show']:
-        cmd_show(arguments)
+    if arguments['--format'] not in FORMATS:
+        sys.stderr.write('Error: unknown format \'%s\', use one of: %s\n' %
+                         (arguments['--format'], ', '.join(FORMATS)))
+        sys.exit(2)
+
+    # The machine-readable formats are never colored
+    if arguments['--format'] == 'text':
+        init(autoreset=True)
+
+    try:
+        if arguments['list']:
+            cmd_list(arguments)
+
+        if arguments['show']:
+            cmd_show(arguments)
+
+        if arguments['check']:
+            PYPI_FETCHER.index = backends.index_from_url(arguments['--index-url'],
+                                                         float(arguments['--timeout']))
+            PYPI_FETCHER.max_workers = int(arguments['--workers'])
+            PYPI_FETCHER.cache.ttl = float(arguments['--cache-ttl'])
+
+            # The plp process may exit before a background refresh finishes
+            PYPI_FETCHER.background = False
+
+            if arguments['--all']:
+                cmd_check_all(arguments)
+            else:
+                cmd_check(arguments)
+
+        if arguments['scripts']:
+            cmd_scripts(arguments)
+
+        if arguments['deps']:
+            cmd_deps(arguments)
+
+        if arguments['rdeps']:
+            cmd_deps(arguments, reverse=True)
 
-    if arguments['check']:
-        cmd_check(arguments)
+        if arguments['verify'] and cmd_verify(arguments):
+            sys.exit(1)
+    except IOError as exc:
+        if exc.errno != errno.EPIPE:
+            raise
 
-    if arguments['scripts']:
-        cmd_scripts(arguments)
+        # The reader is gone (ie. plp list | head), the pending output is
+        # discarded instead of failing again when the interpreter exits
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
 
 if __name__ == '__main__':
     run_main()
@@ -0,0 +1,465 @@
+"""
+.. module:: depgraph
+   :platform: Unix, Windows
+   :synopsis: Dependency graph of the installed distributions.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`depgraph` -- dependency graph of the installed distributions
+==================================================================
+"""
+import re
+import logging
+import threading
+import importlib
+
+from stallion import metadata
+from stallion.cache import LRUCache
+
+log = logging.getLogger(__name__)
+
+# A requirement without markers or URLs, like 'name[extra] >=1.0,<2.0' or
+# the old 'name (>=1.0)' form
+SIMPLE_REQUIREMENT_RE = re.compile(r'^\s*(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*'
+                                   r'(?:\[(?P<extras>[^\]]*)\])?\s*'
+                                   r'\(?(?P<specs>[^()]*?)\)?\s*$')
+
+# A marker that only selects an extra, like 'extra == "test"'
+EXTRA_MARKER_RE = re.compile(r'''^\s*extra\s*==\s*(['"])(?P<extra>[^'"]*)\1\s*$''')
+
+# The parsed requirements by their text, the same requirements are
+# repeated by many distributions and the pkg_resources parser is slow
+REQUIREMENT_CACHE = LRUCache(maxsize=16384)
+
+# The results of the environment markers by (marker, extra)
+MARKER_CACHE = LRUCache(maxsize=1024)
+
+
+class Edge(object):
+    """ A requirement of a distribution on another one. """
+
+    def __init__(self, source, target, requirement, extra=None):
+        """ Instantiates a new edge.
+
+        :param source: the key of the distribution with the requirement
+        :param target: the key of the required project
+        :param requirement: the pkg_resources.Requirement
+        :param extra: the extra of the source that adds the requirement,
+                      None for the base requirements
+        """
+        self.source = source
+        self.target = target
+        self.requirement = requirement
+        self.extra = extra
+
+    def __repr__(self):
+        if self.extra:
+            return '<Edge %s[%s] -> %s>' % (self.source, self.extra, self.requirement)
+        return '<Edge %s -> %s>' % (self.source, self.requirement)
+
+
+class Problem(object):
+    """ A requirement that isn't satisfied by the installed distributions. """
+
+    # The kinds of problems
+    MISSING = 'missing'
+    CONFLICT = 'conflict'
+
+    def __init__(self, edge, source, installed=None):
+        """ Instantiates a new problem.
+
+        :param edge: the :class:`Edge` of the requirement
+        :param source: the distribution with the requirement
+        :param installed: the installed distribution of the required
+                          project, None if it isn't installed
+        """
+        self.edge = edge
+        self.source = source
+        self.installed = installed
+        self.kind = self.MISSING if installed is None else self.CONFLICT
+
+    def __str__(self):
+        if self.installed is None:
+            return '%s %s requires %s, which is not installed' % \
+                (self.source.project_name, self.source.version, self.edge.requirement)
+        return '%s %s requires %s, but %s %s is installed' % \
+            (self.source.project_name, self.source.version, self.edge.requirement,
+             self.installed.project_name, self.installed.version)
+
+
+def requirement_satisfied(requirement, dist):
+    """ Returns True if the version of a distribution satisfies a
+    requirement. The pre-releases are accepted, as in the pkg_resources.
+
+    :param requirement: the pkg_resources.Requirement
+    :param dist: the pkg_resources.Distribution
+    :rtype: bool
+    """
+    specifier = getattr(requirement, 'specifier', None)
+    if specifier is None:
+        # The old setuptools versions don't have the specifier objects
+        return dist.version in requirement
+    # The version is parsed by the packaging module of the specifier, the
+    # pkg_resources may vendor another one
+    return specifier.contains(dist.version, prereleases=True)
+
+
+class RequirementSpec(object):
+    """ A requirement without markers or URLs, parsed without the
+    pkg_resources parser. It has the project_name, key, extras and
+    specifier attributes of the pkg_resources.Requirement.
+    """
+    def __init__(self, project_name, extras, specifier):
+        import pkg_resources
+        self.project_name = pkg_resources.safe_name(project_name)
+        self.key = self.project_name.lower()
+        self.extras = tuple(extras)
+        self.specifier = specifier
+
+    def __str__(self):
+        text = self.project_name
+        if self.extras:
+            text += '[%s]' % ','.join(self.extras)
+        return text + str(self.specifier)
+
+
+# The packaging modules imported by the :func:`packaging_module`
+_packaging_modules = {}
+
+
+def packaging_module(name):
+    """ Imports a module of the packaging project, the installed one or
+    else the copy vendored by the older setuptools (the newer ones don't
+    have the pkg_resources.extern anymore).
+
+    :param name: the module name, like 'markers'
+    :rtype: module
+    :raises: ImportError if the packaging project isn't available
+    """
+    module = _packaging_modules.get(name)
+    if module is None:
+        try:
+            module = importlib.import_module('packaging.' + name)
+        except ImportError:
+            module = importlib.import_module('pkg_resources.extern.packaging.' + name)
+        _packaging_modules[name] = module
+    return module
+
+
+def parse_requirement(text):
+    """ Parses a requirement, the simple requirements (see the
+    :data:`SIMPLE_REQUIREMENT_RE`) are parsed by :class:`RequirementSpec`
+    and the others by the pkg_resources. The results are cached in the
+    :data:`REQUIREMENT_CACHE`.
+
+    :param text: the requirement, without the environment marker
+    :rtype: RequirementSpec or pkg_resources.Requirement
+    :raises: ValueError if it is invalid
+    """
+    requirement = REQUIREMENT_CACHE.get(text)
+    if requirement is not None:
+        return requirement
+
+    match = SIMPLE_REQUIREMENT_RE.match(text)
+    if match is not None:
+        specifiers = packaging_module('specifiers')
+        try:
+            specifier = specifiers.SpecifierSet(match.group('specs'))
+        except specifiers.InvalidSpecifier:
+            match = None
+
+    if match is not None:
+        extras = [extra.strip() for extra in (match.group('extras') or '').split(',')
+                  if extra.strip()]
+        requirement = RequirementSpec(match.group('name'), extras, specifier)
+    else:
+        import pkg_resources
+        requirement = pkg_resources.Requirement.parse(text)
+
+    REQUIREMENT_CACHE.set(text, requirement)
+    return requirement
+
+
+def marker_matches(marker, extra=None):
+    """ Evaluates an environment marker, the results are cached in the
+    :data:`MARKER_CACHE`. The invalid markers never match.
+
+    :param marker: the marker, like 'python_version < "3"'
+    :param extra: the extra being resolved, None for the base requirements
+    :rtype: bool
+    """
+    import pkg_resources
+
+    match = EXTRA_MARKER_RE.match(marker)
+    if match is not None:
+        return extra is not None and \
+            pkg_resources.safe_extra(match.group('extra')) == pkg_resources.safe_extra(extra)
+
+    key = (marker, extra)
+    result = MARKER_CACHE.get(key)
+    if result is None:
+        markers = packaging_module('markers')
+        try:
+            result = markers.Marker(marker).evaluate({'extra': extra})
+        except Exception:
+            log.debug('Invalid environment marker: %s', marker, exc_info=True)
+            result = False
+        MARKER_CACHE.set(key, result)
+    return result
+
+
+def requirement_lines(dist):
+    """ Returns the requirements of a distribution, read from its metadata
+    instead of the pkg_resources, as the requires.txt sections of the
+    egg-info distributions or the Requires-Dist headers of the dist-info
+    ones.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: tuple
+    :return: (extras, lines), the lines are (section extra or None,
+             requirement, marker or None) tuples
+    """
+    import pkg_resources
+
+    extras = []
+    lines = []
+
+    if metadata.metadata_name(dist) == 'METADATA':
+        for line in metadata.get_metadata_text(dist).splitlines():
+            if not line:
+                break
+            if line[0] in ' \t':
+                continue
+            name, sep, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'requires-dist':
+                requirement, sep, marker = value.partition(';')
+                lines.append((None, requirement.strip(), marker.strip() or None))
+            elif name == 'provides-extra':
+                extras.append(value.strip())
+        return extras, lines
+
+    for name in ('requires.txt', 'depends.txt'):
+        if not dist.has_metadata(name):
+            continue
+
+        for section, section_lines in pkg_resources.split_sections(
+                dist.get_metadata_lines(name)):
+            extra, sep, section_marker = (section or '').partition(':')
+            extra = extra.strip() or None
+            if extra is not None and extra not in extras:
+                extras.append(extra)
+            if section_marker and not marker_matches(section_marker):
+                continue
+
+            for line in section_lines:
+                requirement, sep, marker = line.partition(';')
+                lines.append((extra, requirement.strip(), marker.strip() or None))
+
+    return extras, lines
+
+
+def distribution_edges(dist):
+    """ Returns the edges of the requirements of a distribution, the
+    environment markers are evaluated and each extra is resolved, as in
+    the pkg_resources.Distribution.requires.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: list
+    :return: a list of :class:`Edge`, the base requirements first
+    """
+    import pkg_resources
+
+    try:
+        extras, lines = requirement_lines(dist)
+        base = []
+        by_extra = dict((pkg_resources.safe_extra(extra), []) for extra in extras)
+
+        for section, text, marker in lines:
+            requirement = parse_requirement(text)
+            if section is not None:
+                # The egg-info sections were already evaluated
+                if marker is None or marker_matches(marker, section):
+                    by_extra.setdefault(pkg_resources.safe_extra(section),
+                                        []).append(requirement)
+                continue
+
+            if marker is None or marker_matches(marker):
+                base.append(requirement)
+                continue
+
+            for extra in extras:
+                if marker_matches(marker, extra):
+                    by_extra[pkg_resources.safe_extra(extra)].append(requirement)
+    except ImportError:
+        # A missing packaging project would empty the whole graph
+        raise
+    except Exception:
+        log.debug('Unable to read the requirements of %s', dist, exc_info=True)
+        return []
+
+    edges = [Edge(dist.key, req.key, req) for req in base]
+    seen = set(str(req) for req in base)
+
+    for extra in sorted(by_extra):
+        for req in by_extra[extra]:
+            if str(req) not in seen:
+                edges.append(Edge(dist.key, req.key, req, extra))
+
+    return edges
+
+
+class DependencyGraph(object):
+    """ The requirements between the distributions of a
+    :class:`stallion.distindex.DistributionIndex`, with forward and reverse
+    edges. The requirements of each distribution are read once per
+    installed version and the transitive closures are memoized until the
+    installed distributions change.
+    """
+    def __init__(self, index):
+        """ Instantiates a new graph.
+
+        :param index: the DistributionIndex
+        """
+        self.index = index
+        self._lock = threading.RLock()
+        self._signature = None
+        self._edges_cache = {}
+        self._dists = {}
+        self._forward = {}
+        self._reverse = {}
+        self._closures = {}
+        self._problems = None
+
+    def refresh(self):
+        """ Updates the graph if the indexed distributions changed, only the
+        new or changed distributions have their requirements read.
+
+        :rtype: bool
+        :return: True if the graph was rebuilt
+        """
+        with self._lock:
+            dists = self.index.distributions()
+            signature = tuple((dist.key, dist.version, dist.location) for dist in dists)
+            if signature == self._signature:
+                return False
+
+            edges_cache = {}
+            forward = {}
+            reverse = {}
+            for dist, dist_id in zip(dists, signature):
+                edges = self._edges_cache.get(dist_id)
+                if edges is None:
+                    edges = distribution_edges(dist)
+                edges_cache[dist_id] = edges
+
+                forward[dist.key] = edges
+                for edge in edges:
+                    reverse.setdefault(edge.target, []).append(edge)
+
+            self._edges_cache = edges_cache
+            self._dists = dict((dist.key, dist) for dist in dists)
+            self._forward = forward
+            self._reverse = reverse
+            self._closures = {}
+            self._problems = None
+            self._signature = signature
+            return True
+
+    def get(self, key):
+        """ Returns the installed distribution of a project key.
+
+        :param key: the project key (lower case name)
+        :rtype: pkg_resources.Distribution
+        :return: the distribution or None if it isn't installed
+        """
+        return self._dists.get(key)
+
+    def requires(self, key, extras=False):
+        """ Returns the direct requirements of a distribution.
+
+        :param key: the distribution key
+        :param extras: if True, the requirements of the extras are included
+        :rtype: list
+        :return: a list of :class:`Edge`
+        """
+        edges = self._forward.get(key, [])
+        return edges if extras else [edge for edge in edges if edge.extra is None]
+
+    def required_by(self, key, extras=False):
+        """ Returns the direct requirements of other distributions on a
+        project.
+
+        :param key: the project key
+        :param extras: if True, the requirements of the extras are included
+        :rtype: list
+        :return: a list of :class:`Edge`
+        """
+        edges = self._reverse.get(key, [])
+        return edges if extras else [edge for edge in edges if edge.extra is None]
+
+    def closure(self, key, reverse=False, extras=False):
+        """ Returns the transitive closure of a distribution, the result is
+        memoized until the graph changes.
+
+        :param key: the distribution key
+        :param reverse: if True, the distributions that depend on it are
+                        returned, otherwise the ones it depends on
+        :param extras: if True, the requirements of the extras of the
+                       starting distribution are followed
+        :rtype: list
+        :return: the sorted keys, without the key itself
+        """
+        memo_key = (key, reverse, extras)
+        with self._lock:
+            closure = self._closures.get(memo_key)
+            if closure is not None:
+                return closure
+
+            edges_of = self.required_by if reverse else self.requires
+            seen = set([key])
+            stack = [key]
+            first = True
+
+            while stack:
+                current = stack.pop()
+                for edge in edges_of(current, extras and first):
+                    node = edge.source if reverse else edge.target
+                    if node not in seen:
+                        seen.add(node)
+                        stack.append(node)
+                first = False
+
+            seen.discard(key)
+            closure = self._closures[memo_key] = sorted(seen)
+            return closure
+
+    def problems(self):
+        """ Returns the requirements that are missing or conflict with the
+        installed versions, checked in a single pass over the edges of the
+        graph. The result is kept until the graph changes.
+
+        Only the base requirements are checked, the extras are optional.
+
+        :rtype: list
+        :return: a list of :class:`Problem`, sorted by the key of the
+                 distribution with the requirement
+        """
+        with self._lock:
+            if self._problems is not None:
+                return self._problems
+
+            problems = []
+            for key, edges in self._forward.items():
+                source = self._dists[key]
+                for edge in edges:
+                    if edge.extra is not None:
+                        continue
+                    installed = self._dists.get(edge.target)
+                    if installed is None or \
+                            not requirement_satisfied(edge.requirement, installed):
+                        problems.append(Problem(edge, source, installed))
+
+            problems.sort(key=lambda problem: (problem.source.key, problem.edge.target))
+            self._problems = problems
+            return problems
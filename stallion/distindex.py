@@ -0,0 +1,317 @@
+"""
+.. module:: distindex
+   :platform: Unix, Windows
+   :synopsis: Incremental index of the installed distributions.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`distindex` -- incremental index of the installed distributions
+==================================================================
+"""
+import os
+import sys
+import bisect
+import hashlib
+import threading
+
+# Suffixes of the directory entries that carry distribution metadata,
+# a change in any of them means that the path entry must be rescanned
+METADATA_SUFFIXES = ('.dist-info', '.egg-info', '.egg-link', '.egg')
+
+# The orders of the :meth:`DistributionIndex.query`
+SORT_KEYS = ('name', 'version', 'installed')
+
+
+def entry_signature(entry):
+    """ Returns a signature of a sys.path entry, it is built using the
+    modification time of the entry and of each distribution metadata
+    entry inside it, so installs, removals and upgrades change it.
+
+    :param entry: the sys.path entry
+    :rtype: tuple
+    :return: the signature or None if the entry doesn't exist
+    """
+    entry_path = entry or os.curdir
+
+    try:
+        entry_stat = os.stat(entry_path)
+    except OSError:
+        return None
+
+    if not os.path.isdir(entry_path):
+        return (entry_stat.st_mtime, entry_stat.st_size)
+
+    signature = [entry_stat.st_mtime]
+
+    try:
+        names = os.listdir(entry_path)
+    except OSError:
+        return tuple(signature)
+
+    for name in sorted(names):
+        if not name.lower().endswith(METADATA_SUFFIXES):
+            continue
+        try:
+            mtime = os.stat(os.path.join(entry_path, name)).st_mtime
+        except OSError:
+            continue
+        signature.append((name, mtime))
+
+    return tuple(signature)
+
+
+def signature_mtime(signature):
+    """ Returns the newest modification time of an entry signature (see
+    :func:`entry_signature`).
+
+    :param signature: the signature, or None
+    :rtype: float
+    :return: the timestamp, 0 if the entry doesn't exist
+    """
+    if not signature:
+        return 0
+    # The first item is the entry modification time, the others are the
+    # (name, mtime) of the metadata entries or the size of a file entry
+    return max([signature[0]] + [item[1] for item in signature[1:]
+                                 if isinstance(item, tuple)])
+
+
+def install_time(dist):
+    """ Returns the install time of a distribution, the modification time
+    of its metadata directory (or of its location, if unknown).
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: float
+    :return: the timestamp, 0 if it can't be read
+    """
+    path = getattr(getattr(dist, '_provider', None), 'egg_info', None) or dist.location
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return 0
+
+
+def scan_entry(entry):
+    """ Returns the distributions found on a sys.path entry.
+
+    :param entry: the sys.path entry
+    :rtype: list
+    :return: a list of pkg_resources.Distribution
+    """
+    # Importing pkg_resources builds the working set of the whole sys.path,
+    # it is only imported when an entry is actually scanned
+    import pkg_resources
+    return list(pkg_resources.find_distributions(entry, True))
+
+
+class DistributionIndex(object):
+    """ A persistent index of the installed distributions. Unlike the
+    pkg_resources.WorkingSet, it keeps the distributions found on each
+    sys.path entry and only rescans the entries whose signature changed
+    (see :func:`entry_signature`).
+    """
+    def __init__(self, path=None):
+        """ Instantiates a new index.
+
+        :param path: the list of path entries to index, if None the
+                     current sys.path is used on each refresh
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._path = []
+        self._distributions = []
+        self._by_key = {}
+        self._sorted = {}
+        self._install_times = {}
+        self.generation = None
+        self.last_modified = None
+
+    def refresh(self, force=False):
+        """ Updates the index, rescanning only the path entries that
+        changed since the last refresh.
+
+        :param force: if True, all path entries are rescanned
+        :rtype: bool
+        :return: True if the index was rebuilt
+        """
+        with self._lock:
+            path = list(sys.path if self.path is None else self.path)
+            changed = force or path != self._path
+
+            entries = {}
+            for entry in path:
+                if entry in entries:
+                    continue
+
+                signature = entry_signature(entry)
+                cached = self._entries.get(entry)
+
+                if force or cached is None or cached[0] != signature:
+                    dists = scan_entry(entry) if signature is not None else []
+                    entries[entry] = (signature, dists)
+                    changed = True
+                else:
+                    entries[entry] = cached
+
+            self._entries = entries
+            self._path = path
+
+            if changed:
+                self._rebuild()
+
+            return changed
+
+    def _rebuild(self):
+        """ Rebuilds the distribution list, the first distribution found
+        for a project on the path wins, as in the pkg_resources.WorkingSet.
+        """
+        distributions = []
+        by_key = {}
+        seen = set()
+
+        for entry in self._path:
+            if entry in seen:
+                continue
+            seen.add(entry)
+
+            for dist in self._entries[entry][1]:
+                if dist.key not in by_key:
+                    by_key[dist.key] = dist
+                    distributions.append(dist)
+
+        self._distributions = distributions
+        self._by_key = by_key
+        self._sorted = {}
+        self._install_times = {}
+
+        # The signatures are stable across restarts, so the generation
+        # only changes when the installed distributions change
+        signatures = [(entry, self._entries[entry][0]) for entry in self._path]
+        dists = [(dist.key, dist.version, dist.location) for dist in distributions]
+        self.generation = hashlib.sha1(repr((signatures, dists)).encode('utf-8')).hexdigest()
+        self.last_modified = max([signature_mtime(signature)
+                                  for entry, signature in signatures] or [0])
+
+    def distributions(self):
+        """ Returns the indexed distributions, in sys.path order.
+
+        :rtype: list
+        :return: a list of pkg_resources.Distribution
+        """
+        return list(self._distributions)
+
+    def __iter__(self):
+        return iter(self.distributions())
+
+    def __len__(self):
+        return len(self._distributions)
+
+    def get_distribution(self, dist_name):
+        """ Returns the distribution for a project name.
+
+        :param dist_name: the distribution name
+        :rtype: pkg_resources.Distribution
+        :return: the distribution
+        :raises: pkg_resources.DistributionNotFound if not installed
+        """
+        import pkg_resources
+        key = pkg_resources.safe_name(dist_name).lower()
+        try:
+            return self._by_key[key]
+        except KeyError:
+            raise pkg_resources.DistributionNotFound(dist_name, None)
+
+    def install_time(self, dist):
+        """ Returns the install time of an indexed distribution, it is
+        read once per rebuild (see :func:`install_time`).
+
+        :param dist: the pkg_resources.Distribution
+        :rtype: float
+        """
+        timestamp = self._install_times.get(dist.key)
+        if timestamp is None:
+            timestamp = self._install_times[dist.key] = install_time(dist)
+        return timestamp
+
+    def sorted_distributions(self, sort='name'):
+        """ Returns the indexed distributions in an order, each order is
+        sorted once per rebuild.
+
+        :param sort: one of the :data:`SORT_KEYS`
+        :rtype: tuple
+        :return: (distributions, keys), the keys of the sorted
+                 distributions are in the same order
+        """
+        with self._lock:
+            cached = self._sorted.get(sort)
+            if cached is not None:
+                return cached
+
+            if sort == 'name':
+                sort_key = lambda dist: dist.key
+            elif sort == 'version':
+                sort_key = lambda dist: (dist.parsed_version, dist.key)
+            elif sort == 'installed':
+                sort_key = lambda dist: (self.install_time(dist), dist.key)
+            else:
+                raise ValueError('Unknown sort key: %s' % sort)
+
+            distributions = sorted(self._distributions, key=sort_key)
+            cached = self._sorted[sort] = (distributions,
+                                           [dist.key for dist in distributions])
+            return cached
+
+    def query(self, text=None, prefix=False, sort='name', reverse=False,
+              offset=0, limit=None):
+        """ Returns a page of the indexed distributions, filtered by the
+        name and sorted. The prefix lookups of the name order are a
+        bisection of the sorted keys.
+
+        :param text: if not None, only the distributions whose key
+                     contains the text (ignoring the case) are returned
+        :param prefix: if True, the key must start with the text
+        :param sort: one of the :data:`SORT_KEYS`
+        :param reverse: if True, the order is descending
+        :param offset: the number of distributions to skip
+        :param limit: the maximum number of distributions, None for all
+        :rtype: tuple
+        :return: (total, distributions), the total number of matches and
+                 the distributions of the page
+        """
+        distributions, keys = self.sorted_distributions(sort)
+        text = text.lower() if text else None
+
+        if text is None:
+            matches = distributions
+        elif prefix and sort == 'name':
+            start = end = bisect.bisect_left(keys, text)
+            while end < len(keys) and keys[end].startswith(text):
+                end += 1
+            matches = distributions[start:end]
+        elif prefix:
+            matches = [dist for dist, key in zip(distributions, keys)
+                       if key.startswith(text)]
+        else:
+            matches = [dist for dist, key in zip(distributions, keys) if text in key]
+
+        if reverse:
+            matches = matches[::-1]
+
+        end = None if limit is None else offset + limit
+        return len(matches), matches[offset:end]
+
+    def iter_entry_points(self, group, name=None):
+        """ Yields the entry points of a group, like the
+        pkg_resources.iter_entry_points, but over the indexed distributions.
+
+        :param group: the entry point group, like 'console_scripts'
+        :param name: if not None, yields only the entry point with this name
+        """
+        for dist in self.distributions():
+            entries = dist.get_entry_map(group)
+            if name is None:
+                for entry in entries.values():
+                    yield entry
+            elif name in entries:
+                yield entries[name]
@@ -0,0 +1,120 @@
+"""
+.. module:: entrypoints
+   :platform: Unix, Windows
+   :synopsis: Persistent index of the installed entry points.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`entrypoints` -- persistent index of the entry points
+==================================================================
+"""
+import re
+
+# The format of the pkg_resources.EntryPoint strings,
+# like 'name = module.path:attr.path [extra1,extra2]'
+ENTRY_POINT_RE = re.compile(r'^\s*(?P<name>.+?)\s*=\s*(?P<module>[\w.]+)\s*'
+                            r'(?::\s*(?P<attrs>[\w.]+))?\s*'
+                            r'(?:\[(?P<extras>[^\]]*)\])?\s*$')
+
+
+def parse_entry_point(text):
+    """ Parses an entry point string, without importing pkg_resources.
+
+    :param text: the entry point, like 'plp = stallion.console:run_main'
+    :rtype: tuple
+    :return: (name, module_name, attrs, extras) or None if it is invalid
+    """
+    match = ENTRY_POINT_RE.match(text)
+    if match is None:
+        return None
+
+    attrs = tuple(match.group('attrs').split('.')) if match.group('attrs') else ()
+    extras = tuple(extra.strip() for extra in (match.group('extras') or '').split(',')
+                   if extra.strip())
+    return (match.group('name'), match.group('module'), attrs, extras)
+
+
+class EntryPointRecord(object):
+    """ An entry point of an installed distribution, it has the same name,
+    module_name, attrs and extras attributes of the pkg_resources.EntryPoint.
+    """
+    def __init__(self, group, name, module_name, attrs, extras,
+                 project_name, version):
+        self.group = group
+        self.name = name
+        self.module_name = module_name
+        self.attrs = tuple(attrs)
+        self.extras = tuple(extras)
+        self.project_name = project_name
+        self.version = version
+
+    def __str__(self):
+        text = '%s = %s' % (self.name, self.module_name)
+        if self.attrs:
+            text += ':' + '.'.join(self.attrs)
+        if self.extras:
+            text += ' [%s]' % ','.join(self.extras)
+        return text
+
+
+class EntryPointIndex(object):
+    """ Index of the entry points of all the groups, kept in the snapshot
+    of the installed distributions (see the
+    :class:`stallion.snapshot.DistributionSnapshot`), so each distribution
+    version is only parsed once. The lookups update the snapshot of the
+    changed sys.path entries first.
+    """
+    def __init__(self, snapshot=None):
+        """ Instantiates a new index.
+
+        :param snapshot: the DistributionSnapshot, if None the snapshot of
+                         the running interpreter is used
+        """
+        if snapshot is None:
+            from stallion.snapshot import DistributionSnapshot
+            snapshot = DistributionSnapshot()
+        self.snapshot = snapshot
+
+    def _lookup(self, **conditions):
+        return [EntryPointRecord(*row)
+                for row in self.snapshot.entry_point_rows(**conditions)]
+
+    def by_group(self, group):
+        """ Returns the entry points of a group, in sys.path order.
+
+        :param group: the group, like 'console_scripts'
+        :rtype: list
+        :return: a list of :class:`EntryPointRecord`
+        """
+        return self._lookup(group=group)
+
+    def by_name(self, name, group=None):
+        """ Returns the entry points with a name, like a script name.
+
+        :param name: the entry point name
+        :param group: the group, None for all the groups
+        :rtype: list
+        :return: a list of :class:`EntryPointRecord`
+        """
+        return self._lookup(group=group, name=name)
+
+    def by_module(self, module_name, group=None):
+        """ Returns the entry points of a module.
+
+        :param module_name: the module name, like 'stallion.console'
+        :param group: the group, None for all the groups
+        :rtype: list
+        :return: a list of :class:`EntryPointRecord`
+        """
+        return self._lookup(group=group, module=module_name)
+
+    def search(self, text, group=None):
+        """ Returns the entry points whose name contains the text, ignoring
+        the case.
+
+        :param text: the text
+        :param group: the group, None for all the groups
+        :rtype: list
+        :return: a list of :class:`EntryPointRecord`
+        """
+        return self._lookup(group=group, contains=text)
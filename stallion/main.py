@@ -10,36 +10,76 @@
 """
 from optparse import OptionParser
 
-try:
-    reload
-except NameError:
-    from imp import reload
-
 import sys
 import platform
 import logging
+import functools
+
+from datetime import datetime
 
 try:
-    import xmlrpclib
+    import json
 except ImportError:
-    import xmlrpc.client
-
-import pkg_resources as _pkg_resources
+    import simplejson as json
 
-from flask import Flask, render_template, url_for, jsonify
-
-from docutils.core import publish_parts
+from flask import Flask, Response, render_template, url_for, jsonify, request
+from flask import g, make_response
+from werkzeug.http import is_resource_modified
 
 import stallion
 from stallion import metadata
+from stallion import distindex
+from stallion import pypi
+from stallion import backends
+from stallion import render
+from stallion import entrypoints
+from stallion import depgraph
+from stallion import server
+from stallion import updates
+from stallion import scanner
+from stallion.cache import LRUCache
 
 app = Flask(__name__)
 
-PYPI_XMLRPC = 'http://pypi.python.org/pypi'
+PYPI_XMLRPC = pypi.PYPI_XMLRPC
+
+# The PyPI releases fetcher, it has the concurrency limit, the
+# timeout and the retries used by all the PyPI lookups, the release
+# lists are cached on disk and shared with the plp console
+PYPI_FETCHER = pypi.ReleaseFetcher(backends.XmlRpcIndex(PYPI_XMLRPC),
+                                   cache=pypi.ReleaseCache())
+
+# The state of the update checks, it has the update badges of the
+# distributions and it is shared by the workers and the plp console
+UPDATE_STORE = updates.UpdateStore()
 
-# This is a cache with flags to show if a distribution
-# has an update available
-DIST_PYPI_CACHE = set()
+# The number of update checks written to the :data:`UPDATE_STORE` in
+# each transaction by the bulk checks
+UPDATE_BATCH_SIZE = 50
+
+# The rendered pages keyed by (endpoint, view arguments, generation of
+# the distribution index), see the :func:`cached_page`
+PAGE_CACHE = LRUCache(maxsize=128)
+
+# The default and the maximum page sizes of the /api/distributions
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# This is the index of the installed distributions, it is refreshed
+# on each request but only rescans the sys.path entries that changed
+DIST_INDEX = distindex.DistributionIndex()
+
+# The entry points of all the groups, kept in the snapshot shared with
+# the plp console
+ENTRY_POINT_INDEX = entrypoints.EntryPointIndex()
+
+# The requirements between the indexed distributions, only the changed
+# distributions are read again when the index changes
+DEP_GRAPH = depgraph.DependencyGraph(DIST_INDEX)
+
+# The background checks of the updates, started by each worker process
+# (see the :func:`run_main`), only one of them checks at a time
+UPDATE_SCANNER = scanner.UpdateScanner(PYPI_FETCHER, UPDATE_STORE, DIST_INDEX)
 
 
 class Crumb(object):
@@ -55,19 +95,117 @@ class Crumb(object):
 
 
 def get_pkg_res():
-    reload(_pkg_resources)
-    return _pkg_resources
+    """ Returns the pkg_resources module, the installed distributions
+    should be looked up using :func:`get_dist_index` instead.
+
+    The module is imported on the first call, importing it builds the
+    working set of the whole sys.path.
 
+    :rtype: module
+    :return: the pkg_resources module
+    """
+    import pkg_resources
+    return pkg_resources
+
+
+def get_dist_index(rescan=False):
+    """ Refreshes and returns the index of the installed distributions.
+
+    :param rescan: if True, forces a rescan of all sys.path entries
+    :rtype: stallion.distindex.DistributionIndex
+    :return: the distribution index
+    """
+    DIST_INDEX.refresh(force=rescan)
+    return DIST_INDEX
+
+
+def get_dep_graph(rescan=False):
+    """ Refreshes and returns the dependency graph of the installed
+    distributions.
+
+    :param rescan: if True, forces a rescan of all sys.path entries
+    :rtype: stallion.depgraph.DependencyGraph
+    :return: the dependency graph
+    """
+    get_dist_index(rescan)
+    DEP_GRAPH.refresh()
+    return DEP_GRAPH
+
+
+def rescan_requested():
+    """ Returns True if the request asked for a full rescan of the
+    installed distributions (ie. using the "?rescan=1" argument).
+
+    :rtype: bool
+    """
+    return request.args.get('rescan', '0') not in ('', '0')
 
-def get_shared_data():
+
+def page_etag(dist_index):
+    """ Returns the ETag of the pages, it changes when the installed
+    distributions or the Stallion version change.
+
+    :param dist_index: the refreshed DistributionIndex
+    :rtype: string
+    """
+    return '%s-%s' % (stallion.__version__, dist_index.generation)
+
+
+def cached_page(view):
+    """ Decorator of the views that only depend on the installed
+    distributions. The rendered pages are kept in the :data:`PAGE_CACHE`
+    until the generation of the distribution index changes, and the
+    responses have the ETag and Last-Modified headers, so the repeated
+    requests get a 304 answer. A view may set the "g.page_cacheable" to
+    False when its page shouldn't be kept.
+
+    The "?rescan=1" requests are always rendered.
+    """
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        g.page_cacheable = True
+
+        if rescan_requested():
+            # The view rescans the distributions, the page is rendered
+            # before the generation is known
+            response = make_response(view(**kwargs))
+            dist_index = DIST_INDEX
+        else:
+            dist_index = get_dist_index()
+            last_modified = datetime.utcfromtimestamp(int(dist_index.last_modified))
+
+            if not is_resource_modified(request.environ, page_etag(dist_index),
+                                        last_modified=last_modified):
+                response = Response(status=304)
+            else:
+                key = (request.endpoint, tuple(sorted(kwargs.items())),
+                       dist_index.generation)
+                html = PAGE_CACHE.get(key)
+                if html is None:
+                    html = view(**kwargs)
+                    if g.page_cacheable:
+                        PAGE_CACHE.set(key, html)
+                response = make_response(html)
+
+        if g.page_cacheable:
+            response.set_etag(page_etag(dist_index))
+            response.last_modified = datetime.utcfromtimestamp(int(dist_index.last_modified))
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
+def get_shared_data(rescan=False):
     """ Returns a new dictionary with the shared-data between different
     Stallion views (ie. a lista of distribution packages).
 
+    :param rescan: if True, forces a rescan of the installed distributions
     :rtype: dict
     :return: the dictionary with the shared data.
     """
-    shared_data = {'pypi_update_cache': DIST_PYPI_CACHE,
-                   'distributions': [d for d in get_pkg_res().working_set]}
+    shared_data = {'update_store': UPDATE_STORE,
+                   'distributions': get_dist_index(rescan).distributions()}
 
     return shared_data
 
@@ -79,7 +217,7 @@ def get_pypi_proxy():
     :rtype: xmlrpclib.ServerProxy
     :return: the RPC ServerProxy to PyPI repository.
     """
-    return xmlrpclib.ServerProxy(PYPI_XMLRPC)
+    return pypi.get_proxy(PYPI_XMLRPC)
 
 
 def get_pypi_releases(dist_name):
@@ -90,17 +228,7 @@ def get_pypi_releases(dist_name):
     :rtype: list
     :return: a list with the releases available at PyPI
     """
-    pypi = get_pypi_proxy()
-
-    show_hidden = True
-    ret = pypi.package_releases(dist_name, show_hidden)
-
-    if not ret:
-        ret = pypi.package_releases(dist_name.capitalize(), show_hidden)
-
-    ret.sort(key=lambda v: _pkg_resources.parse_version(v), reverse=True)
-
-    return ret
+    return PYPI_FETCHER.releases(dist_name)
 
 def get_pypi_search(spec, operator='or'):
     """Search the package database using the indicated search spec
@@ -130,11 +258,42 @@ def get_pypi_search(spec, operator='or'):
     returned as a list of dicts {'name': package name, 'version': package release version,
     'summary': package release summary}
     browse(classifiers)
+
+    Only the XML-RPC index backend supports searching.
     """
-    pypi = get_pypi_proxy()
-    ret = pypi.search(spec, operator)
-    ret.sort(key=lambda v: v['_pypi_ordering'], reverse=True)
-    return ret
+    return PYPI_FETCHER.search(spec, operator)
+
+
+def update_info(version, pypi_rel):
+    """ Returns the update information of an installed version.
+
+    :param version: the installed version
+    :param pypi_rel: the sorted PyPI releases
+    :rtype: dict
+    :return: dict with the "current_version", the "last_version" at PyPI
+             (None if not found) and the "has_update" flag
+    """
+    status = updates.check_status(version, pypi_rel)
+    return {'current_version': version,
+            'last_version': pypi_rel[0] if pypi_rel else None,
+            'has_update': int(status == updates.STATUS_OUTDATED)}
+
+
+def check_update(dist_name, pypi_rel=None):
+    """ Checks if there is a newer release of the distribution at PyPI
+    and records it in the :data:`UPDATE_STORE`.
+
+    :param dist_name: distribution name
+    :param pypi_rel: the sorted PyPI releases, if None they are fetched
+    :rtype: dict
+    :return: the :func:`update_info` of the installed version
+    """
+    pkg_dist_version = DIST_INDEX.get_distribution(dist_name).version
+    if pypi_rel is None:
+        pypi_rel = get_pypi_releases(dist_name)
+
+    UPDATE_STORE.record(dist_name, pkg_dist_version, pypi_rel)
+    return update_info(pkg_dist_version, pypi_rel)
 
 
 @app.route('/pypi/check_update/<dist_name>')
@@ -146,24 +305,89 @@ def check_pypi_update(dist_name):
     :rtype: json
     :return: json with the attribute "has_update"
     """
-    pkg_res = get_pkg_res()
-    pkg_dist_version = pkg_res.get_distribution(dist_name).version
-    pypi_rel = get_pypi_releases(dist_name)
+    get_dist_index()
+    return jsonify(check_update(dist_name))
 
-    if pypi_rel:
-        pypi_last_version = pkg_res.parse_version(pypi_rel[0])
-        current_version = pkg_res.parse_version(pkg_dist_version)
 
-        if pypi_last_version > current_version:
-            DIST_PYPI_CACHE.add(dist_name.lower())
-            return jsonify({"has_update": 1})
+def iter_update_checks(dist_names):
+    """ Checks for updates of many distributions, the PyPI lookups are
+    done concurrently by the :data:`PYPI_FETCHER`. The results are
+    recorded in the :data:`UPDATE_STORE` in batches.
 
+    :param dist_names: the distribution names
+    :rtype: generator
+    :return: yields (dist_name, info) tuples as soon as each check finishes,
+             the info is the return of :func:`update_info` or a dict with
+             an "error" attribute
+    """
+    checks = []
     try:
-        DIST_PYPI_CACHE.remove(dist_name.lower())
-    except KeyError:
-        pass
+        for dist_name, pypi_rel, error in PYPI_FETCHER.iter_releases(dist_names):
+            try:
+                version = DIST_INDEX.get_distribution(dist_name).version
+            except get_pkg_res().DistributionNotFound as exc:
+                yield dist_name, {'error': str(exc), 'has_update': 0}
+                continue
+
+            checks.append((dist_name, version, pypi_rel, error))
+            if len(checks) >= UPDATE_BATCH_SIZE:
+                UPDATE_STORE.record_many(checks)
+                checks = []
+
+            if error is None:
+                yield dist_name, update_info(version, pypi_rel)
+            else:
+                yield dist_name, {'error': str(error), 'has_update': 0}
+    finally:
+        UPDATE_STORE.record_many(checks)
+
+
+@app.route('/pypi/check_updates', methods=['GET', 'POST'])
+def check_pypi_updates():
+    """ Checks for updates of many distributions at once (see the
+    :func:`iter_update_checks`). The distribution names are taken from the
+    "distributions" list of the posted json, if absent, all the installed
+    distributions are checked.
 
-    return jsonify({"has_update": 0})
+    :rtype: json
+    :return: json with the "results" attribute, mapping each distribution
+             name to the return of :func:`check_update` or to an "error"
+    """
+    dist_index = get_dist_index()
+
+    dist_names = None
+    if request.method == 'POST' and request.json:
+        dist_names = request.json.get('distributions')
+
+    if dist_names is None:
+        dist_names = [dist.project_name for dist in dist_index]
+
+    results = dict(iter_update_checks(dist_names))
+    return jsonify({'results': results})
+
+
+@app.route('/pypi/check_updates/stream')
+def stream_pypi_updates():
+    """ Checks for updates of all the installed distributions and streams
+    the results as Server-Sent Events, in the order they finish. Each
+    "message" event has the "dist_name" attribute plus the attributes of
+    :func:`check_update`, a final "done" event closes the stream.
+
+    :rtype: text/event-stream
+    """
+    dist_names = [dist.project_name for dist in get_dist_index()]
+
+    def events():
+        yield 'event: start\ndata: %s\n\n' % json.dumps({'total': len(dist_names)})
+
+        for dist_name, info in iter_update_checks(dist_names):
+            info = dict(info, dist_name=dist_name)
+            yield 'data: %s\n\n' % json.dumps(info)
+
+        yield 'event: done\ndata: {}\n\n'
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(events(), mimetype='text/event-stream', headers=headers)
 
 
 @app.route('/pypi/releases/<dist_name>')
@@ -177,7 +401,7 @@ def releases(dist_name):
 
     data = {}
 
-    pkg_dist_version = pkg_res.get_distribution(dist_name).version
+    pkg_dist_version = get_dist_index().get_distribution(dist_name).version
     pypi_rel = get_pypi_releases(dist_name)
 
     data["dist_name"] = dist_name
@@ -192,23 +416,85 @@ def releases(dist_name):
         data["last_is_great"] = pypi_last_version > current_version
         data["last_version_differ"] = last_version
 
-        if data["last_is_great"]:
-            DIST_PYPI_CACHE.add(dist_name.lower())
-        else:
-            try:
-                DIST_PYPI_CACHE.remove(dist_name.lower())
-            except KeyError:
-                pass
+    UPDATE_STORE.record(dist_name, pkg_dist_version, pypi_rel)
 
     return render_template('pypi_update.html', **data)
 
 
+@app.route('/stats/cache')
+def cache_stats():
+    """ Returns a json with the hit and miss counts of the Stallion caches.
+
+    :rtype: json
+    :return: json with the statistics of each cache
+    """
+    return jsonify({'metadata': metadata.METADATA_CACHE.stats(),
+                    'releases': PYPI_FETCHER.cache.stats(),
+                    'render': render.RENDER_CACHE.stats(),
+                    'pages': PAGE_CACHE.stats(),
+                    'updates': UPDATE_STORE.stats()})
+
+
+@app.route('/api/distributions')
+def api_distributions():
+    """ Lists the installed distributions, a page at a time (see the
+    :meth:`stallion.distindex.DistributionIndex.query`). The arguments are
+    the "offset", the "limit", the "filter" text with the "match" mode
+    ("contains" or "prefix"), the "sort" key ("name", "version" or
+    "installed") and the "order" ("asc" or "desc").
+
+    :rtype: json
+    :return: json with the "total" number of matches, the "offset", the
+             "limit" and the "distributions" of the page, or an "error"
+             with the 400 status
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    sort = request.args.get('sort', 'name')
+    match = request.args.get('match', 'contains')
+    order = request.args.get('order', 'asc')
+
+    if offset < 0 or not 0 < limit <= API_MAX_PAGE_SIZE:
+        return jsonify({'error': 'offset must be positive and limit '
+                                 'between 1 and %d' % API_MAX_PAGE_SIZE}), 400
+    if sort not in distindex.SORT_KEYS:
+        return jsonify({'error': 'sort must be one of: %s' %
+                                 ', '.join(distindex.SORT_KEYS)}), 400
+    if match not in ('contains', 'prefix') or order not in ('asc', 'desc'):
+        return jsonify({'error': 'match must be contains or prefix and '
+                                 'order must be asc or desc'}), 400
+
+    dist_index = get_dist_index(rescan_requested())
+    total, page = dist_index.query(request.args.get('filter'),
+                                   prefix=match == 'prefix', sort=sort,
+                                   reverse=order == 'desc',
+                                   offset=offset, limit=limit)
+    outdated = UPDATE_STORE.outdated()
+
+    distributions = [{'name': dist.project_name,
+                      'key': dist.key,
+                      'version': dist.version,
+                      'location': dist.location,
+                      'installed': dist_index.install_time(dist),
+                      'has_update': int(outdated.get(dist.key) == dist.version),
+                      'url': url_for('distribution', dist_name=dist.key)}
+                     for dist in page]
+
+    return jsonify({'total': total, 'offset': offset, 'limit': limit,
+                    'distributions': distributions})
+
+
 @app.route('/')
+@cached_page
 def index():
     """ The main Flask entry-point (/) for the Stallion server. """
     data = {'breadpath': [Crumb('Main')]}
 
-    data.update(get_shared_data())
+    data.update(get_shared_data(rescan_requested()))
     data['menu_home'] = 'active'
 
     sys_info = {'Python Platform': sys.platform,
@@ -231,24 +517,44 @@ def index():
     return render_template('system_information.html', **data)
 
 @app.route('/console_scripts')
+@cached_page
 def console_scripts():
     """ Entry point for the global console scripts """
     data = {}
-    data.update(get_shared_data())
+    data.update(get_shared_data(rescan_requested()))
     data['menu_console_scripts'] = 'active'
     data['breadpath'] = [Crumb('Console Scripts')]
 
-    entry_console = get_pkg_res().iter_entry_points('console_scripts')
-    data['scripts'] = entry_console
+    if rescan_requested():
+        ENTRY_POINT_INDEX.snapshot.update(rebuild=True)
+
+    data['scripts'] = ENTRY_POINT_INDEX.by_group('console_scripts')
 
     return render_template('console_scripts.html', **data)
 
+@app.route('/verify')
+@cached_page
+def verify():
+    """ Entry point of the requirement conflicts of the installed
+    distributions (/verify). """
+    data = {}
+    data.update(get_shared_data(rescan_requested()))
+    data['menu_verify'] = 'active'
+    data['breadpath'] = [Crumb('Verify')]
+
+    graph = get_dep_graph()
+    data['graph'] = graph
+    data['problems'] = graph.problems()
+
+    return render_template('verify.html', **data)
+
 @app.route('/about')
+@cached_page
 def about():
     """ The About entry-point (/about) for the Stallion server. """
 
     data = {}
-    data.update(get_shared_data())
+    data.update(get_shared_data(rescan_requested()))
     data['menu_about'] = 'active'
 
     data['breadpath'] = [Crumb('About')]
@@ -260,6 +566,7 @@ def about():
 
 
 @app.route('/distribution/<dist_name>')
+@cached_page
 def distribution(dist_name=None):
     """ The Distribution entry-point (/distribution/<dist_name>)
     for the Stallion server.
@@ -267,39 +574,32 @@ def distribution(dist_name=None):
     :param dist_name: the package name
     """
 
-    pkg_dist = get_pkg_res().get_distribution(dist_name)
-
     data = {}
-    data.update(get_shared_data())
+    data.update(get_shared_data(rescan_requested()))
+
+    pkg_dist = DIST_INDEX.get_distribution(dist_name)
 
     data['dist'] = pkg_dist
     data['breadpath'] = [Crumb('Main', url_for('index')),
                          Crumb('Package'), Crumb(pkg_dist.project_name)]
 
-    settings_overrides = {
-        'raw_enabled': 0,  # no raw HTML code
-        'file_insertion_enabled': 0,  # no file/URL access
-        'halt_level': 2,  # at warnings or errors, raise an exception
-        'report_level': 5,  # never report problems with the reST code
-    }
-
-    pkg_metadata = pkg_dist.get_metadata(metadata.METADATA_NAME)
-    parsed, key_known = metadata.parse_metadata(pkg_metadata)
-    distinfo = metadata.metadata_to_dict(parsed, key_known)
-
-    parts = None
-    try:
-        parts = publish_parts(source=distinfo['description'],
-                              writer_name='html',
-                              settings_overrides=settings_overrides)
-    except:
-        pass
+    distinfo = metadata.get_distribution_metadata(pkg_dist)
 
     data['distinfo'] = distinfo
     data['entry_map'] = pkg_dist.get_entry_map()
+    data['description_render'], final = render.render_distribution(pkg_dist, distinfo)
+
+    # The plain text is shown while a slow description renders, the page
+    # is rendered again on the next request
+    if not final:
+        g.page_cacheable = False
 
-    if parts is not None:
-        data['description_render'] = parts['body']
+    graph = get_dep_graph()
+    data['graph'] = graph
+    data['dependencies'] = graph.requires(pkg_dist.key, extras=True)
+    data['required_by'] = graph.required_by(pkg_dist.key, extras=True)
+    data['all_dependencies'] = graph.closure(pkg_dist.key)
+    data['all_required_by'] = graph.closure(pkg_dist.key, reverse=True)
 
     return render_template('distribution.html', **data)
 
@@ -340,6 +640,64 @@ def run_main():
                          ' Default is False.',
                     default=False)
 
+    parser.add_option('--index-url', dest='index_url',
+                    help='The package index used to check for updates, ' \
+                         'prefix it with \'xmlrpc+\', \'json+\' or ' \
+                         '\'simple+\' to pick the API, or use a local ' \
+                         'directory of wheels and sdists. ' \
+                         'Default is \'%s\'.' % PYPI_XMLRPC,
+                    metavar="URL", default=PYPI_XMLRPC)
+
+    parser.add_option('--pypi-workers', dest='pypi_workers', type='int',
+                    help='The maximum number of concurrent PyPI lookups.' \
+                         ' Default is 8.',
+                    metavar="N", default=8)
+
+    parser.add_option('--pypi-timeout', dest='pypi_timeout', type='float',
+                    help='The timeout in seconds of each PyPI request.' \
+                         ' Default is 10.',
+                    metavar="SECONDS", default=10.0)
+
+    parser.add_option('--pypi-cache-ttl', dest='pypi_cache_ttl', type='float',
+                    help='Seconds before the cached PyPI releases are' \
+                         ' refreshed. Default is 3600.',
+                    metavar="SECONDS", default=3600.0)
+
+    parser.add_option('--prerender', dest='prerender', action='store_true',
+                    help='Render the descriptions of all packages in' \
+                         ' background at startup. Default is False.',
+                    default=False)
+
+    parser.add_option('--scan-interval', dest='scan_interval', type='float',
+                    help='Seconds between the background update checks' \
+                         ' of each package, 0 disables them.' \
+                         ' Default is 3600 with --workers or --threads,' \
+                         ' 0 with the development server.',
+                    metavar="SECONDS", default=None)
+
+    parser.add_option('--scan-jitter', dest='scan_jitter', type='float',
+                    help='Maximum random seconds added to the wait' \
+                         ' between the background update checks.' \
+                         ' Default is 60.',
+                    metavar="SECONDS", default=60.0)
+
+    parser.add_option('--scan-workers', dest='scan_workers', type='int',
+                    help='The maximum number of concurrent lookups of' \
+                         ' the background update checks. Default is 4.',
+                    metavar="N", default=4)
+
+    parser.add_option('--workers', dest='workers', type='int',
+                    help='Serve with N worker processes, using gunicorn' \
+                         ' if it is installed. Default is the' \
+                         ' development server.',
+                    metavar="N", default=None)
+
+    parser.add_option('--threads', dest='threads', type='int',
+                    help='Serve with N request threads per worker' \
+                         ' process. Default is %d with --workers.' %
+                         server.DEFAULT_THREADS,
+                    metavar="N", default=None)
+
     parser.add_option('-w', '--web-browser', dest='web_browser', action='store_true',
                     help='Open a web browser to show Stallion.' \
                          ' Default is False.',
@@ -347,17 +705,60 @@ def run_main():
 
     (options, args) = parser.parse_args()
 
+    production = options.workers is not None or options.threads is not None
+    if production and (options.debug or options.reloader or options.evalx):
+        parser.error('the debug, reloader and evalex options are only '
+                     'available with the development server')
+    if (options.workers is not None and options.workers < 1) or \
+            (options.threads is not None and options.threads < 1):
+        parser.error('the number of workers and threads must be positive')
+    if options.scan_interval is None:
+        # The development server doesn't poll the package index unless asked
+        options.scan_interval = 3600.0 if production else 0.0
+    if options.scan_interval < 0 or options.scan_jitter < 0 or \
+            options.scan_workers < 1:
+        parser.error('the scan interval and jitter can\'t be negative and '
+                     'the number of scan workers must be positive')
+
+    PYPI_FETCHER.index = backends.index_from_url(options.index_url,
+                                                 options.pypi_timeout)
+    PYPI_FETCHER.max_workers = options.pypi_workers
+    PYPI_FETCHER.cache.ttl = options.pypi_cache_ttl
+
+    UPDATE_SCANNER.interval = options.scan_interval
+    UPDATE_SCANNER.jitter = options.scan_jitter
+    UPDATE_SCANNER.max_workers = options.scan_workers
+
     if not options.verbose:
         print(" * Running on http://%s:%s/" % (options.host, options.port))
         werk_log = logging.getLogger('werkzeug')
         werk_log.setLevel(logging.WARNING)
 
+    def worker_init():
+        # The background threads are started by each worker process
+        if options.prerender:
+            render.start_warm_up(get_dist_index().distributions())
+        if options.scan_interval > 0:
+            UPDATE_SCANNER.start()
+
     if options.web_browser:
         import webbrowser
         webbrowser.open('http://%s:%s/' % (options.host, options.port))
 
+    if production:
+        server.serve(app, options.host, options.port,
+                     workers=options.workers or 1,
+                     threads=options.threads or server.DEFAULT_THREADS,
+                     worker_init=worker_init)
+        return
+
+    worker_init()
+
+    # The update checks are streamed over a long-lived connection,
+    # so the other requests must be served by other threads
     app.run(debug=options.debug, host=options.host, port=int(options.port),
-            use_evalex=options.evalx, use_reloader=options.reloader)
+            use_evalex=options.evalx, use_reloader=options.reloader,
+            threaded=True)
 
 if __name__ == '__main__':
     run_main()
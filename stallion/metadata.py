@@ -9,9 +9,11 @@
 ==================================================================
 """
 
+import os
 import string
 from email.parser import Parser
-import pkg_resources
+
+from stallion.cache import LRUCache
 
 # Tuple metadata format
 # (Field Name, lowered field name, Optional)
@@ -54,20 +56,98 @@ HEADER_META_1_2 = HEADER_META_1_1 + (
     'project-url',
 )
 
+# Based on the PEP-0566, the 2.0 version (PEP-0426) was withdrawn but some
+# old wheels still use it. Since 2.1 the description may be the message body
+HEADER_META_2_1 = HEADER_META_1_2 + (
+    'description-content-type',
+    'provides-extra',
+)
+
+# Based on the PEP-0643, the 2.3 version (PEP-0685) has the same fields
+HEADER_META_2_2 = HEADER_META_2_1 + (
+    'dynamic',
+)
+
+# Based on the PEP-0639
+HEADER_META_2_4 = HEADER_META_2_2 + (
+    'license-expression',
+    'license-file',
+)
+
 HEADER_META = {
     '1.0': HEADER_META_1_0,
     '1.1': HEADER_META_1_1,
     '1.2': HEADER_META_1_2,
+    '2.0': HEADER_META_2_1,
+    '2.1': HEADER_META_2_1,
+    '2.2': HEADER_META_2_2,
+    '2.3': HEADER_META_2_2,
+    '2.4': HEADER_META_2_4,
 }
 
+# Unknown versions are parsed as the latest one
+LATEST_METADATA_VERSION = '2.4'
+
+# The metadata file of the egg-info distributions, the dist-info ones use
+# the METADATA file (see the :func:`metadata_name`)
 METADATA_NAME = 'PKG-INFO'
 
+# Key of the raw description in the lazy metadata dictionaries, the
+# description is only normalized when it is needed, see the
+# :func:`get_description`
+RAW_DESCRIPTION_KEY = '_raw_description'
+
+# Fields that may appear many times in the metadata, the other fields are
+# read from their first occurrence by the :class:`LazyMetadata`
+MULTIPLE_USE_FIELDS = frozenset([
+    'platform',
+    'supported-platform',
+    'classifier',
+    'requires',
+    'provides',
+    'obsoletes',
+    'requires-external',
+    'requires-dist',
+    'provides-dist',
+    'obsoletes-dist',
+    'project-url',
+    'provides-extra',
+    'license-file',
+    'dynamic',
+])
+
+# Processed metadata dictionaries, shared by the views and the console,
+# see the :func:`get_distribution_metadata`
+METADATA_CACHE = LRUCache(maxsize=1024)
+
+
+def metadata_name(dist):
+    """ Returns the name of the metadata file of a distribution, 'PKG-INFO' for the
+    egg-info distributions and 'METADATA' for the dist-info (wheel) ones.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: string
+    :return: the metadata file name
+    """
+    return getattr(dist, 'PKG_INFO', METADATA_NAME)
+
+
+def get_metadata_text(dist):
+    """ Returns the raw metadata text of a distribution (see :func:`metadata_name`).
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: string
+    :return: the raw metadata text
+    """
+    return dist.get_metadata(metadata_name(dist))
+
 
 def parse_metadata(metadata):
-    """ Parse the package PKG-INFO metadata. Currently supports versions 1.0 (PEP-0241),
-    1.1 (PEP-0314), 1.2 (PEP-0345).
+    """ Parse the package PKG-INFO or METADATA metadata. Currently supports versions 1.0
+    (PEP-0241), 1.1 (PEP-0314), 1.2 (PEP-0345), 2.1 (PEP-0566), 2.2 (PEP-0643), 2.3
+    (PEP-0685) and 2.4 (PEP-0639).
 
-    :param metadata: the raw PKG-INFO metadata text
+    :param metadata: the raw PKG-INFO or METADATA metadata text
     :type metadata: string
     :rtype: tuple
     :return: (parsed_metadata, key_known), the parsed_metadata is the rfc822.Message
@@ -75,7 +155,8 @@ def parse_metadata(metadata):
              is part of the metadata version specification
     """
     parsed_metadata = Parser().parsestr(metadata)
-    metadata_spec = set(HEADER_META[parsed_metadata['metadata-version']])
+    metadata_spec = set(HEADER_META.get(parsed_metadata['metadata-version'],
+                                        HEADER_META[LATEST_METADATA_VERSION]))
     key_exist = set([s.lower() for s in parsed_metadata.keys()])
     return (parsed_metadata, key_exist.intersection(metadata_spec))
 
@@ -85,26 +166,47 @@ def clean_lead_ws_description(metadata, field_name):
     extra space some authors add in front of the 'description' field and to handle some other
     field cases.
 
+    The description is processed in linear time: the most common indentation is counted in a
+    single pass over the lines and the dedented lines are joined into one output buffer.
+
     :param metadata: the metadata text
     :param field_name: the name of the field, like 'description'
     :rtype: string
     :return: the processed metadata
     """
-    def calc_leading(line):
-        return len(line) - len(line.lstrip())
+    if field_name.lower() != 'description':
+        return ' '.join([line.strip() for line in metadata.splitlines()])
 
-    def most_common(lst):
-        return max(set(lst), key=lst.count)
+    lines = metadata.splitlines()
+    indent_count = {}
+    first = last = None
 
-    if field_name.lower() == 'description':
-        leading_ws_count = [calc_leading(line) for line in metadata.splitlines()]
-        most_common_ws_count = most_common(leading_ws_count)
+    for i, line in enumerate(lines):
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        indent_count[indent] = indent_count.get(indent, 0) + 1
+        if stripped:
+            if first is None:
+                first = i
+            last = i
 
-        strip_split = metadata.strip().splitlines()
-        return '\n'.join([line[most_common_ws_count:] if line.startswith(' ' * most_common_ws_count) else line
-                          for line in strip_split])
-    else:
-        return ' '.join([line.strip() for line in metadata.splitlines()])
+    if first is None:
+        return ''
+
+    # On ties, the smallest indentation wins
+    most_common_ws_count = max(sorted(indent_count), key=indent_count.get)
+    prefix = ' ' * most_common_ws_count
+
+    def dedent():
+        for i in range(first, last + 1):
+            line = lines[i]
+            if i == first:
+                line = line.lstrip()
+            if i == last:
+                line = line.rstrip()
+            yield line[most_common_ws_count:] if line.startswith(prefix) else line
+
+    return '\n'.join(dedent())
 
 
 def field_process(field_name, field_value):
@@ -136,7 +238,8 @@ def field_process(field_name, field_value):
 
     f_value = clean_lead_ws_description(field_value, field_name)
 
-    if hasattr(f_value, 'decode'):
+    # The metadata read by the snapshot is already decoded
+    if isinstance(f_value, bytes):
         f_value = f_value.decode('utf-8')
 
     if f_value == 'UNKNOWN':
@@ -148,11 +251,14 @@ def field_process(field_name, field_value):
     return f_value
 
 
-def metadata_to_dict(parsed_metadata, key_known):
+def metadata_to_dict(parsed_metadata, key_known, lazy_description=False):
     """ This is the main function used to process the parsed metadata into a structured
     and pre-processed data dictionary.
 
     :param parsed_metadata: the return of the function :func:`stallion.metadata.parse_metadata`.
+    :param lazy_description: if True, the description isn't processed, the raw text is
+                             kept in the :data:`RAW_DESCRIPTION_KEY` (see the
+                             :func:`get_description`)
     :rtype: dictionary
     :returns: the processed metadata dictionary
     """
@@ -165,8 +271,206 @@ def metadata_to_dict(parsed_metadata, key_known):
             all_values = all_values[0]
 
         fl_name = field.lower()
+        if lazy_description and fl_name == 'description':
+            mdict[RAW_DESCRIPTION_KEY] = all_values
+            continue
+
         fl_processed = field_process(fl_name, all_values)
         if fl_processed:
             mdict[fl_name] = fl_processed
 
+    # Since the 2.1 version the description may be the message body
+    if 'description' not in mdict and RAW_DESCRIPTION_KEY not in mdict:
+        body = parsed_metadata.get_payload()
+        if body and body.strip():
+            if lazy_description:
+                mdict[RAW_DESCRIPTION_KEY] = body
+            else:
+                mdict['description'] = field_process('description', body)
+
     return mdict
+
+
+def get_description(distinfo):
+    """ Returns the processed description of a metadata dictionary, the raw description
+    of the lazy dictionaries (see the :func:`metadata_to_dict`) is processed here.
+
+    :param distinfo: the processed metadata dictionary
+    :rtype: string
+    :return: the description or None if there isn't one
+    """
+    if 'description' in distinfo:
+        return distinfo['description']
+
+    raw_description = distinfo.get(RAW_DESCRIPTION_KEY)
+    if not raw_description or isinstance(raw_description, list):
+        return None
+
+    return field_process('description', raw_description) or None
+
+
+class LazyMetadata(object):
+    """ Read-only view of the processed metadata (see :func:`metadata_to_dict`) that
+    scans the metadata headers on demand. The scan stops as soon as the requested fields
+    are found, so the long fields at the end (like the description) are never read when
+    they aren't needed, and each field is only processed when it is accessed.
+
+        >>> info = LazyMetadata(get_metadata_text(dist))
+        >>> info['summary']
+    """
+    def __init__(self, metadata):
+        """ Instantiates a new lazy metadata.
+
+        :param metadata: the raw PKG-INFO or METADATA metadata text
+        """
+        self._text = metadata
+        self._pos = 0
+        self._body_pos = None
+        self._done = False
+        self._raw = {}
+        self._processed = {}
+
+    def _next_header(self):
+        """ Reads the next header, joining its continuation lines.
+
+        :rtype: tuple
+        :return: (lowered field name, value) or None at the end of the headers
+        """
+        text = self._text
+        size = len(text)
+
+        while self._pos < size:
+            end = text.find('\n', self._pos)
+            if end < 0:
+                end = size
+            line = text[self._pos:end].rstrip('\r')
+            self._pos = end + 1
+
+            if not line.strip():
+                self._body_pos = self._pos
+                break
+
+            name, sep, value = line.partition(':')
+            if not sep or line[0] in ' \t':
+                continue
+
+            lines = [value.lstrip(' \t')]
+            while self._pos < size and text[self._pos] in ' \t':
+                end = text.find('\n', self._pos)
+                if end < 0:
+                    end = size
+                lines.append(text[self._pos:end].rstrip('\r'))
+                self._pos = end + 1
+
+            return (name.strip().lower(), '\n'.join(lines))
+
+        self._done = True
+        return None
+
+    def _scan(self, field=None):
+        """ Scans the headers until the field is complete, or until the end of the
+        headers if the field is None.
+        """
+        while not self._done:
+            if field is not None and field not in MULTIPLE_USE_FIELDS \
+                    and field in self._raw:
+                return
+
+            header = self._next_header()
+            if header is None:
+                return
+
+            name, value = header
+            if name in MULTIPLE_USE_FIELDS:
+                self._raw.setdefault(name, []).append(value)
+            else:
+                self._raw.setdefault(name, value)
+
+    def _value(self, field):
+        field = field.lower()
+        if field in self._processed:
+            return self._processed[field]
+
+        self._scan(field)
+        raw_value = self._raw.get(field)
+
+        # Since the 2.1 version the description may be the message body
+        if raw_value is None and field == 'description' and self._body_pos is not None:
+            raw_value = self._text[self._body_pos:]
+
+        if isinstance(raw_value, list) and len(raw_value) == 1:
+            raw_value = raw_value[0]
+
+        value = field_process(field, raw_value) if raw_value is not None else None
+        self._processed[field] = value
+        return value
+
+    def __getitem__(self, field):
+        value = self._value(field)
+        if not value:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return bool(self._value(field))
+
+    def get(self, field, default=None):
+        """ Returns the processed field or the default if it isn't present. """
+        value = self._value(field)
+        return value if value else default
+
+    def keys(self):
+        """ Returns the present fields, all the headers are scanned. """
+        self._scan()
+        fields = [field for field in self._raw if field in self]
+        if 'description' not in self._raw and 'description' in self:
+            fields.append('description')
+        return fields
+
+    def to_dict(self):
+        """ Returns the processed metadata dictionary, like the :func:`metadata_to_dict`.
+
+        :rtype: dictionary
+        """
+        return dict((field, self[field]) for field in self.keys())
+
+
+def metadata_cache_key(dist):
+    """ Returns the cache key of the distribution metadata, it is built
+    using the distribution location and the metadata file modification
+    time and size, so a reinstall yields a new key.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: tuple
+    :return: the cache key
+    """
+    egg_info = getattr(dist, 'egg_info', None)
+    if egg_info:
+        try:
+            meta_stat = os.stat(os.path.join(egg_info, metadata_name(dist)))
+            return (dist.location, egg_info, meta_stat.st_mtime, meta_stat.st_size)
+        except OSError:
+            pass
+
+    return (dist.location, dist.key, dist.version)
+
+
+def get_distribution_metadata(dist):
+    """ Returns the processed metadata dictionary of a distribution
+    (see :func:`metadata_to_dict`), using the :data:`METADATA_CACHE`. The
+    description is lazy, use the :func:`get_description` to read it.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: dictionary
+    :return: a copy of the processed metadata dictionary
+    """
+    key = metadata_cache_key(dist)
+    distinfo = METADATA_CACHE.get(key)
+
+    if distinfo is None:
+        pkg_metadata = get_metadata_text(dist)
+        parsed, key_known = parse_metadata(pkg_metadata)
+        distinfo = metadata_to_dict(parsed, key_known, lazy_description=True)
+        METADATA_CACHE.set(key, distinfo)
+
+    return dict(distinfo)
@@ -0,0 +1,174 @@
+"""
+.. module:: output
+   :platform: Unix, Windows
+   :synopsis: Buffered and machine-readable output of the plp console.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`output` -- buffered and machine-readable console output
+==================================================================
+"""
+import sys
+import csv
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# The output formats of the plp commands, the 'text' one is colored
+FORMATS = ('text', 'json', 'ndjson', 'csv')
+
+PY2 = sys.version_info[0] == 2
+
+
+class OutputBuffer(object):
+    """ Buffers the console output into a few large writes, the buffer is
+    written when it is full or when the last write is older than the
+    interval, so the rows still show up while they are produced.
+    """
+    def __init__(self, stream=None, bufsize=16384, interval=0.2):
+        """ Instantiates a new buffer.
+
+        :param stream: the output stream, default is the sys.stdout
+        :param bufsize: the buffer size in characters
+        :param interval: the maximum seconds a row is kept in the buffer
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.bufsize = bufsize
+        self.interval = interval
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.time()
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.bufsize or \
+                time.time() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        text = ''.join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._last_flush = time.time()
+
+        if not isinstance(text, str):
+            text = text.encode(getattr(self.stream, 'encoding', None) or 'utf-8',
+                               'replace')
+        self.stream.write(text)
+        self.stream.flush()
+
+
+class RecordWriter(object):
+    """ The base class of the machine-readable writers, each record is a
+    dictionary.
+    """
+    def __init__(self, stream=None, fields=None, many=True):
+        """ Instantiates a new writer.
+
+        :param stream: the output stream, default is the sys.stdout
+        :param fields: the fields of the records, in order, if None all
+                       the fields of the first record are written
+        :param many: if False, a single record is written
+        """
+        self.out = OutputBuffer(stream)
+        self.fields = fields
+        self.many = many
+
+    def write(self, record):
+        """ Writes a record.
+
+        :param record: the record dictionary
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Writes the pending output. """
+        self.out.flush()
+
+
+class JsonWriter(RecordWriter):
+    """ Writes a JSON array with the records, or the single record. """
+
+    def __init__(self, *args, **kwargs):
+        RecordWriter.__init__(self, *args, **kwargs)
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        data = self.records if self.many else (self.records or [None])[0]
+        self.out.write(json.dumps(data, indent=2, sort_keys=True,
+                                  separators=(',', ': ')))
+        self.out.write('\n')
+        RecordWriter.close(self)
+
+
+class NdjsonWriter(RecordWriter):
+    """ Writes one JSON record per line, as soon as each one is ready. """
+
+    def write(self, record):
+        self.out.write(json.dumps(record, sort_keys=True))
+        self.out.write('\n')
+
+
+def csv_value(value):
+    """ Returns the CSV cell of a record value, the lists are joined with
+    commas and the dictionaries are written as JSON.
+
+    :param value: the record value
+    :rtype: string
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = ', '.join(csv_value(v) for v in value)
+    elif isinstance(value, dict):
+        value = json.dumps(value, sort_keys=True)
+    elif not isinstance(value, basestring if PY2 else str):
+        value = str(value)
+
+    if PY2 and not isinstance(value, str):
+        value = value.encode('utf-8')
+    return value
+
+
+class CsvWriter(RecordWriter):
+    """ Writes the records as CSV rows, with a header row. """
+
+    def __init__(self, *args, **kwargs):
+        RecordWriter.__init__(self, *args, **kwargs)
+        self._writer = None
+
+    def write(self, record):
+        if self._writer is None:
+            if self.fields is None:
+                self.fields = sorted(record)
+            self._writer = csv.writer(self.out, lineterminator='\n')
+            self._writer.writerow(self.fields)
+
+        self._writer.writerow([csv_value(record.get(field))
+                               for field in self.fields])
+
+
+WRITERS = {
+    'json': JsonWriter,
+    'ndjson': NdjsonWriter,
+    'csv': CsvWriter,
+}
+
+
+def get_writer(output_format, fields=None, many=True, stream=None):
+    """ Returns the writer of a machine-readable format.
+
+    :param output_format: 'json', 'ndjson' or 'csv'
+    :param fields: the fields of the records, see the :class:`RecordWriter`
+    :param many: if False, a single record is written
+    :param stream: the output stream, default is the sys.stdout
+    :rtype: RecordWriter
+    """
+    return WRITERS[output_format](stream, fields, many)
@@ -0,0 +1,295 @@
+"""
+.. module:: pypi
+   :platform: Unix, Windows
+   :synopsis: Concurrent fetching of the PyPI releases.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`pypi` -- concurrent fetching of the PyPI releases
+==================================================================
+"""
+import time
+import socket
+import threading
+
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+from stallion import backends
+from stallion import storage
+from stallion import workers
+from stallion.backends import PYPI_XMLRPC, get_proxy, normalize_name
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Errors worth retrying, the xmlrpclib.Fault isn't one of them and the
+# backends.IndexUnavailable is only retried on the server errors
+RETRY_ERRORS = (socket.error, xmlrpclib.ProtocolError, httplib.HTTPException,
+                backends.IndexUnavailable)
+
+
+def sort_releases(releases):
+    """ Sorts the releases using the pkg_resources.parse_version, the
+    lastest version is on the 0 index.
+
+    :param releases: a list of version strings
+    :rtype: list
+    :return: the sorted list
+    """
+    import pkg_resources
+    return sorted(releases, key=pkg_resources.parse_version, reverse=True)
+
+
+class ReleaseCache(object):
+    """ Cache of the release lists keyed by the package index location
+    and the normalized project name, the entries are kept in memory and in
+    a sqlite database inside the Stallion data directory, so they survive
+    restarts and are shared by the Stallion server and the plp console.
+    """
+    def __init__(self, filename='releases.db', ttl=3600.0):
+        """ Instantiates a new cache.
+
+        :param filename: the database file name, None to keep the
+                         entries in memory only
+        :param ttl: seconds after which an entry is stale
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = storage.connect(self.filename)
+        conn.execute('CREATE TABLE IF NOT EXISTS index_releases ('
+                     '  location TEXT, name TEXT, releases TEXT, fetched REAL,'
+                     '  PRIMARY KEY (location, name))')
+        return conn
+
+    def _load(self, key):
+        if self.filename is None:
+            return None
+
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT releases, fetched FROM index_releases'
+                               ' WHERE location = ? AND name = ?', key).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+        return (json.loads(row[0]), row[1])
+
+    def get(self, dist_name, location=''):
+        """ Returns the cached releases of a distribution.
+
+        :param dist_name: the distribution name
+        :param location: the location of the package index (see the
+                         :attr:`stallion.backends.PackageIndex.location`)
+        :rtype: tuple
+        :return: (releases, is_stale) or None if not cached
+        """
+        key = (location, normalize_name(dist_name))
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        # Another process may have refreshed the entry
+        if entry is None or now - entry[1] > self.ttl:
+            stored = self._load(key)
+            if stored is not None and (entry is None or stored[1] > entry[1]):
+                entry = stored
+                with self._lock:
+                    self._entries[key] = entry
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        is_stale = now - entry[1] > self.ttl
+        if is_stale:
+            self.stale += 1
+        else:
+            self.hits += 1
+
+        return (entry[0], is_stale)
+
+    def set(self, dist_name, releases, location=''):
+        """ Stores the releases of a distribution.
+
+        :param dist_name: the distribution name
+        :param releases: the sorted list of releases
+        :param location: the location of the package index
+        """
+        key = (location, normalize_name(dist_name))
+        entry = (list(releases), time.time())
+
+        with self._lock:
+            self._entries[key] = entry
+
+        if self.filename is None:
+            return
+
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO index_releases VALUES (?, ?, ?, ?)',
+                         key + (json.dumps(entry[0]), entry[1]))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """ Returns the cache statistics.
+
+        :rtype: dict
+        :return: dictionary with the size, ttl, hits, stale hits and misses
+        """
+        return {'size': len(self._entries), 'ttl': self.ttl, 'hits': self.hits,
+                'stale': self.stale, 'misses': self.misses}
+
+
+class ReleaseFetcher(object):
+    """ Fetches the releases of the distributions available at a package
+    index (see the :mod:`stallion.backends`), many distributions are looked
+    up concurrently and the requests are retried on network errors.
+    """
+    def __init__(self, index=None, max_workers=8, retries=2,
+                 retry_delay=0.5, cache=None, background=True):
+        """ Instantiates a new fetcher.
+
+        :param index: the package index backend, if None the PyPI XML-RPC
+                      API is used
+        :param max_workers: the maximum number of concurrent lookups
+        :param retries: how many times a failed request is retried
+        :param retry_delay: seconds before the first retry, it doubles
+                            on each retry
+        :param cache: the :class:`ReleaseCache`, None to disable caching
+        :param background: if True, stale cache entries are returned right
+                           away and refreshed in a background thread,
+                           otherwise they are refreshed before returning
+        """
+        self.index = index if index is not None else backends.XmlRpcIndex()
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cache = cache
+        self.background = background
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    def _call(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return getattr(self.index, method)(*args)
+            except RETRY_ERRORS as exc:
+                if attempt >= self.retries or \
+                        not getattr(exc, 'retryable', True):
+                    raise
+                time.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+
+    def fetch(self, dist_name):
+        """ Fetches the sorted releases of a distribution from the index,
+        bypassing the cache (which is updated).
+
+        :param dist_name: the distribution name
+        :rtype: list
+        :return: a list with the releases available at PyPI
+        """
+        ret = sort_releases(self._call('releases', dist_name))
+
+        if self.cache is not None:
+            self.cache.set(dist_name, ret, self.index.location)
+
+        return ret
+
+    def _revalidate(self, dist_name):
+        name = normalize_name(dist_name)
+
+        with self._refreshing_lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def refresh():
+            try:
+                self.fetch(dist_name)
+            except Exception:
+                pass
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(name)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def releases(self, dist_name):
+        """ Returns the sorted releases of a distribution, the lastest
+        version is on the 0 index. The cached releases are used when
+        available, stale ones are revalidated.
+
+        :param dist_name: the distribution name
+        :rtype: list
+        :return: a list with the releases available at PyPI
+        """
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.get(dist_name, self.index.location)
+
+        if cached is None:
+            return self.fetch(dist_name)
+
+        releases, is_stale = cached
+        if is_stale:
+            if not self.background:
+                return self.fetch(dist_name)
+            self._revalidate(dist_name)
+
+        return releases
+
+    def search(self, spec, operator='or'):
+        """ Searches the index, see the :func:`stallion.main.get_pypi_search`.
+
+        :param spec: dict with the search spec
+        :param operator: 'and' or 'or'
+        :rtype: list
+        :return: a list of dicts with the name, version and summary
+        """
+        return self._call('search', spec, operator)
+
+    def iter_releases(self, dist_names):
+        """ Fetches the releases of many distributions concurrently.
+
+        :param dist_names: the distribution names
+        :rtype: generator
+        :return: yields (dist_name, releases, exception) tuples, as soon as
+                 each lookup finishes
+        """
+        return workers.imap_unordered(self.releases, dist_names, self.max_workers)
+
+    def fetch_many(self, dist_names):
+        """ Fetches the releases of many distributions concurrently.
+
+        :param dist_names: the distribution names
+        :rtype: dict
+        :return: dict mapping each distribution name to its releases, the
+                 failed lookups are mapped to None
+        """
+        return dict((dist_name, releases) for dist_name, releases, error
+                    in self.iter_releases(dist_names))
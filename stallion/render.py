@@ -0,0 +1,154 @@
+"""
+.. module:: render
+   :platform: Unix, Windows
+   :synopsis: Cached rendering of the reStructuredText descriptions.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`render` -- cached rendering of the descriptions
+==================================================================
+"""
+import logging
+import threading
+
+from xml.sax.saxutils import escape
+
+from docutils.core import publish_parts
+
+from stallion import metadata
+from stallion.cache import LRUCache
+
+log = logging.getLogger(__name__)
+
+# Rendered descriptions keyed by (distribution key, version)
+RENDER_CACHE = LRUCache(maxsize=256)
+
+# Seconds a view waits for a description to render, after that the
+# plain text is shown while the rendering finishes in background
+RENDER_TIMEOUT = 2.0
+
+# The threads rendering each key, so the views waiting for the same
+# description share one rendering
+_rendering = {}
+_rendering_lock = threading.Lock()
+
+SETTINGS_OVERRIDES = {
+    'raw_enabled': 0,  # no raw HTML code
+    'file_insertion_enabled': 0,  # no file/URL access
+    'halt_level': 2,  # at warnings or errors, raise an exception
+    'report_level': 5,  # never report problems with the reST code
+}
+
+
+def plain_text_html(description):
+    """ Returns the description as escaped, preformatted HTML.
+
+    :param description: the description text
+    :rtype: string
+    :return: the HTML
+    """
+    return '<pre>%s</pre>' % escape(description)
+
+
+def _render(key, description):
+    try:
+        try:
+            parts = publish_parts(source=description, writer_name='html',
+                                  settings_overrides=SETTINGS_OVERRIDES)
+            html = parts['body']
+        except Exception:
+            log.warning('Unable to render the description of %s %s',
+                        key[0], key[1], exc_info=True)
+            html = plain_text_html(description)
+
+        RENDER_CACHE.set(key, html)
+        return html
+    finally:
+        with _rendering_lock:
+            _rendering.pop(key, None)
+
+
+def _rendering_thread(key, description):
+    """ Returns the thread rendering a key, a new one is started only
+    if no other thread is rendering it.
+
+    :rtype: threading.Thread
+    """
+    with _rendering_lock:
+        thread = _rendering.get(key)
+        if thread is None:
+            thread = threading.Thread(target=_render, args=(key, description))
+            thread.daemon = True
+            _rendering[key] = thread
+            thread.start()
+    return thread
+
+
+def render_description(key, description, timeout=RENDER_TIMEOUT):
+    """ Renders the reStructuredText description to HTML using the
+    :data:`RENDER_CACHE`. Invalid descriptions are rendered as plain text.
+
+    :param key: the cache key, a (distribution key, version) tuple
+    :param description: the description text
+    :param timeout: seconds to wait for the rendering, None to wait for
+                    it to finish
+    :rtype: tuple
+    :return: (html, final), the html is the plain text HTML if the
+             rendering takes longer than the timeout, and then final is
+             False because the rendering continues in background
+    """
+    html = RENDER_CACHE.get(key)
+    if html is not None:
+        return html, True
+
+    thread = _rendering_thread(key, description)
+    thread.join(timeout)
+
+    html = RENDER_CACHE.get(key)
+    if thread.is_alive() or html is None:
+        log.warning('Rendering the description of %s %s took more than %.1fs',
+                    key[0], key[1], timeout)
+        return plain_text_html(description), False
+
+    return html, True
+
+
+def render_distribution(dist, distinfo=None, timeout=RENDER_TIMEOUT):
+    """ Renders the description of a distribution (see the
+    :func:`render_description`).
+
+    :param dist: the pkg_resources.Distribution
+    :param distinfo: the processed metadata, if None it is loaded
+    :param timeout: seconds to wait for the rendering
+    :rtype: tuple
+    :return: (html, final), the html is None if there isn't a description
+    """
+    if distinfo is None:
+        distinfo = metadata.get_distribution_metadata(dist)
+
+    description = metadata.get_description(distinfo)
+    if not description:
+        return None, True
+
+    return render_description((dist.key, dist.version), description, timeout)
+
+
+def start_warm_up(distributions):
+    """ Renders the descriptions of the distributions in a background
+    thread, so the views find them in the cache.
+
+    :param distributions: the pkg_resources.Distribution list
+    :rtype: threading.Thread
+    :return: the started thread
+    """
+    def warm_up():
+        for dist in distributions:
+            try:
+                render_distribution(dist, timeout=None)
+            except Exception:
+                log.debug('Unable to load the metadata of %s', dist, exc_info=True)
+
+    thread = threading.Thread(target=warm_up)
+    thread.daemon = True
+    thread.start()
+    return thread
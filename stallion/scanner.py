@@ -0,0 +1,219 @@
+"""
+.. module:: scanner
+   :platform: Unix, Windows
+   :synopsis: Scheduled background checks of the package updates.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`scanner` -- scheduled background checks of the package updates
+==================================================================
+"""
+import os
+import time
+import random
+import socket
+import logging
+import threading
+
+from stallion import workers
+
+log = logging.getLogger(__name__)
+
+# The name of the lease held by the scanner doing a round, see the
+# :meth:`stallion.updates.UpdateStore.acquire_lease`
+SCAN_LEASE = 'scanner'
+
+
+class UpdateScanner(object):
+    """ Checks the updates of the installed distributions in a background
+    thread, fetching their releases again when the last check is older
+    than the interval. The results are recorded in the update store, so
+    the views show the update badges and the releases without waiting
+    for the package index.
+
+    The packages whose checks fail are retried later and later (an
+    exponential backoff), and the rounds are delayed by a random jitter.
+    When many processes share the update store (ie. the server workers),
+    only one of them checks at a time.
+    """
+    def __init__(self, fetcher, store, dist_index, interval=3600.0,
+                 jitter=60.0, max_workers=4, retry_delay=300.0,
+                 max_retry_delay=86400.0, batch_size=50, lease_time=600.0):
+        """ Instantiates a new scanner.
+
+        :param fetcher: the :class:`stallion.pypi.ReleaseFetcher`
+        :param store: the :class:`stallion.updates.UpdateStore`
+        :param dist_index: the :class:`stallion.distindex.DistributionIndex`
+        :param interval: seconds between two checks of a distribution
+        :param jitter: maximum random seconds added to each wait
+        :param max_workers: the maximum number of concurrent lookups
+        :param retry_delay: seconds before the first retry of a failed
+                            check, it doubles on each failure
+        :param max_retry_delay: the maximum seconds between the retries
+        :param batch_size: the number of checks recorded at once
+        :param lease_time: seconds before the lease of a process that
+                           stopped checking expires
+        """
+        self.fetcher = fetcher
+        self.store = store
+        self.dist_index = dist_index
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.batch_size = batch_size
+        self.lease_time = lease_time
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def owner(self):
+        """ The lease owner, it is read on each use because the scanner
+        may be created before the worker processes are forked. """
+        return '%s:%d' % (socket.gethostname(), os.getpid())
+
+    def check_delay(self, state):
+        """ Returns the seconds between the last check of a distribution
+        and the next one.
+
+        :param state: the :class:`stallion.updates.UpdateState`
+        :rtype: float
+        """
+        if not state.failures:
+            return self.interval
+        return min(self.retry_delay * 2 ** (state.failures - 1),
+                   self.max_retry_delay)
+
+    def schedule(self, now=None):
+        """ Returns the distributions to check now and the time of the
+        next check of the others.
+
+        :param now: the current timestamp, if None the current time
+        :rtype: tuple
+        :return: (distributions, next_check), the next_check is None if
+                 there isn't any distribution
+        """
+        now = time.time() if now is None else now
+        states = self.store.states()
+
+        due = []
+        next_check = None
+        for dist in self.dist_index.distributions():
+            state = states.get(dist.key)
+            if state is None or state.version != dist.version:
+                check_time = now
+            else:
+                check_time = state.checked + self.check_delay(state)
+
+            if check_time <= now:
+                due.append(dist)
+            elif next_check is None or check_time < next_check:
+                next_check = check_time
+
+        return due, next_check
+
+    def scan(self):
+        """ Checks the distributions that are due (see :meth:`schedule`),
+        unless another process sharing the store is already checking.
+
+        :rtype: int
+        :return: the number of distributions checked
+        """
+        self.dist_index.refresh()
+        due = self.schedule()[0]
+        if not due:
+            return 0
+
+        # The lease is renewed after each batch, so it only expires if
+        # this process stops checking
+        owner = self.owner
+        if not self.store.acquire_lease(SCAN_LEASE, owner, self.lease_time):
+            return 0
+
+        versions = dict((dist.project_name, dist.version) for dist in due)
+        checks = []
+        checked = 0
+        try:
+            for dist_name, releases, error in workers.imap_unordered(
+                    self.fetcher.fetch, versions, self.max_workers):
+                if error is not None:
+                    log.debug('Unable to check the updates of %s: %s',
+                              dist_name, error)
+                checks.append((dist_name, versions[dist_name], releases, error))
+                checked += 1
+                if len(checks) >= self.batch_size:
+                    self.store.record_many(checks)
+                    self.store.acquire_lease(SCAN_LEASE, owner, self.lease_time)
+                    checks = []
+                if self._stop.is_set():
+                    break
+        finally:
+            self.store.record_many(checks)
+            self.store.release_lease(SCAN_LEASE, owner)
+
+        return checked
+
+    def next_wait(self, now=None):
+        """ Returns the seconds to wait before the next round, until the
+        next check is due plus the jitter.
+
+        :param now: the current timestamp, if None the current time
+        :rtype: float
+        """
+        now = time.time() if now is None else now
+        due, next_check = self.schedule(now)
+        if due:
+            # Another process is checking them, it is retried later
+            wait = self.retry_delay
+        elif next_check is None:
+            wait = self.interval
+        else:
+            wait = next_check - now
+        return wait + random.uniform(0, self.jitter)
+
+    def run(self):
+        """ Checks the updates until the scanner is stopped, the first
+        round starts after a random jitter, so the processes started
+        together don't check at the same time. It stops by itself if the
+        store loses the checks.
+        """
+        wait = random.uniform(0, self.jitter)
+        while not self._stop.wait(wait):
+            try:
+                checked = self.scan()
+                if checked:
+                    log.info('Checked the updates of %d packages', checked)
+                    # A store that doesn't keep the checks would make all
+                    # the packages due again, checked on every round
+                    if not self.store.states():
+                        log.error('The update store does not keep the checks, '
+                                  'stopping the update scanner')
+                        break
+                wait = self.next_wait()
+            except Exception:
+                log.exception('The update scan failed')
+                wait = self.retry_delay + random.uniform(0, self.jitter)
+
+    def start(self):
+        """ Starts the scanner thread.
+
+        :rtype: threading.Thread
+        :return: the started thread
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """ Stops the scanner thread, the round in progress stops after
+        the current lookups.
+
+        :param timeout: seconds to wait for the thread to finish
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,255 @@
+"""
+.. module:: server
+   :platform: Unix, Windows
+   :synopsis: Production serving of the Stallion WSGI application.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`server` -- production serving of the Stallion application
+==================================================================
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from werkzeug.serving import BaseWSGIServer
+
+log = logging.getLogger(__name__)
+
+# The default number of request threads of each worker process
+DEFAULT_THREADS = 8
+
+# A forked worker that exits before this many seconds has failed to
+# start, its restarts are delayed (RESTART_DELAY, doubling up to the
+# MAX_RESTART_DELAY) and the server stops after MAX_WORKER_FAILURES
+WORKER_MIN_LIFETIME = 10.0
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+MAX_WORKER_FAILURES = 10
+
+
+def gunicorn_available():
+    """ Returns True if the gunicorn server is installed, it is an
+    optional dependency (see the "production" extra of the setup.py).
+
+    :rtype: bool
+    """
+    try:
+        import gunicorn
+    except ImportError:
+        return False
+    return True
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """ The werkzeug WSGI server with a fixed pool of request threads,
+    unlike the threaded werkzeug server it doesn't start a thread per
+    request, the connections wait in a queue when all threads are busy.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads=DEFAULT_THREADS):
+        BaseWSGIServer.__init__(self, host, port, app)
+        self.threads = threads
+        self._requests = queue.Queue()
+        self._started = False
+
+    def _start_threads(self):
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._process_requests)
+            thread.daemon = True
+            thread.start()
+        self._started = True
+
+    def _process_requests(self):
+        while True:
+            request, client_address = self._requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        # The threads are started by the process that serves, after a fork
+        if not self._started:
+            self._start_threads()
+        self._requests.put((request, client_address))
+
+
+def serve_gunicorn(app, host, port, workers, threads, worker_init=None):
+    """ Serves the application with gunicorn, using pre-forked worker
+    processes with a pool of request threads each ("gthread" workers).
+
+    :param app: the WSGI application
+    :param host: the host to listen on
+    :param port: the port to listen on
+    :param workers: the number of worker processes
+    :param threads: the number of request threads of each worker
+    :param worker_init: called without arguments in each worker process
+                        once it is forked
+    """
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        if worker_init is not None:
+            worker_init()
+
+    options = {
+        'bind': '%s:%d' % (host, port),
+        'workers': workers,
+        'threads': threads,
+        # The sync workers would be killed by the long-lived update streams
+        'worker_class': 'gthread',
+        'post_fork': post_fork,
+    }
+
+    class StallionApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    StallionApplication().run()
+
+
+def serve_werkzeug(app, host, port, workers, threads, worker_init=None):
+    """ Serves the application with the :class:`ThreadPoolWSGIServer`, when
+    gunicorn isn't installed. With more than one worker, the processes are
+    forked after the socket is bound and share it (only on POSIX systems),
+    the workers that die are restarted (see the :data:`WORKER_MIN_LIFETIME`).
+
+    :param app: the WSGI application
+    :param host: the host to listen on
+    :param port: the port to listen on
+    :param workers: the number of worker processes
+    :param threads: the number of request threads of each worker
+    :param worker_init: called without arguments in each worker process
+    """
+    server = ThreadPoolWSGIServer(host, port, app, threads)
+
+    if workers > 1 and not hasattr(os, 'fork'):
+        log.warning('Forking workers is not supported on %s, using a single '
+                    'worker', sys.platform)
+        workers = 1
+
+    server.multiprocess = workers > 1
+
+    if workers == 1:
+        if worker_init is not None:
+            worker_init()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    def spawn():
+        pid = os.fork()
+        if pid != 0:
+            return pid
+
+        # The worker serves until it is terminated by the parent
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            if worker_init is not None:
+                worker_init()
+            server.serve_forever()
+        except Exception:
+            # The parent only sees the exit status
+            log.exception('Worker %d failed', os.getpid())
+        finally:
+            os._exit(1)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    started = {}
+    for i in range(workers):
+        pid = spawn()
+        started[pid] = time.time()
+
+    failures = 0
+    try:
+        while True:
+            pid, status = os.wait()
+            if pid not in started:
+                continue
+
+            # The parent keeps the socket, a new worker takes the place
+            # of the one that died, later and later if they keep dying
+            # right after they start
+            if time.time() - started.pop(pid) < WORKER_MIN_LIFETIME:
+                failures += 1
+            else:
+                failures = 0
+
+            if failures >= MAX_WORKER_FAILURES:
+                log.error('%d workers exited right after they started, '
+                          'stopping the server', failures)
+                break
+
+            delay = 0
+            if failures:
+                delay = min(RESTART_DELAY * 2 ** (failures - 1), MAX_RESTART_DELAY)
+            log.warning('Worker %d exited with the status %d, restarting it '
+                        'in %.1fs', pid, status, delay)
+            time.sleep(delay)
+
+            pid = spawn()
+            started[pid] = time.time()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in started:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in started:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        server.server_close()
+
+    if failures >= MAX_WORKER_FAILURES:
+        sys.exit(1)
+
+
+def serve(app, host, port, workers=1, threads=DEFAULT_THREADS, worker_init=None):
+    """ Serves the application with gunicorn if it is installed (see the
+    :func:`serve_gunicorn`), otherwise with the werkzeug thread pool server
+    (see the :func:`serve_werkzeug`).
+
+    The state kept by each worker process (like the release and page caches
+    in memory) is not shared, the state shared by the workers must be kept
+    in the Stallion data directory (see the :mod:`stallion.storage`).
+
+    :param app: the WSGI application
+    :param host: the host to listen on
+    :param port: the port to listen on
+    :param workers: the number of worker processes
+    :param threads: the number of request threads of each worker
+    :param worker_init: called without arguments in each worker process,
+                        to start its background threads
+    """
+    if gunicorn_available():
+        serve_gunicorn(app, host, int(port), workers, threads, worker_init)
+    else:
+        serve_werkzeug(app, host, int(port), workers, threads, worker_init)
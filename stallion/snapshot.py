@@ -0,0 +1,458 @@
+"""
+.. module:: snapshot
+   :platform: Unix, Windows
+   :synopsis: On-disk snapshot of the installed distributions.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`snapshot` -- on-disk snapshot of the installed distributions
+==================================================================
+"""
+import os
+import sys
+import hashlib
+import logging
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from stallion import storage
+from stallion import metadata
+from stallion import workers
+from stallion.entrypoints import parse_entry_point
+from stallion.distindex import entry_signature, scan_entry
+
+log = logging.getLogger(__name__)
+
+# Bump it whenever the snapshot format or the record contents change
+SNAPSHOT_VERSION = 3
+
+# Fields of the processed metadata kept in the snapshot
+SNAPSHOT_FIELDS = (
+    'name',
+    'version',
+    'summary',
+    'author',
+    'author-email',
+    'home-page',
+    'license',
+    'platform',
+)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    '  entry TEXT PRIMARY KEY, signature TEXT)',
+    'CREATE TABLE IF NOT EXISTS distributions ('
+    '  entry TEXT, position INTEGER, key TEXT, project_name TEXT,'
+    '  version TEXT, location TEXT, metadata_key TEXT, distinfo TEXT,'
+    '  entry_points TEXT, PRIMARY KEY (entry, key))',
+    'CREATE TABLE IF NOT EXISTS entry_points ('
+    '  entry TEXT, key TEXT, grp TEXT, name TEXT, module TEXT,'
+    '  attrs TEXT, extras TEXT)',
+    'CREATE INDEX IF NOT EXISTS entry_points_name ON entry_points (grp, name)',
+    'CREATE INDEX IF NOT EXISTS entry_points_module ON entry_points (module)',
+)
+
+
+def snapshot_filename():
+    """ Returns the snapshot file name of the running interpreter, each
+    interpreter (and virtualenv) has its own snapshot.
+
+    :rtype: string
+    :return: the snapshot file name
+    """
+    interpreter = '%s:%s' % (sys.executable, sys.prefix)
+    digest = hashlib.md5(interpreter.encode('utf-8')).hexdigest()
+    return 'plp-%s.db' % digest[:12]
+
+
+def unique(path):
+    """ Yields the path entries, skipping the repeated ones. """
+    seen = set()
+    for entry in path:
+        if entry not in seen:
+            seen.add(entry)
+            yield entry
+
+
+def metadata_source(dist):
+    """ Returns what the :func:`read_distinfo` needs to read the metadata of
+    a distribution, the metadata file path when it is a file, so the worker
+    processes read it, or else the metadata text.
+
+    :param dist: the pkg_resources.Distribution
+    :rtype: tuple
+    :return: (metadata file path, metadata text), one of them is None
+    """
+    egg_info = getattr(dist, 'egg_info', None)
+    if egg_info:
+        filename = os.path.join(egg_info, metadata.metadata_name(dist))
+        if os.path.isfile(filename):
+            return (filename, None)
+
+    try:
+        return (None, metadata.get_metadata_text(dist))
+    except Exception:
+        return (None, None)
+
+
+def read_distinfo(source):
+    """ Reads and parses the snapshot fields of a distribution metadata.
+
+    :param source: the return of the :func:`metadata_source`
+    :rtype: dictionary
+    :return: the processed snapshot fields, empty if the metadata can't be
+             read
+    """
+    filename, text = source
+    try:
+        if filename is not None:
+            f = open(filename, 'rb')
+            try:
+                text = f.read().decode('utf-8')
+            finally:
+                f.close()
+
+        processed = metadata.LazyMetadata(text)
+        return dict((field, processed[field])
+                    for field in SNAPSHOT_FIELDS if field in processed)
+    except Exception:
+        log.warning('Unable to parse the metadata %s', filename or '',
+                    exc_info=True)
+        return {}
+
+
+class SnapshotRecord(object):
+    """ A distribution as stored in the snapshot, it has the same
+    project_name, key, version and location attributes of the
+    pkg_resources.Distribution.
+    """
+    def __init__(self, key, project_name, version, location,
+                 metadata_key, distinfo, entry_points):
+        self.key = key
+        self.project_name = project_name
+        self.version = version
+        self.location = location
+        self.metadata_key = metadata_key
+        self.distinfo = distinfo
+        self.entry_points = entry_points
+
+    @classmethod
+    def from_distribution(cls, dist, metadata_key, distinfo=None):
+        """ Builds a record from a pkg_resources.Distribution.
+
+        :param dist: the distribution
+        :param metadata_key: the metadata cache key of the distribution
+        :param distinfo: the snapshot fields of the metadata, if None they
+                         are read (see the :func:`read_distinfo`)
+        :rtype: SnapshotRecord
+        """
+        if distinfo is None:
+            distinfo = read_distinfo(metadata_source(dist))
+
+        entry_points = {}
+        for group, entries in dist.get_entry_map().items():
+            entry_points[group] = dict((name, str(entry))
+                                       for name, entry in entries.items())
+
+        return cls(dist.key, dist.project_name, dist.version, dist.location,
+                   metadata_key, distinfo, entry_points)
+
+    @classmethod
+    def from_row(cls, row):
+        """ Builds a record from a row of the distributions table. """
+        key, project_name, version, location, metadata_key, distinfo, \
+            entry_points = row
+        return cls(key, project_name, version, location, metadata_key,
+                   json.loads(distinfo), json.loads(entry_points))
+
+    def to_row(self, entry, position):
+        """ Returns the row of the distributions table for this record. """
+        return (entry, position, self.key, self.project_name, self.version,
+                self.location, self.metadata_key, json.dumps(self.distinfo),
+                json.dumps(self.entry_points))
+
+    def __str__(self):
+        return '%s %s' % (self.project_name, self.version)
+
+
+class DistributionSnapshot(object):
+    """ Persistent snapshot of the installed distributions, used by the
+    short-lived plp commands. The records of each sys.path entry are reused
+    while the entry signature (see :func:`stallion.distindex.entry_signature`)
+    doesn't change, and only the changed distributions are parsed again.
+    """
+    def __init__(self, filename=None, path=None):
+        """ Instantiates a new snapshot.
+
+        :param filename: the database file name inside the Stallion data
+                         directory, if None :func:`snapshot_filename` is used
+        :param path: the list of path entries, if None sys.path is used
+        """
+        self.filename = filename or snapshot_filename()
+        self.path = path
+
+    def _open(self):
+        conn = storage.connect(self.filename)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != SNAPSHOT_VERSION:
+            conn.execute('DROP TABLE IF EXISTS entries')
+            conn.execute('DROP TABLE IF EXISTS distributions')
+            conn.execute('DROP TABLE IF EXISTS entry_points')
+            conn.execute('PRAGMA user_version = %d' % SNAPSHOT_VERSION)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def _entry_rows(self, conn, entry):
+        return conn.execute(
+            'SELECT key, project_name, version, location, metadata_key,'
+            ' distinfo, entry_points FROM distributions'
+            ' WHERE entry = ? ORDER BY position', (entry,)).fetchall()
+
+    def _load_entry(self, conn, entry):
+        return [SnapshotRecord.from_row(row)
+                for row in self._entry_rows(conn, entry)]
+
+    def _scan_entry(self, conn, entry, signature, rebuild):
+        """ Scans a changed entry.
+
+        :rtype: list
+        :return: a list of (dist, metadata_key, record) tuples, the record is
+                 None when the distribution must be parsed again
+        """
+        previous = {}
+        if not rebuild:
+            previous = dict((record.key, record)
+                            for record in self._load_entry(conn, entry))
+
+        scanned = []
+        dists = scan_entry(entry) if signature is not None else []
+        for dist in dists:
+            metadata_key = json.dumps(metadata.metadata_cache_key(dist))
+            record = previous.get(dist.key)
+            if record is not None and record.metadata_key != metadata_key:
+                record = None
+            scanned.append((dist, metadata_key, record))
+        return scanned
+
+    def _store_entry(self, conn, entry, signature, records):
+        conn.execute('DELETE FROM distributions WHERE entry = ?', (entry,))
+        conn.executemany(
+            'INSERT OR REPLACE INTO distributions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [record.to_row(entry, position)
+             for position, record in enumerate(records)])
+
+        entry_point_rows = []
+        for record in records:
+            for group, entries in record.entry_points.items():
+                for text in entries.values():
+                    parsed = parse_entry_point(text)
+                    if parsed is None:
+                        continue
+                    name, module_name, attrs, extras = parsed
+                    entry_point_rows.append((entry, record.key, group, name, module_name,
+                                             '.'.join(attrs), ','.join(extras)))
+
+        conn.execute('DELETE FROM entry_points WHERE entry = ?', (entry,))
+        conn.executemany('INSERT INTO entry_points VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         entry_point_rows)
+        conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?)',
+                     (entry, json.dumps(signature)))
+
+    def _parse(self, scanned, jobs):
+        """ Builds the missing records of a scanned entry, the metadata is
+        read using `jobs` processes.
+
+        :param scanned: the return of the :meth:`_scan_entry`
+        :rtype: list
+        :return: the records, in the scanned order
+        """
+        pending = [dist for dist, metadata_key, record in scanned if record is None]
+        sources = [metadata_source(dist) for dist in pending]
+
+        if jobs > 1 and len(sources) > 1:
+            parsed = iter(workers.map_processes(read_distinfo, sources, jobs))
+        else:
+            parsed = (read_distinfo(source) for source in sources)
+
+        records = []
+        for dist, metadata_key, record in scanned:
+            if record is None:
+                record = SnapshotRecord.from_distribution(dist, metadata_key,
+                                                          next(parsed))
+            records.append(record)
+        return records
+
+    def iter_records(self, rebuild=False, jobs=1, match=None):
+        """ Yields the records of the installed distributions, in sys.path
+        order, updating the snapshot for the changed entries. The records
+        of an entry are yielded as soon as they are loaded or parsed.
+
+        :param rebuild: if True, all the records are rebuilt
+        :param jobs: the number of processes reading the metadata of the
+                     changed distributions
+        :param match: a function called with the project name, only the
+                      matching distributions are yielded (and parsed, so
+                      the changed entries aren't stored when it is given)
+        :rtype: generator
+        :return: yields :class:`SnapshotRecord` objects
+        """
+        path = sys.path if self.path is None else self.path
+        conn = self._open()
+
+        try:
+            stored = dict(conn.execute('SELECT entry, signature FROM entries'))
+            seen_keys = set()
+
+            for entry in unique(path):
+                signature = entry_signature(entry)
+                if not rebuild and stored.get(entry) == json.dumps(signature):
+                    # The filter is applied before decoding the metadata
+                    for row in self._entry_rows(conn, entry):
+                        if row[0] in seen_keys:
+                            continue
+                        seen_keys.add(row[0])
+                        if match is None or match(row[1]):
+                            yield SnapshotRecord.from_row(row)
+                    continue
+
+                scanned = self._scan_entry(conn, entry, signature, rebuild)
+
+                if match is not None:
+                    wanted = []
+                    for item in scanned:
+                        dist = item[0]
+                        if dist.key not in seen_keys:
+                            seen_keys.add(dist.key)
+                            if match(dist.project_name):
+                                wanted.append(item)
+
+                    for record in self._parse(wanted, jobs):
+                        yield record
+                    continue
+
+                entry_records = self._parse(scanned, jobs)
+                self._store_entry(conn, entry, signature, entry_records)
+                conn.commit()
+
+                for record in entry_records:
+                    if record.key not in seen_keys:
+                        seen_keys.add(record.key)
+                        yield record
+        finally:
+            conn.close()
+
+    def update(self, rebuild=False, jobs=1):
+        """ Updates the snapshot of the changed entries, without loading the
+        stored records.
+
+        :param rebuild: if True, all the records are rebuilt
+        :param jobs: the number of processes reading the metadata of the
+                     changed distributions
+        :rtype: int
+        :return: the number of entries scanned again
+        """
+        path = sys.path if self.path is None else self.path
+        conn = self._open()
+        scanned_entries = 0
+
+        try:
+            stored = dict(conn.execute('SELECT entry, signature FROM entries'))
+
+            for entry in unique(path):
+                signature = entry_signature(entry)
+                if not rebuild and stored.get(entry) == json.dumps(signature):
+                    continue
+
+                scanned = self._scan_entry(conn, entry, signature, rebuild)
+                self._store_entry(conn, entry, signature, self._parse(scanned, jobs))
+                conn.commit()
+                scanned_entries += 1
+        finally:
+            conn.close()
+
+        return scanned_entries
+
+    def entry_point_rows(self, group=None, name=None, module=None, contains=None):
+        """ Looks up the stored entry points (see the
+        :class:`stallion.entrypoints.EntryPointIndex`), the snapshot is
+        updated first.
+
+        :param group: the group, None for all the groups
+        :param name: the entry point name
+        :param module: the module name
+        :param contains: a text the entry point name contains, ignoring the
+                         case
+        :rtype: list
+        :return: a list of (group, name, module_name, attrs, extras,
+                 project_name, version) tuples, in sys.path order
+        """
+        self.update()
+
+        path = list(unique(sys.path if self.path is None else self.path))
+        entry_order = dict((entry, index) for index, entry in enumerate(path))
+
+        conditions = []
+        params = []
+        if group is not None:
+            conditions.append('e.grp = ?')
+            params.append(group)
+        if name is not None:
+            conditions.append('e.name = ?')
+            params.append(name)
+        if module is not None:
+            conditions.append('e.module = ?')
+            params.append(module)
+        if contains is not None:
+            conditions.append("LOWER(e.name) LIKE ? ESCAPE '\\'")
+            escaped = contains.lower().replace('\\', '\\\\')
+            params.append('%%%s%%' % escaped.replace('%', '\\%').replace('_', '\\_'))
+
+        conn = self._open()
+        try:
+            # The first distribution of a project on the path wins
+            owners = {}
+            dist_rows = conn.execute('SELECT entry, key, position FROM distributions')
+            for entry, key, position in dist_rows:
+                if entry not in entry_order:
+                    continue
+                order = (entry_order[entry], position)
+                if key not in owners or order < owners[key]:
+                    owners[key] = order
+
+            rows = conn.execute(
+                'SELECT e.entry, e.key, e.grp, e.name, e.module, e.attrs, e.extras,'
+                ' d.project_name, d.version FROM entry_points e'
+                ' JOIN distributions d ON d.entry = e.entry AND d.key = e.key' +
+                (' WHERE ' + ' AND '.join(conditions) if conditions else ''),
+                params).fetchall()
+        finally:
+            conn.close()
+
+        found = []
+        for entry, key, grp, ep_name, ep_module, attrs, extras, project_name, version in rows:
+            order = owners.get(key)
+            if order is None or order[0] != entry_order.get(entry):
+                continue
+            found.append((order, ep_name, (grp, ep_name, ep_module,
+                                           attrs.split('.') if attrs else [],
+                                           extras.split(',') if extras else [],
+                                           project_name, version)))
+
+        found.sort(key=lambda item: item[:2])
+        return [item[2] for item in found]
+
+    def records(self, rebuild=False, jobs=1):
+        """ Returns the records of the installed distributions, see the
+        :meth:`iter_records`.
+
+        :param rebuild: if True, all the records are rebuilt
+        :param jobs: the number of processes reading the metadata of the
+                     changed distributions
+        :rtype: list
+        :return: a list of :class:`SnapshotRecord`
+        """
+        return list(self.iter_records(rebuild, jobs))
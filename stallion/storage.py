@@ -0,0 +1,56 @@
+"""
+.. module:: storage
+   :platform: Unix, Windows
+   :synopsis: Persistent storage used by the Stallion caches.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`storage` -- persistent storage for the Stallion caches
+==================================================================
+"""
+import os
+import sqlite3
+
+# The environment variable used to override the Stallion data directory
+STALLION_HOME_ENV = 'STALLION_HOME'
+
+
+def data_dir():
+    """ Returns the Stallion data directory, it is '~/.stallion' unless
+    the STALLION_HOME environment variable is set.
+
+    :rtype: string
+    :return: the data directory path
+    """
+    default = os.path.join(os.path.expanduser('~'), '.stallion')
+    return os.environ.get(STALLION_HOME_ENV, default)
+
+
+def data_path(filename):
+    """ Returns the path of a file inside the Stallion data directory,
+    creating the directory if needed.
+
+    :param filename: the file name
+    :rtype: string
+    :return: the file path
+    """
+    directory = data_dir()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return os.path.join(directory, filename)
+
+
+def connect(filename, timeout=10.0):
+    """ Opens a sqlite database inside the Stallion data directory. When
+    the directory isn't writable, an in-memory database is returned, so the
+    callers still work, only without persistence.
+
+    :param filename: the database file name
+    :param timeout: seconds to wait for a lock held by another process
+    :rtype: sqlite3.Connection
+    :return: the database connection
+    """
+    try:
+        return sqlite3.connect(data_path(filename), timeout=timeout)
+    except (OSError, sqlite3.Error):
+        return sqlite3.connect(':memory:')
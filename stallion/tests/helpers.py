@@ -0,0 +1,27 @@
+import os
+
+
+def write_file(path, content):
+    f = open(path, 'w')
+    f.write(content)
+    f.close()
+
+
+def make_egg_info(path, name, version, requires=None, entry_points=None,
+                  description=None):
+    """ Creates the egg-info directory of a distribution inside a site
+    directory and returns its path, the optional requires.txt and
+    entry_points.txt are written when given. """
+    egg_info = os.path.join(path, '%s-%s.egg-info' % (name, version))
+    os.mkdir(egg_info)
+
+    pkg_info = 'Metadata-Version: 1.0\nName: %s\nVersion: %s\n' % (name, version)
+    if description is not None:
+        pkg_info += 'Description: %s\n' % description
+    write_file(os.path.join(egg_info, 'PKG-INFO'), pkg_info)
+
+    if requires is not None:
+        write_file(os.path.join(egg_info, 'requires.txt'), requires)
+    if entry_points is not None:
+        write_file(os.path.join(egg_info, 'entry_points.txt'), entry_points)
+    return egg_info
@@ -0,0 +1,89 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stallion import backends
+
+
+class FakePool(object):
+
+    def __init__(self, content_type, body):
+        self.content_type = content_type
+        self.body = body
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        return (200, self.content_type, self.body.encode('utf-8'))
+
+
+class TestBackends(unittest.TestCase):
+
+    def test_version_from_filename(self):
+        self.assertEqual(backends.version_from_filename(
+            'zope.interface-4.0.5.tar.gz', 'zope-interface'), '4.0.5')
+        self.assertEqual(backends.version_from_filename(
+            'Flask_Login-0.6.2-py3-none-any.whl', 'flask-login'), '0.6.2')
+        self.assertEqual(backends.version_from_filename(
+            'Flask-0.10.tar.gz', 'flask-login'), None)
+        self.assertEqual(backends.version_from_filename(
+            'Flask-0.10.txt', 'flask'), None)
+
+    def test_version_from_filename_siblings(self):
+        self.assertEqual(backends.version_from_filename(
+            'flask-login-0.6.2.tar.gz', 'flask'), None)
+        self.assertEqual(backends.version_from_filename(
+            'flask-login-0.6.2.tar.gz', 'flask-login'), '0.6.2')
+        self.assertEqual(backends.version_from_filename(
+            'Flask_Login-0.6.2-py3-none-any.whl', 'flask'), None)
+        self.assertEqual(backends.version_from_filename(
+            'foo-bar-baz-v2.0.zip', 'foo-bar-baz'), 'v2.0')
+
+    def test_simple_index_html(self):
+        index = backends.SimpleIndex('https://mirror/simple/')
+        index.pool = FakePool('text/html', '<html><body>'
+                              '<a href="../../f/Foo_Bar-1.0.tar.gz#sha256=x">Foo_Bar-1.0.tar.gz</a>'
+                              '<a href="../../f/foo_bar-1.1-py2.py3-none-any.whl">'
+                              'foo_bar-1.1-py2.py3-none-any.whl</a></body></html>')
+        self.assertEqual(sorted(index.releases('Foo.Bar')), ['1.0', '1.1'])
+        self.assertEqual(index.pool.urls, ['https://mirror/simple/foo-bar/'])
+
+    def test_simple_index_json(self):
+        index = backends.SimpleIndex()
+        index.pool = FakePool(backends.SIMPLE_JSON_TYPE,
+                              '{"files": [{"filename": "foo-2.0.zip"}]}')
+        self.assertEqual(index.releases('foo'), ['2.0'])
+
+    def test_local_index(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for filename in ('foo-1.0.tar.gz', 'foo-1.2-py3-none-any.whl',
+                             'foobar-3.0.tar.gz', 'foo-bar-2.0.tar.gz',
+                             'foo_bar-2.1-py3-none-any.whl'):
+                open(os.path.join(directory, filename), 'w').close()
+            index = backends.index_from_url(directory)
+            self.assertTrue(isinstance(index, backends.LocalIndex))
+            self.assertEqual(sorted(index.releases('Foo')), ['1.0', '1.2'])
+            self.assertEqual(sorted(index.releases('foo-bar')), ['2.0', '2.1'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_index_from_url(self):
+        self.assertTrue(isinstance(backends.index_from_url(backends.PYPI_XMLRPC),
+                                   backends.XmlRpcIndex))
+        self.assertTrue(isinstance(backends.index_from_url('json+https://pypi.org/pypi'),
+                                   backends.JsonIndex))
+        self.assertTrue(isinstance(backends.index_from_url('https://mirror/simple/'),
+                                   backends.SimpleIndex))
+        index = backends.index_from_url('simple+http://mirror/pkgs', timeout=2)
+        self.assertEqual((index.url, index.timeout), ('http://mirror/pkgs', 2))
+
+    def test_fake_index(self):
+        index = backends.FakeIndex({'Foo_Bar': ['1.0']})
+        self.assertEqual(index.releases('foo-bar'), ['1.0'])
+        self.assertEqual(index.releases('baz'), [])
+        self.assertEqual(index.calls, ['foo-bar', 'baz'])
@@ -0,0 +1,27 @@
+import sys
+sys.path.insert(0, '.')
+
+import unittest
+
+from stallion.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set_counts(self):
+        cache = LRUCache(maxsize=2)
+        self.assertEqual(cache.get('a'), None)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats(), {'size': 1, 'maxsize': 2,
+                                         'hits': 1, 'misses': 1})
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(len(cache), 2)
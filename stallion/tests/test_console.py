@@ -0,0 +1,85 @@
+import sys
+sys.path.insert(0, '.')
+
+import shutil
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from stallion import console
+from stallion import metadata
+from stallion import updates
+from stallion.distindex import DistributionIndex
+from stallion.output import get_writer
+from helpers import make_egg_info
+
+
+class TestShowRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        make_egg_info(self.site_dir, 'Foo', '1.0', description='The Foo package.')
+        index = DistributionIndex([self.site_dir])
+        index.refresh()
+        self.dist = index.get_distribution('foo')
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_json_description(self):
+        stream = StringIO()
+        writer = get_writer('json', many=False, stream=stream)
+        writer.write(console.show_record(self.dist))
+        writer.close()
+
+        record = json.loads(stream.getvalue())
+        self.assertEqual(record['description'], 'The Foo package.')
+        self.assertFalse(metadata.RAW_DESCRIPTION_KEY in record)
+
+        # The metadata isn't changed, the next record has it too
+        self.assertEqual(console.show_record(self.dist)['description'],
+                         'The Foo package.')
+
+
+class TestCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        make_egg_info(self.site_dir, 'Foo', '1.0')
+        index = DistributionIndex([self.site_dir])
+        index.refresh()
+
+        self.saved = (console.get_dist_index, console.get_pypi_releases,
+                      console.cmd_show, console.UPDATE_STORE, sys.stdout)
+        console.get_dist_index = lambda: index
+        console.cmd_show = lambda args, short=False: None
+        console.UPDATE_STORE = updates.UpdateStore(filename=None)
+
+    def tearDown(self):
+        (console.get_dist_index, console.get_pypi_releases,
+         console.cmd_show, console.UPDATE_STORE, sys.stdout) = self.saved
+        shutil.rmtree(self.site_dir)
+
+    def test_text_error_recorded(self):
+        def get_pypi_releases(proj_name):
+            raise IOError('timed out')
+        console.get_pypi_releases = get_pypi_releases
+        sys.stdout = StringIO()
+
+        args = {'<project_name>': 'foo', '--format': 'text'}
+        self.assertRaises(IOError, console.cmd_check, args)
+        state = console.UPDATE_STORE.get('foo')
+        self.assertEqual(state.status, updates.STATUS_ERROR)
+        self.assertEqual(state.failures, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stallion.distindex import DistributionIndex
+from stallion import depgraph
+from stallion.depgraph import DependencyGraph, Problem, parse_requirement
+from helpers import make_egg_info
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        make_egg_info(self.site_dir, 'App', '1.0',
+                      'Lib>=1.0\nMissing\n\n[test]\nTester\n\n'
+                      '[:python_version < "2"]\nNever\n')
+        make_egg_info(self.site_dir, 'Lib', '1.0', 'Core\n')
+        make_egg_info(self.site_dir, 'Core', '1.0')
+        make_egg_info(self.site_dir, 'Tester', '1.0', 'Core\n')
+
+        self.index = DistributionIndex([self.site_dir])
+        self.index.refresh()
+        self.graph = DependencyGraph(self.index)
+        self.graph.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_requires(self):
+        targets = [edge.target for edge in self.graph.requires('app')]
+        self.assertEqual(targets, ['lib', 'missing'])
+
+        edges = self.graph.requires('app', extras=True)
+        self.assertEqual([(edge.target, edge.extra) for edge in edges],
+                         [('lib', None), ('missing', None), ('tester', 'test')])
+        self.assertEqual(str(edges[0].requirement), 'Lib>=1.0')
+
+    def test_required_by(self):
+        sources = sorted(edge.source for edge in self.graph.required_by('core'))
+        self.assertEqual(sources, ['lib', 'tester'])
+        self.assertEqual(self.graph.required_by('tester'), [])
+        self.assertEqual([edge.source for edge in
+                          self.graph.required_by('tester', extras=True)], ['app'])
+
+    def test_closure(self):
+        self.assertEqual(self.graph.closure('app'), ['core', 'lib', 'missing'])
+        self.assertEqual(self.graph.closure('app', extras=True),
+                         ['core', 'lib', 'missing', 'tester'])
+        self.assertEqual(self.graph.closure('core', reverse=True),
+                         ['app', 'lib', 'tester'])
+        self.assertTrue(self.graph.closure('app') is self.graph.closure('app'))
+
+    def test_refresh_unchanged(self):
+        self.assertFalse(self.graph.refresh())
+
+    def test_refresh_only_changed(self):
+        app_edges = self.graph.requires('app', extras=True)
+
+        shutil.rmtree(os.path.join(self.site_dir, 'Lib-1.0.egg-info'))
+        make_egg_info(self.site_dir, 'Lib', '2.0')
+        self.index.refresh(force=True)
+
+        self.assertTrue(self.graph.refresh())
+        self.assertEqual(self.graph.get('lib').version, '2.0')
+        self.assertEqual(self.graph.closure('app'), ['lib', 'missing'])
+        self.assertEqual([edge.source for edge in self.graph.required_by('core')],
+                         ['tester'])
+        # App is unchanged, its requirements were not read again
+        self.assertTrue(self.graph.requires('app', extras=True) is app_edges)
+
+    def test_problems(self):
+        problems = self.graph.problems()
+        self.assertEqual([(p.source.key, p.edge.target, p.kind) for p in problems],
+                         [('app', 'missing', Problem.MISSING)])
+
+        shutil.rmtree(os.path.join(self.site_dir, 'Lib-1.0.egg-info'))
+        make_egg_info(self.site_dir, 'Lib', '0.9')
+        self.index.refresh(force=True)
+        self.graph.refresh()
+
+        problems = self.graph.problems()
+        self.assertEqual([(p.source.key, p.edge.target, p.kind) for p in problems],
+                         [('app', 'lib', Problem.CONFLICT),
+                          ('app', 'missing', Problem.MISSING)])
+        self.assertEqual(str(problems[0]),
+                         'App 1.0 requires Lib>=1.0, but Lib 0.9 is installed')
+        self.assertTrue(self.graph.problems() is problems)
+
+
+class TestDistInfoRequirements(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        dist_info = os.path.join(self.site_dir, 'Wheel_App-1.0.dist-info')
+        os.mkdir(dist_info)
+        f = open(os.path.join(dist_info, 'METADATA'), 'w')
+        f.write('Metadata-Version: 2.1\nName: Wheel-App\nVersion: 1.0\n'
+                'License: BSD\n        \n        Long license\n'
+                'Requires-Dist: Core (>=2.0)\n'
+                'Requires-Dist: Never; python_version < "2"\n'
+                'Requires-Dist: Tester[all]; extra == \'test\'\n'
+                'Provides-Extra: test\n\nDescription\n')
+        f.close()
+        make_egg_info(self.site_dir, 'Core', '1.0')
+
+        self.index = DistributionIndex([self.site_dir])
+        self.index.refresh()
+        self.graph = DependencyGraph(self.index)
+        self.graph.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_requires(self):
+        edges = self.graph.requires('wheel-app', extras=True)
+        self.assertEqual([(edge.target, edge.extra, str(edge.requirement))
+                          for edge in edges],
+                         [('core', None, 'Core>=2.0'), ('tester', 'test', 'Tester[all]')])
+
+    def test_problems(self):
+        self.assertEqual([str(problem) for problem in self.graph.problems()],
+                         ['Wheel-App 1.0 requires Core>=2.0, but Core 1.0 is installed'])
+
+    def test_parse_requirement(self):
+        requirement = parse_requirement('Foo_Bar >=1.0, <2.0')
+        self.assertEqual(requirement.key, 'foo-bar')
+        self.assertTrue(parse_requirement('Foo_Bar >=1.0, <2.0') is requirement)
+        requirement = parse_requirement('foo @ https://example.com/foo.zip')
+        self.assertEqual(requirement.key, 'foo')
+
+    def test_packaging_missing(self):
+        self.assertTrue(hasattr(depgraph.packaging_module('markers'), 'Marker'))
+
+        def missing(name):
+            raise ImportError('No module named packaging')
+
+        packaging_module = depgraph.packaging_module
+        depgraph.packaging_module = missing
+        depgraph.REQUIREMENT_CACHE.clear()
+        depgraph.MARKER_CACHE.clear()
+        try:
+            # The graph isn't silently empty
+            self.assertRaises(ImportError, depgraph.distribution_edges,
+                              self.graph.get('wheel-app'))
+        finally:
+            depgraph.packaging_module = packaging_module
+
+if __name__ == '__main__':
+    unittest.main()
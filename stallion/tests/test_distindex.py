@@ -0,0 +1,103 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import pkg_resources as _pkg_resources
+
+from stallion.distindex import DistributionIndex, entry_signature
+from helpers import make_egg_info
+
+
+class TestDistributionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        make_egg_info(self.site_dir, 'Foo', '1.0')
+        self.index = DistributionIndex([self.site_dir])
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_get_distribution_true(self):
+        self.assertTrue(self.index.refresh())
+        dist = self.index.get_distribution('foo')
+        self.assertEqual(dist.project_name, 'Foo')
+        self.assertEqual(dist.version, '1.0')
+        self.assertEqual(len(self.index), 1)
+
+    def test_get_distribution_not_found(self):
+        self.index.refresh()
+        self.assertRaises(_pkg_resources.DistributionNotFound,
+                          self.index.get_distribution, 'bar')
+
+    def test_refresh_unchanged_false(self):
+        self.index.refresh()
+        self.assertFalse(self.index.refresh())
+        self.assertTrue(self.index.refresh(force=True))
+
+    def test_refresh_new_distribution_true(self):
+        self.index.refresh()
+        signature = entry_signature(self.site_dir)
+        make_egg_info(self.site_dir, 'Bar', '2.0')
+        os.utime(self.site_dir, (time.time() + 10, time.time() + 10))
+        self.assertNotEqual(signature, entry_signature(self.site_dir))
+        self.assertTrue(self.index.refresh())
+        self.assertEqual(self.index.get_distribution('Bar').version, '2.0')
+
+    def test_query(self):
+        make_egg_info(self.site_dir, 'Foobar', '0.5')
+        make_egg_info(self.site_dir, 'Bar', '2.0')
+        self.index.refresh()
+
+        total, page = self.index.query()
+        self.assertEqual(total, 3)
+        self.assertEqual([dist.key for dist in page], ['bar', 'foo', 'foobar'])
+
+        total, page = self.index.query('FOO', prefix=True, offset=1, limit=1)
+        self.assertEqual(total, 2)
+        self.assertEqual([dist.key for dist in page], ['foobar'])
+
+        total, page = self.index.query('ar', sort='version', reverse=True)
+        self.assertEqual([dist.key for dist in page], ['bar', 'foobar'])
+
+        total, page = self.index.query('ba', prefix=True, sort='version')
+        self.assertEqual([dist.key for dist in page], ['bar'])
+
+        total, page = self.index.query('nope', prefix=True)
+        self.assertEqual((total, page), (0, []))
+
+    def test_query_installed(self):
+        egg_info = make_egg_info(self.site_dir, 'Bar', '2.0')
+        os.utime(egg_info, (time.time() - 100, time.time() - 100))
+        self.index.refresh()
+
+        total, page = self.index.query(sort='installed')
+        self.assertEqual([dist.key for dist in page], ['bar', 'foo'])
+        self.assertTrue(self.index.sorted_distributions('installed') is
+                        self.index.sorted_distributions('installed'))
+        self.assertRaises(ValueError, self.index.query, sort='size')
+
+    def test_generation(self):
+        self.index.refresh()
+        generation = self.index.generation
+        self.assertTrue(self.index.last_modified > 0)
+
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.generation, generation)
+
+        other = DistributionIndex([self.site_dir])
+        other.refresh()
+        self.assertEqual(other.generation, generation)
+
+        make_egg_info(self.site_dir, 'Bar', '2.0')
+        os.utime(self.site_dir, (time.time() + 10, time.time() + 10))
+        self.index.refresh()
+        self.assertNotEqual(self.index.generation, generation)
+
+    def test_missing_entry_signature_none(self):
+        self.assertEqual(entry_signature(os.path.join(self.site_dir, 'nope')), None)
@@ -0,0 +1,71 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stallion import storage
+from stallion.snapshot import DistributionSnapshot
+from stallion.entrypoints import EntryPointIndex, parse_entry_point
+from helpers import make_egg_info
+
+
+class TestEntryPointIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.home_dir = tempfile.mkdtemp()
+        self.site_dir = tempfile.mkdtemp()
+        self.other_dir = tempfile.mkdtemp()
+        self.old_home = os.environ.get(storage.STALLION_HOME_ENV)
+        os.environ[storage.STALLION_HOME_ENV] = self.home_dir
+
+        make_egg_info(self.site_dir, 'Foo', '1.0', entry_points=(
+                      '[console_scripts]\nfoo = foo.cli:main\nfoo-admin = foo.admin:run\n\n'
+                      '[foo.plugins]\nbar = foo.plugins.bar:Plugin.create [extra]\n'))
+        make_egg_info(self.site_dir, 'Baz', '2.0',
+                      entry_points='[console_scripts]\nbaz = baz:main\n')
+        # Shadowed by the Foo on the first entry
+        make_egg_info(self.other_dir, 'Foo', '0.9',
+                      entry_points='[console_scripts]\nfoo-old = foo.cli:main\n')
+
+        snapshot = DistributionSnapshot('test.db', [self.site_dir, self.other_dir])
+        self.index = EntryPointIndex(snapshot)
+
+    def tearDown(self):
+        if self.old_home is None:
+            del os.environ[storage.STALLION_HOME_ENV]
+        else:
+            os.environ[storage.STALLION_HOME_ENV] = self.old_home
+        for path in (self.home_dir, self.site_dir, self.other_dir):
+            shutil.rmtree(path)
+
+    def test_parse_entry_point(self):
+        self.assertEqual(parse_entry_point('foo = foo.cli:main'),
+                         ('foo', 'foo.cli', ('main',), ()))
+        self.assertEqual(parse_entry_point('bar = a.b:C.create [x, y]'),
+                         ('bar', 'a.b', ('C', 'create'), ('x', 'y')))
+        self.assertEqual(parse_entry_point('invalid'), None)
+
+    def test_by_group(self):
+        scripts = self.index.by_group('console_scripts')
+        self.assertEqual(sorted(e.name for e in scripts), ['baz', 'foo', 'foo-admin'])
+        foo = [e for e in scripts if e.name == 'foo'][0]
+        self.assertEqual((foo.project_name, foo.version), ('Foo', '1.0'))
+        self.assertEqual(str(foo), 'foo = foo.cli:main')
+
+    def test_lookups(self):
+        plugin = self.index.by_name('bar')[0]
+        self.assertEqual(plugin.group, 'foo.plugins')
+        self.assertEqual(plugin.attrs, ('Plugin', 'create'))
+        self.assertEqual(plugin.extras, ('extra',))
+
+        self.assertEqual([e.name for e in self.index.by_module('foo.cli')], ['foo'])
+        self.assertEqual(self.index.by_name('bar', 'console_scripts'), [])
+        self.assertEqual(sorted(e.name for e in self.index.search('FOO', 'console_scripts')),
+                         ['foo', 'foo-admin'])
+        self.assertEqual(self.index.search('%', 'console_scripts'), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,37 @@
 import sys
 sys.path.insert(0, '.')
 
+import os
+import shutil
+import tempfile
 import unittest
 from stallion import main
+from stallion import storage
+from stallion import updates
 from xmlrpclib import ServerProxy
 import pkg_resources as _pkg_resources
 
+# The update checks of the views are written in a temporary data directory,
+# with a new store, instead of the user's '~/.stallion'
+_home = {}
+
+
+def setUpModule():
+    _home['dir'] = tempfile.mkdtemp()
+    _home['old'] = os.environ.get(storage.STALLION_HOME_ENV)
+    _home['store'] = main.UPDATE_STORE
+    os.environ[storage.STALLION_HOME_ENV] = _home['dir']
+    main.UPDATE_STORE = updates.UpdateStore()
+
+
+def tearDownModule():
+    main.UPDATE_STORE = _home['store']
+    if _home['old'] is None:
+        del os.environ[storage.STALLION_HOME_ENV]
+    else:
+        os.environ[storage.STALLION_HOME_ENV] = _home['old']
+    shutil.rmtree(_home['dir'])
+
 
 class TestMain(unittest.TestCase):
 
@@ -22,8 +48,89 @@ class TestMain(unittest.TestCase):
     def test_get_shared_data_instance_true(self):
         data = main.get_shared_data()
         self.assertTrue(isinstance(data, dict))
-        self.assertEqual(sorted(data.keys()), ['distributions', 'pypi_update_cache'])
+        self.assertEqual(sorted(data.keys()), ['distributions', 'update_store'])
 
     def test_get_pkg_res_instance_true(self):
         pkg = main.get_pkg_res()
         self.assertEqual(pkg, _pkg_resources)
+
+
+class TestDistributionsApi(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.app.test_client()
+
+    def get_json(self, url, status=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return main.json.loads(response.data)
+
+    def test_distributions_page(self):
+        total = len(main.get_dist_index())
+        data = self.get_json('/api/distributions?limit=2&offset=1')
+        self.assertEqual(data['total'], total)
+        self.assertEqual(data['offset'], 1)
+        self.assertEqual(len(data['distributions']), min(2, total - 1))
+
+        keys = [dist['key'] for dist in
+                self.get_json('/api/distributions?limit=1000')['distributions']]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_distributions_filter(self):
+        key = main.get_dist_index().distributions()[0].key
+        data = self.get_json('/api/distributions?match=prefix&filter=' + key.upper())
+        keys = [dist['key'] for dist in data['distributions']]
+        self.assertTrue(key in keys)
+        self.assertTrue(all(k.startswith(key) for k in keys))
+        self.assertEqual(data['distributions'][keys.index(key)]['url'],
+                         '/distribution/' + key)
+
+    def test_distributions_invalid(self):
+        self.get_json('/api/distributions?limit=0', 400)
+        self.get_json('/api/distributions?offset=x', 400)
+        self.get_json('/api/distributions?sort=size', 400)
+        self.get_json('/api/distributions?order=up', 400)
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.app.test_client()
+        main.PAGE_CACHE.clear()
+
+    def test_not_modified(self):
+        response = self.client.get('/about')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(main.get_dist_index().generation in etag)
+        self.assertTrue('Last-Modified' in response.headers)
+
+        response = self.client.get('/about', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.client.get('/about', headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_page_cache(self):
+        body = self.client.get('/about').data
+        self.assertEqual(len(main.PAGE_CACHE), 1)
+        self.assertEqual(self.client.get('/about').data, body)
+        self.assertEqual(main.PAGE_CACHE.stats()['hits'], 1)
+
+    def test_rescan_not_cached(self):
+        response = self.client.get('/about?rescan=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(main.PAGE_CACHE), 0)
+
+    def test_plain_text_description_not_cached(self):
+        dist = main.get_dist_index().distributions()[0]
+        render_distribution = main.render.render_distribution
+        main.render.render_distribution = lambda dist, distinfo: ('<pre>x</pre>', False)
+        try:
+            response = self.client.get('/distribution/%s' % dist.key)
+        finally:
+            main.render.render_distribution = render_distribution
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse('ETag' in response.headers)
+        self.assertEqual(len(main.PAGE_CACHE), 0)
@@ -1,10 +1,19 @@
 import sys
 sys.path.insert(0, '.')
 
+import os
+import shutil
+import tempfile
 import unittest
 
+import pkg_resources as _pkg_resources
+
 from stallion import __version__
 from stallion.metadata import parse_metadata, metadata_to_dict
+from stallion.metadata import get_distribution_metadata, METADATA_CACHE
+from stallion.metadata import clean_lead_ws_description, get_description
+from stallion.metadata import RAW_DESCRIPTION_KEY, LazyMetadata
+from stallion.metadata import metadata_name
 
 
 class Test_metadata(unittest.TestCase):
@@ -36,6 +45,95 @@ class Test_metadata(unittest.TestCase):
             'description': 'Jinja2\n~~~~~~\n\nJinja2 is a template engine written in pure Python.  It provides a\n`Django`_ inspired non-XML syntax but supports inline expressions and\nan optional `sandboxed`_ environment.\n\nNutshell\n--------\n\nHere a small example of a Jinja template::\n\n    {% extends \'base.html\' %}\n    {% block title %}Memberlist{% endblock %}\n    {% block content %}\n      <ul>\n      {% for user in users %}\n        <li><a href="{{ user.url }}">{{ user.username }}</a></li>\n      {% endfor %}\n      </ul>\n    {% endblock %}\n\nPhilosophy\n----------\n\nApplication logic is for the controller but don\'t try to make the life\nfor the template designer too hard by giving him too few functionality.\n\nFor more informations visit the new `Jinja2 webpage`_ and `documentation`_.\n\n.. _sandboxed: http://en.wikipedia.org/wiki/Sandbox_(computer_security)\n.. _Django: http://www.djangoproject.com/\n.. _Jinja2 webpage: http://jinja.pocoo.org/\n.. _documentation: http://jinja.pocoo.org/2/documentation/'
         }, ret)
 
+        parsed, key_known = parse_metadata(jinja_metadata)
+        lazy = metadata_to_dict(parsed, key_known, lazy_description=True)
+        self.assertFalse('description' in lazy)
+        self.assertTrue(RAW_DESCRIPTION_KEY in lazy)
+        self.assertEqual(get_description(lazy), ret['description'])
+        self.assertEqual(get_description(ret), ret['description'])
+
+    def test_clean_lead_ws_description(self):
+        description = '\n  \n    Title\n    =====\n\n    Text::\n\n        code\n  Odd\n    \n'
+        self.assertEqual(clean_lead_ws_description(description, 'description'),
+                         'Title\n=====\n\nText::\n\n    code\n  Odd')
+        self.assertEqual(clean_lead_ws_description('   \n\n', 'description'), '')
+        self.assertEqual(clean_lead_ws_description(' a\n  b ', 'summary'), 'a b')
+
+    def test_lazy_metadata(self):
+        pkg_metadata = 'Metadata-Version: 1.1\nName: Foo\nVersion: 1.0\nSummary: The\n  summary\n' \
+                       'Platform: Linux\nPlatform: Windows\nClassifier: Topic :: Utilities\n' \
+                       'Classifier: License :: OSI Approved\nDescription: Foo\n        ===\n' \
+                       '        \n        Text\nLicense: UNKNOWN\n'
+        lazy = LazyMetadata(pkg_metadata)
+        self.assertEqual(lazy['summary'], 'The summary')
+        self.assertFalse(lazy._done)
+        self.assertFalse('description' in lazy._processed)
+
+        self.assertEqual(lazy['platform'], ['Linux', 'Windows'])
+        self.assertTrue(lazy._done)
+        self.assertFalse('license' in lazy)
+        self.assertEqual(lazy.get('license', 'none'), 'none')
+        self.assertRaises(KeyError, lambda: lazy['keywords'])
+
+        parsed, key_known = parse_metadata(pkg_metadata)
+        self.assertEqual(lazy.to_dict(), metadata_to_dict(parsed, key_known))
+
+    def test_metadata_2x(self):
+        pkg_metadata = 'Metadata-Version: 2.4\nName: Foo\nVersion: 1.0\nSummary: Foo\n' \
+                       'License-Expression: MIT\nLicense-File: LICENSE\nLicense-File: NOTICE\n' \
+                       'Provides-Extra: test\nDescription-Content-Type: text/x-rst\n\n' \
+                       'Foo\n===\n\n    code\n'
+        parsed, key_known = parse_metadata(pkg_metadata)
+        self.assertTrue('license-expression' in key_known)
+        ret = metadata_to_dict(parsed, key_known)
+        self.assertEqual(ret['description'], 'Foo\n===\n\n    code')
+        self.assertEqual(ret['license-file'], ['LICENSE', 'NOTICE'])
+        self.assertEqual(LazyMetadata(pkg_metadata).to_dict(), ret)
+
+        lazy = metadata_to_dict(parsed, key_known, lazy_description=True)
+        self.assertEqual(get_description(lazy), ret['description'])
+
+    def test_dist_info_metadata(self):
+        site_dir = tempfile.mkdtemp()
+        try:
+            dist_info = os.path.join(site_dir, 'Foo-1.0.dist-info')
+            os.mkdir(dist_info)
+            f = open(os.path.join(dist_info, 'METADATA'), 'w')
+            f.write('Metadata-Version: 2.1\nName: Foo\nVersion: 1.0\nSummary: Wheel\n\nBody\n')
+            f.close()
+
+            dist = list(_pkg_resources.find_distributions(site_dir))[0]
+            self.assertEqual(metadata_name(dist), 'METADATA')
+            distinfo = get_distribution_metadata(dist)
+            self.assertEqual(distinfo['summary'], 'Wheel')
+            self.assertEqual(get_description(distinfo), 'Body')
+        finally:
+            shutil.rmtree(site_dir)
+
+    def test_distribution_metadata_cache(self):
+        site_dir = tempfile.mkdtemp()
+        try:
+            egg_info = os.path.join(site_dir, 'Foo-1.0.egg-info')
+            os.mkdir(egg_info)
+            pkg_info = os.path.join(egg_info, 'PKG-INFO')
+            f = open(pkg_info, 'w')
+            f.write('Metadata-Version: 1.0\nName: Foo\nVersion: 1.0\nSummary: First\n')
+            f.close()
+
+            dist = list(_pkg_resources.find_distributions(site_dir))[0]
+            METADATA_CACHE.clear()
+            self.assertEqual(get_distribution_metadata(dist)['summary'], 'First')
+            self.assertEqual(get_distribution_metadata(dist)['summary'], 'First')
+            self.assertEqual(METADATA_CACHE.hits, 1)
+
+            f = open(pkg_info, 'w')
+            f.write('Metadata-Version: 1.0\nName: Foo\nVersion: 1.0\nSummary: Reinstalled\n')
+            f.close()
+            os.utime(pkg_info, (0, 0))
+            self.assertEqual(get_distribution_metadata(dist)['summary'], 'Reinstalled')
+        finally:
+            shutil.rmtree(site_dir)
+
 if __name__ == '__main__':
     print("Stallion v.%s" % __version__)
     unittest.main()
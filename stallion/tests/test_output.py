@@ -0,0 +1,61 @@
+import sys
+sys.path.insert(0, '.')
+
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from stallion.output import OutputBuffer, get_writer
+
+
+class TestOutputBuffer(unittest.TestCase):
+
+    def test_buffered_writes(self):
+        stream = StringIO()
+        out = OutputBuffer(stream, bufsize=10, interval=60)
+        out.write('abc')
+        self.assertEqual(stream.getvalue(), '')
+        out.write('defghijk')
+        self.assertEqual(stream.getvalue(), 'abcdefghijk')
+        out.write('l')
+        out.flush()
+        self.assertEqual(stream.getvalue(), 'abcdefghijkl')
+
+
+class TestRecordWriters(unittest.TestCase):
+
+    records = [{'name': 'Foo', 'version': '1.0', 'platform': ['Linux', 'Windows']},
+               {'name': 'Bar', 'version': '2.0'}]
+
+    def write(self, output_format, fields=None, many=True):
+        stream = StringIO()
+        writer = get_writer(output_format, fields, many, stream)
+        for record in self.records[:2 if many else 1]:
+            writer.write(record)
+        writer.close()
+        return stream.getvalue()
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.write('json')), self.records)
+        self.assertEqual(json.loads(self.write('json', many=False)), self.records[0])
+
+    def test_ndjson(self):
+        lines = self.write('ndjson').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.records)
+
+    def test_csv(self):
+        self.assertEqual(self.write('csv', ('name', 'version', 'platform')),
+                         'name,version,platform\n'
+                         'Foo,1.0,"Linux, Windows"\n'
+                         'Bar,2.0,\n')
+
+if __name__ == '__main__':
+    unittest.main()
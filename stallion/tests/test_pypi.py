@@ -0,0 +1,114 @@
+import sys
+sys.path.insert(0, '.')
+
+import time
+import socket
+import unittest
+
+from stallion import pypi
+from stallion import backends
+
+
+class FakeProxy(object):
+
+    def __init__(self, calls, releases, failures):
+        self.calls = calls
+        self.releases = releases
+        self.failures = failures
+
+    def package_releases(self, dist_name, show_hidden):
+        self.calls.append(dist_name)
+        if len(self.calls) <= self.failures:
+            raise socket.error('connection reset')
+        return list(self.releases.get(dist_name, []))
+
+
+class TestReleaseFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        self.releases = {'Foo': ['0.9', '1.10', '1.2'], 'bar': ['2.0']}
+        self.get_proxy = backends.get_proxy
+        backends.get_proxy = lambda url, timeout: FakeProxy(self.calls, self.releases,
+                                                            self.failures)
+        self.fetcher = pypi.ReleaseFetcher(max_workers=2, retry_delay=0)
+
+    def tearDown(self):
+        backends.get_proxy = self.get_proxy
+
+    def test_releases_sorted_capitalized(self):
+        self.assertEqual(self.fetcher.releases('foo'), ['1.10', '1.2', '0.9'])
+        self.assertEqual(self.calls, ['foo', 'Foo'])
+
+    def test_releases_retry(self):
+        self.failures = 2
+        self.assertEqual(self.fetcher.releases('bar'), ['2.0'])
+        self.assertEqual(len(self.calls), 3)
+
+    def test_releases_retry_exhausted(self):
+        self.failures = 3
+        self.assertRaises(socket.error, self.fetcher.releases, 'bar')
+
+    def test_client_error_not_retried(self):
+        index = backends.FakeIndex()
+        calls = []
+
+        def releases(dist_name):
+            calls.append(dist_name)
+            raise backends.IndexUnavailable('https://mirror/simple/bar/', 403)
+
+        index.releases = releases
+        fetcher = pypi.ReleaseFetcher(index, retry_delay=0)
+        self.assertRaises(backends.IndexUnavailable, fetcher.releases, 'bar')
+        self.assertEqual(calls, ['bar'])
+
+    def test_fetch_many(self):
+        self.assertEqual(self.fetcher.fetch_many(['bar', 'baz']),
+                         {'bar': ['2.0'], 'baz': []})
+
+
+class TestReleaseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.index = backends.FakeIndex({'bar': ['2.0']})
+        self.calls = self.index.calls
+        self.cache = pypi.ReleaseCache(filename=None, ttl=60)
+
+    def test_cache_normalized_name(self):
+        self.cache.set('Foo_Bar', ['1.0'])
+        self.assertEqual(self.cache.get('foo.bar'), (['1.0'], False))
+        self.assertEqual(self.cache.get('baz'), None)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_cache_per_index(self):
+        class MirrorIndex(backends.FakeIndex):
+            location = 'simple+https://mirror/simple'
+
+        mirror_fetcher = pypi.ReleaseFetcher(MirrorIndex({'bar': ['9.0']}),
+                                             cache=self.cache)
+        fetcher = pypi.ReleaseFetcher(self.index, cache=self.cache)
+
+        self.assertEqual(mirror_fetcher.releases('bar'), ['9.0'])
+        self.assertEqual(fetcher.releases('bar'), ['2.0'])
+        self.assertEqual(self.cache.get('bar', 'simple+https://mirror/simple'),
+                         (['9.0'], False))
+
+    def test_fetcher_uses_cache(self):
+        fetcher = pypi.ReleaseFetcher(self.index, cache=self.cache, background=False)
+        self.assertEqual(fetcher.releases('bar'), ['2.0'])
+        self.assertEqual(fetcher.releases('bar'), ['2.0'])
+        self.assertEqual(self.calls, ['bar'])
+
+    def test_fetcher_stale_while_revalidate(self):
+        self.cache.ttl = 0
+        self.cache.set('bar', ['1.0'], self.index.location)
+        time.sleep(0.01)
+        fetcher = pypi.ReleaseFetcher(self.index, cache=self.cache)
+        self.assertEqual(fetcher.releases('bar'), ['1.0'])
+
+        for i in range(100):
+            if self.calls:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.calls, ['bar'])
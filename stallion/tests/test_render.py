@@ -0,0 +1,69 @@
+import sys
+sys.path.insert(0, '.')
+
+import time
+import unittest
+
+from stallion import render
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        render.RENDER_CACHE.clear()
+
+    def test_render_description_cached(self):
+        html, final = render.render_description(('foo', '1.0'),
+                                                'Title\n=====\n\nSome *text*.')
+        self.assertTrue(final)
+        self.assertTrue('<em>text</em>' in html)
+        self.assertEqual(render.RENDER_CACHE.get(('foo', '1.0')), html)
+
+    def test_render_invalid_plain_text(self):
+        html, final = render.render_description(('foo', '1.0'), 'Broken `link <\n\n<b>')
+        self.assertTrue(final)
+        self.assertTrue(html.startswith('<pre>'))
+        self.assertTrue('&lt;b&gt;' in html)
+
+    def test_render_timeout_plain_text(self):
+        publish_parts = render.publish_parts
+
+        def slow_publish(**kwargs):
+            time.sleep(0.2)
+            return publish_parts(**kwargs)
+
+        render.publish_parts = slow_publish
+        try:
+            html, final = render.render_description(('foo', '1.0'), 'Some *text*.',
+                                                    timeout=0.01)
+            self.assertEqual(html, '<pre>Some *text*.</pre>')
+            self.assertFalse(final)
+
+            time.sleep(0.4)
+            self.assertTrue('<em>text</em>' in render.RENDER_CACHE.get(('foo', '1.0')))
+        finally:
+            render.publish_parts = publish_parts
+
+    def test_render_timeout_single_thread(self):
+        publish_parts = render.publish_parts
+        calls = []
+
+        def slow_publish(**kwargs):
+            calls.append(kwargs['source'])
+            time.sleep(0.2)
+            return publish_parts(**kwargs)
+
+        render.publish_parts = slow_publish
+        try:
+            for i in range(3):
+                html, final = render.render_description(('foo', '1.0'), 'Some *text*.',
+                                                        timeout=0.01)
+                self.assertEqual((html, final), ('<pre>Some *text*.</pre>', False))
+
+            # The reloads wait for the rendering already running
+            html, final = render.render_description(('foo', '1.0'), 'Some *text*.',
+                                                    timeout=None)
+            self.assertTrue('<em>text</em>' in html)
+            self.assertEqual(len(calls), 1)
+        finally:
+            render.publish_parts = publish_parts
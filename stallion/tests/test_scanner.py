@@ -0,0 +1,102 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stallion import updates
+from stallion.distindex import DistributionIndex
+from stallion.scanner import UpdateScanner, SCAN_LEASE
+from stallion.updates import UpdateStore
+from helpers import make_egg_info
+
+
+class FakeFetcher(object):
+    def __init__(self):
+        self.fetched = []
+
+    def fetch(self, dist_name):
+        self.fetched.append(dist_name)
+        if dist_name == 'Broken':
+            raise IOError('connection refused')
+        return ['2.0', '1.0']
+
+
+class ForgetfulStore(UpdateStore):
+    def record_many(self, checks):
+        return []
+
+
+class TestUpdateScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.site_dir = tempfile.mkdtemp()
+        make_egg_info(self.site_dir, 'Foo', '1.0')
+        make_egg_info(self.site_dir, 'Broken', '1.0')
+
+        self.fetcher = FakeFetcher()
+        self.store = UpdateStore(filename=None)
+        self.index = DistributionIndex([self.site_dir])
+        self.scanner = UpdateScanner(self.fetcher, self.store, self.index,
+                                     interval=3600, jitter=0, retry_delay=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.site_dir)
+
+    def test_scan(self):
+        self.assertEqual(self.scanner.scan(), 2)
+        self.assertEqual(sorted(self.fetcher.fetched), ['Broken', 'Foo'])
+        self.assertEqual(self.store.get('foo').status, updates.STATUS_OUTDATED)
+        self.assertEqual(self.store.get('broken').status, updates.STATUS_ERROR)
+
+        # Nothing is due until the failed check is retried
+        self.assertEqual(self.scanner.scan(), 0)
+        self.assertTrue(59 < self.scanner.next_wait() <= 60)
+
+    def test_backoff(self):
+        self.scanner.scan()
+        checked = self.store.get('broken').checked
+
+        due, next_check = self.scanner.schedule(checked + 61)
+        self.assertEqual([dist.key for dist in due], ['broken'])
+
+        self.store.record('Broken', '1.0', None, IOError())
+        self.store.record('Broken', '1.0', None, IOError())
+        state = self.store.get('broken')
+        self.assertEqual(self.scanner.check_delay(state), 240)
+        self.assertEqual(self.scanner.schedule(state.checked + 61)[0], [])
+
+        self.scanner.max_retry_delay = 100
+        self.assertEqual(self.scanner.check_delay(state), 100)
+
+    def test_upgraded(self):
+        self.scanner.scan()
+        shutil.rmtree(os.path.join(self.site_dir, 'Foo-1.0.egg-info'))
+        make_egg_info(self.site_dir, 'Foo', '2.0')
+        self.index.refresh(force=True)
+
+        # The installed version changed, it is checked again
+        due = self.scanner.schedule()[0]
+        self.assertEqual([dist.key for dist in due], ['foo'])
+
+    def test_lease(self):
+        self.assertTrue(self.store.acquire_lease(SCAN_LEASE, 'other', 60))
+        self.assertEqual(self.scanner.scan(), 0)
+        self.assertEqual(self.fetcher.fetched, [])
+
+        self.store.release_lease(SCAN_LEASE, 'other')
+        self.assertEqual(self.scanner.scan(), 2)
+        # The lease is released after the round
+        self.assertTrue(self.store.acquire_lease(SCAN_LEASE, 'other', 60))
+
+    def test_forgetful_store(self):
+        # The checks are lost, the scanner stops instead of checking all
+        # the packages again on every round
+        self.scanner.store = ForgetfulStore(filename=None)
+        self.scanner.run()
+        self.assertEqual(sorted(self.fetcher.fetched), ['Broken', 'Foo'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import signal
+import threading
+import unittest
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+from stallion import server
+from stallion.server import ThreadPoolWSGIServer
+
+
+def hello_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    if environ['PATH_INFO'] == '/multithread':
+        return [str(environ['wsgi.multithread']).encode('utf-8')]
+    return [threading.current_thread().name.encode('utf-8')]
+
+
+class TestThreadPoolWSGIServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadPoolWSGIServer('127.0.0.1', 0, hello_app, threads=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pool_threads(self):
+        url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        names = set(urlopen(url).read() for i in range(6))
+        # The requests are served by the pool, not by a thread per request
+        self.assertTrue(1 <= len(names) <= 2)
+        self.assertTrue(self.server._started)
+
+    def test_multithread(self):
+        url = 'http://127.0.0.1:%d/multithread' % self.server.server_address[1]
+        self.assertEqual(urlopen(url).read(), b'True')
+
+
+class TestServeWerkzeug(unittest.TestCase):
+
+    def setUp(self):
+        self.old_constants = (server.RESTART_DELAY, server.MAX_WORKER_FAILURES)
+        self.old_handler = signal.getsignal(signal.SIGTERM)
+        server.RESTART_DELAY = 0.01
+        server.MAX_WORKER_FAILURES = 3
+
+    def tearDown(self):
+        server.RESTART_DELAY, server.MAX_WORKER_FAILURES = self.old_constants
+        signal.signal(signal.SIGTERM, self.old_handler)
+
+    @unittest.skipIf(not hasattr(os, 'fork'), 'requires os.fork')
+    def test_failing_workers(self):
+        def worker_init():
+            raise RuntimeError('broken worker')
+
+        # The workers that die right after they start aren't restarted
+        # forever, the server stops
+        self.assertRaises(SystemExit, server.serve_werkzeug, hello_app,
+                          '127.0.0.1', 0, 2, 1, worker_init)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from stallion import storage
+from stallion.snapshot import DistributionSnapshot, SnapshotRecord
+from helpers import make_egg_info
+
+
+class TestDistributionSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.home_dir = tempfile.mkdtemp()
+        self.site_dir = tempfile.mkdtemp()
+        self.old_home = os.environ.get(storage.STALLION_HOME_ENV)
+        os.environ[storage.STALLION_HOME_ENV] = self.home_dir
+        make_egg_info(self.site_dir, 'Foo', '1.0')
+        self.snapshot = DistributionSnapshot('test.db', [self.site_dir])
+
+    def tearDown(self):
+        if self.old_home is None:
+            del os.environ[storage.STALLION_HOME_ENV]
+        else:
+            os.environ[storage.STALLION_HOME_ENV] = self.old_home
+        shutil.rmtree(self.home_dir)
+        shutil.rmtree(self.site_dir)
+
+    def test_records_persisted(self):
+        records = self.snapshot.records()
+        self.assertEqual([str(r) for r in records], ['Foo 1.0'])
+        self.assertEqual(records[0].distinfo['name'], 'Foo')
+        self.assertTrue(os.path.exists(os.path.join(self.home_dir, 'test.db')))
+
+        warm = DistributionSnapshot('test.db', [self.site_dir]).records()
+        self.assertEqual([str(r) for r in warm], ['Foo 1.0'])
+
+    def test_non_ascii_metadata(self):
+        egg_info = make_egg_info(self.site_dir, 'Bar', '1.0')
+        f = open(os.path.join(egg_info, 'PKG-INFO'), 'wb')
+        f.write(u'Metadata-Version: 1.0\nName: Bar\nVersion: 1.0\n'
+                u'Summary: Caf\xe9 tools\nAuthor: J\xfcrgen\n'.encode('utf-8'))
+        f.close()
+
+        distinfo = dict((str(r), r.distinfo)
+                        for r in self.snapshot.records())['Bar 1.0']
+        self.assertEqual(distinfo['summary'], u'Caf\xe9 tools')
+        self.assertEqual(distinfo['author'], u'J\xfcrgen')
+
+    def test_records_changed_entry(self):
+        self.snapshot.records()
+        make_egg_info(self.site_dir, 'Bar', '2.0')
+        os.utime(self.site_dir, (time.time() + 10, time.time() + 10))
+
+        calls = []
+        # The descriptor is restored, not the bound classmethod
+        original = SnapshotRecord.__dict__['from_distribution']
+        from_distribution = SnapshotRecord.from_distribution
+
+        def counting(dist, metadata_key, distinfo=None):
+            calls.append(dist.key)
+            return from_distribution(dist, metadata_key, distinfo)
+
+        SnapshotRecord.from_distribution = staticmethod(counting)
+        try:
+            records = self.snapshot.records()
+        finally:
+            SnapshotRecord.from_distribution = original
+
+        self.assertEqual(sorted(str(r) for r in records), ['Bar 2.0', 'Foo 1.0'])
+        self.assertEqual(calls, ['bar'])
+        self.assertTrue(isinstance(SnapshotRecord.__dict__['from_distribution'],
+                                   classmethod))
+
+    def test_records_jobs(self):
+        for i in range(10):
+            make_egg_info(self.site_dir, 'Pkg%d' % i, '1.%d' % i)
+
+        serial = self.snapshot.records(rebuild=True)
+        parallel = self.snapshot.records(rebuild=True, jobs=3)
+        self.assertEqual([str(r) for r in parallel], [str(r) for r in serial])
+        self.assertEqual([r.distinfo for r in parallel],
+                         [r.distinfo for r in serial])
+
+    def test_iter_records_match(self):
+        make_egg_info(self.site_dir, 'Bar', '2.0')
+        match = lambda project_name: project_name.startswith('B')
+
+        calls = []
+        # The descriptor is restored, not the bound classmethod
+        original = SnapshotRecord.__dict__['from_distribution']
+        from_distribution = SnapshotRecord.from_distribution
+
+        def counting(dist, metadata_key, distinfo=None):
+            calls.append(dist.key)
+            return from_distribution(dist, metadata_key, distinfo)
+
+        SnapshotRecord.from_distribution = staticmethod(counting)
+        try:
+            records = list(self.snapshot.iter_records(match=match))
+        finally:
+            SnapshotRecord.from_distribution = original
+
+        self.assertEqual([str(r) for r in records], ['Bar 2.0'])
+        self.assertEqual(calls, ['bar'])
+
+        # A filtered scan doesn't store the entry, the next one does
+        self.assertEqual(sorted(str(r) for r in self.snapshot.records()),
+                         ['Bar 2.0', 'Foo 1.0'])
+        records = list(self.snapshot.iter_records(match=match))
+        self.assertEqual([str(r) for r in records], ['Bar 2.0'])
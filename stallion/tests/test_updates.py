@@ -0,0 +1,107 @@
+import sys
+sys.path.insert(0, '.')
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stallion import storage
+from stallion import updates
+from stallion.updates import UpdateStore
+
+
+class FakeDist(object):
+    def __init__(self, key, version):
+        self.key = key
+        self.version = version
+
+
+class TestCheckStatus(unittest.TestCase):
+
+    def test_check_status(self):
+        self.assertEqual(updates.check_status('1.0', ['1.1', '1.0']), updates.STATUS_OUTDATED)
+        self.assertEqual(updates.check_status('1.0', ['1.0']), updates.STATUS_UP_TO_DATE)
+        self.assertEqual(updates.check_status('1.1', ['1.0']), updates.STATUS_NEWER)
+        self.assertEqual(updates.check_status('1.0', []), updates.STATUS_NOT_FOUND)
+        self.assertEqual(updates.check_status('1.0', None, IOError()), updates.STATUS_ERROR)
+
+
+class TestUpdateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.home_dir = tempfile.mkdtemp()
+        self.old_home = os.environ.get(storage.STALLION_HOME_ENV)
+        os.environ[storage.STALLION_HOME_ENV] = self.home_dir
+        self.store = UpdateStore('test.db', reload_interval=0)
+
+    def tearDown(self):
+        if self.old_home is None:
+            del os.environ[storage.STALLION_HOME_ENV]
+        else:
+            os.environ[storage.STALLION_HOME_ENV] = self.old_home
+        shutil.rmtree(self.home_dir)
+
+    def test_record(self):
+        state = self.store.record('Foo_Bar', '1.0', ['1.1', '1.0'])
+        self.assertEqual(state.key, 'foo-bar')
+        self.assertEqual(state.latest, '1.1')
+        self.assertEqual(state.status, updates.STATUS_OUTDATED)
+        self.assertEqual(self.store.get('foo-bar'), state)
+        self.assertEqual(self.store.outdated(), {'foo-bar': '1.0'})
+        self.assertTrue(self.store.has_update(FakeDist('foo-bar', '1.0')))
+        # The update was found for another installed version
+        self.assertFalse(self.store.has_update(FakeDist('foo-bar', '1.1')))
+
+        self.store.record('Foo_Bar', '1.1', ['1.1', '1.0'])
+        self.assertEqual(self.store.outdated(), {})
+
+    def test_failures(self):
+        self.store.record('Foo', '1.0', ['2.0'])
+        self.store.record('Foo', '1.0', None, IOError('timed out'))
+        state = self.store.record('Foo', '1.0', None, IOError('timed out'))
+        self.assertEqual(state.status, updates.STATUS_ERROR)
+        self.assertEqual(state.failures, 2)
+        # The latest version known is kept, and so is the badge
+        self.assertEqual(state.latest, '2.0')
+        self.assertEqual(self.store.outdated(), {'foo': '1.0'})
+
+        state = self.store.record('Foo', '1.0', ['2.0'])
+        self.assertEqual(state.failures, 0)
+
+    def test_shared(self):
+        other = UpdateStore('test.db', reload_interval=0)
+        self.assertEqual(other.outdated(), {})
+
+        self.store.record_many([('Foo', '1.0', ['2.0'], None),
+                                ('Bar', '1.0', ['1.0'], None)])
+        self.assertEqual(other.outdated(), {'foo': '1.0'})
+        self.assertEqual(sorted(other.states()), ['bar', 'foo'])
+
+        other.record('Bar', '1.0', ['1.5'])
+        self.assertEqual(self.store.outdated(), {'bar': '1.0', 'foo': '1.0'})
+        self.assertEqual(self.store.stats()['status'][updates.STATUS_OUTDATED], 2)
+
+        other.clear()
+        self.assertEqual(self.store.states(), {})
+
+    def test_memory_only(self):
+        store = UpdateStore(filename=None)
+        store.record('Foo', '1.0', ['2.0'])
+        self.assertEqual(store.outdated(), {'foo': '1.0'})
+        self.assertFalse(os.path.exists(os.path.join(self.home_dir, 'test.db')))
+
+    def test_not_writable(self):
+        # The data directory can't be created under a file
+        os.environ[storage.STALLION_HOME_ENV] = os.path.join(self.home_dir, 'file', 'home')
+        with open(os.path.join(self.home_dir, 'file'), 'w') as f:
+            f.write('')
+
+        store = UpdateStore('test.db', reload_interval=0)
+        store.record('Foo', '1.0', ['2.0'])
+        self.assertFalse(store.persistent)
+        self.assertEqual(store.outdated(), {'foo': '1.0'})
+        self.assertEqual(sorted(store.states()), ['foo'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import sys
+sys.path.insert(0, '.')
+
+import unittest
+
+from stallion.workers import imap_unordered, map_processes
+
+
+def square(value):
+    if value < 0:
+        raise ValueError('negative')
+    return value * value
+
+
+class TestWorkers(unittest.TestCase):
+
+    def test_imap_unordered_results(self):
+        results = dict((item, result) for item, result, error
+                       in imap_unordered(square, range(20), max_workers=4))
+        self.assertEqual(results, dict((i, i * i) for i in range(20)))
+
+    def test_imap_unordered_errors(self):
+        results = list(imap_unordered(square, [-1], max_workers=4))
+        self.assertEqual(results[0][0], -1)
+        self.assertTrue(isinstance(results[0][2], ValueError))
+
+    def test_imap_unordered_empty(self):
+        self.assertEqual(list(imap_unordered(square, [])), [])
+
+    def test_map_processes(self):
+        self.assertEqual(map_processes(square, range(20), processes=3),
+                         [i * i for i in range(20)])
+        self.assertEqual(map_processes(square, []), [])
@@ -0,0 +1,428 @@
+"""
+.. module:: updates
+   :platform: Unix, Windows
+   :synopsis: Shared state of the update checks.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`updates` -- shared state of the update checks
+==================================================================
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from stallion import storage
+
+log = logging.getLogger(__name__)
+
+# The outcomes of an update check, in the order of the plp reports
+STATUS_OUTDATED = 'outdated'
+STATUS_UP_TO_DATE = 'up-to-date'
+STATUS_NEWER = 'newer'
+STATUS_NOT_FOUND = 'not found'
+STATUS_ERROR = 'error'
+
+CHECK_STATUS = (STATUS_OUTDATED, STATUS_UP_TO_DATE, STATUS_NEWER,
+                STATUS_NOT_FOUND, STATUS_ERROR)
+
+
+def dist_key(dist_name):
+    """ Returns the key of a distribution name, the same key of the
+    pkg_resources.Distribution.
+
+    :param dist_name: the distribution name
+    :rtype: string
+    """
+    import pkg_resources
+    return pkg_resources.safe_name(dist_name).lower()
+
+
+def check_status(version, releases, error=None):
+    """ Returns the outcome of an update check.
+
+    :param version: the installed version
+    :param releases: the sorted releases of the index, the latest first
+    :param error: the lookup error, if any
+    :rtype: string
+    :return: one of the :data:`CHECK_STATUS`
+    """
+    if error is not None:
+        return STATUS_ERROR
+    if not releases:
+        return STATUS_NOT_FOUND
+
+    import pkg_resources
+    last_version = pkg_resources.parse_version(releases[0])
+    current_version = pkg_resources.parse_version(version)
+    if last_version > current_version:
+        return STATUS_OUTDATED
+    elif last_version == current_version:
+        return STATUS_UP_TO_DATE
+    return STATUS_NEWER
+
+
+class UpdateState(namedtuple('UpdateState', 'key name version latest status '
+                                            'error checked failures')):
+    """ The result of the last update check of a distribution: the
+    installed "version" when it was checked, the "latest" version known
+    (kept across failed checks), the "status" (one of the
+    :data:`CHECK_STATUS`), the "error" message, the "checked" timestamp
+    and the number of consecutive "failures".
+    """
+    __slots__ = ()
+
+    @property
+    def outdated(self):
+        """ True if the latest known version is newer than the checked one. """
+        if self.status == STATUS_ERROR and self.latest is not None:
+            return check_status(self.version, [self.latest]) == STATUS_OUTDATED
+        return self.status == STATUS_OUTDATED
+
+
+class UpdateStore(object):
+    """ The state of the update checks of the installed distributions
+    (see the :class:`UpdateState`). It is kept in memory and in a sqlite
+    database inside the Stallion data directory, so it survives restarts
+    and is shared by the Stallion workers and the plp console.
+
+    Each check is written in its own transaction, and a serial number
+    incremented by every write tells the other processes to reload it.
+    When the data directory isn't writable, the state is kept in memory
+    only (see the :attr:`persistent`).
+    """
+    def __init__(self, filename='updates.db', reload_interval=1.0):
+        """ Instantiates a new store.
+
+        :param filename: the database file name, None to keep the
+                         state in memory only
+        :param reload_interval: minimum seconds between two checks of
+                                the writes done by other processes
+        """
+        self.filename = filename
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._states = {}
+        self._outdated = {}
+        self._serial = None
+        self._reloaded = 0
+        self._leases = {}
+        self._created = filename is None
+
+    @property
+    def persistent(self):
+        """ True if the state is kept in the database, False if it is kept
+        in memory only: when the filename is None, or when the data directory
+        isn't writable and the storage falls back to an in-memory database,
+        which would be a new empty one on each connection. """
+        if not self._created:
+            self._create()
+        return self.filename is not None
+
+    def _create(self):
+        with self._lock:
+            if self._created:
+                return
+            conn = storage.connect(self.filename)
+            try:
+                # The main database has no file when it is in memory
+                if not conn.execute('PRAGMA database_list').fetchone()[2]:
+                    log.warning('Unable to write the %s database, the update '
+                                'checks are kept in memory only', self.filename)
+                    self.filename = None
+                else:
+                    # The processes starting together create the serial
+                    # row only once
+                    conn.isolation_level = None
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute('CREATE TABLE IF NOT EXISTS updates ('
+                                 '  key TEXT PRIMARY KEY, name TEXT,'
+                                 '  version TEXT, latest TEXT, status TEXT,'
+                                 '  error TEXT, checked REAL, failures INTEGER)')
+                    conn.execute('CREATE TABLE IF NOT EXISTS serial '
+                                 '(serial INTEGER)')
+                    if conn.execute('SELECT serial FROM serial').fetchone() is None:
+                        conn.execute('INSERT INTO serial VALUES (0)')
+                    conn.execute('CREATE TABLE IF NOT EXISTS leases ('
+                                 '  name TEXT PRIMARY KEY, owner TEXT,'
+                                 '  expires REAL)')
+                    conn.execute('COMMIT')
+            finally:
+                conn.close()
+            self._created = True
+
+    def _connect(self):
+        conn = storage.connect(self.filename)
+        # The transactions are explicit, see the :meth:`_write`
+        conn.isolation_level = None
+        return conn
+
+    def _set_state(self, state):
+        self._states[state.key] = state
+        if state.outdated:
+            self._outdated[state.key] = state.version
+        else:
+            self._outdated.pop(state.key, None)
+
+    def _reload(self, force=False):
+        """ Reloads the states if another process changed them. """
+        if not self.persistent:
+            return
+
+        now = time.time()
+        if not force and now - self._reloaded < self.reload_interval:
+            return
+
+        conn = self._connect()
+        try:
+            serial = conn.execute('SELECT serial FROM serial').fetchone()[0]
+            if not force and serial == self._serial:
+                self._reloaded = now
+                return
+            rows = conn.execute('SELECT key, name, version, latest, status,'
+                                ' error, checked, failures FROM updates').fetchall()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._states = {}
+            self._outdated = {}
+            for row in rows:
+                self._set_state(UpdateState(*row))
+            self._serial = serial
+            self._reloaded = now
+
+    def _next_state(self, previous, dist_name, version, releases, error, checked):
+        status = check_status(version, releases, error)
+        key = dist_key(dist_name)
+
+        if status != STATUS_ERROR:
+            latest = releases[0] if releases else None
+            return UpdateState(key, dist_name, version, latest, status,
+                               None, checked, 0)
+
+        # A failed check keeps the latest version known, unless it was
+        # checked for another installed version
+        latest = None
+        failures = 1
+        if previous is not None:
+            failures = previous.failures + 1
+            if previous.version == version:
+                latest = previous.latest
+        return UpdateState(key, dist_name, version, latest, status,
+                           str(error), checked, failures)
+
+    def _write(self, checks):
+        """ Writes the results of the checks in a single transaction,
+        each one is a (dist_name, version, releases, error) tuple.
+
+        :rtype: list
+        :return: the new states
+        """
+        checked = time.time()
+
+        if not self.persistent:
+            with self._lock:
+                states = []
+                for dist_name, version, releases, error in checks:
+                    state = self._next_state(self._states.get(dist_key(dist_name)),
+                                             dist_name, version, releases,
+                                             error, checked)
+                    self._set_state(state)
+                    states.append(state)
+                return states
+
+        conn = self._connect()
+        try:
+            # The write lock is taken before the previous states are read,
+            # so the failure counts of concurrent writers add up
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                states = []
+                for dist_name, version, releases, error in checks:
+                    row = conn.execute('SELECT key, name, version, latest,'
+                                       ' status, error, checked, failures'
+                                       ' FROM updates WHERE key = ?',
+                                       (dist_key(dist_name),)).fetchone()
+                    previous = UpdateState(*row) if row is not None else None
+                    state = self._next_state(previous, dist_name, version,
+                                             releases, error, checked)
+                    conn.execute('INSERT OR REPLACE INTO updates VALUES'
+                                 ' (?, ?, ?, ?, ?, ?, ?, ?)', state)
+                    states.append(state)
+                serial = conn.execute('SELECT serial FROM serial').fetchone()[0]
+                conn.execute('UPDATE serial SET serial = ?', (serial + 1,))
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        with self._lock:
+            for state in states:
+                self._set_state(state)
+            # The states in memory are still complete only if no other
+            # process wrote since they were loaded
+            if serial == self._serial:
+                self._serial = serial + 1
+            else:
+                self._reloaded = 0
+
+        return states
+
+    def record(self, dist_name, version, releases, error=None):
+        """ Records the result of an update check.
+
+        :param dist_name: the distribution name
+        :param version: the installed version
+        :param releases: the sorted releases of the index, the latest first
+        :param error: the lookup error, if the check failed
+        :rtype: UpdateState
+        :return: the new state of the distribution
+        """
+        return self._write([(dist_name, version, releases, error)])[0]
+
+    def record_many(self, checks):
+        """ Records the results of many update checks at once.
+
+        :param checks: an iterable of (dist_name, version, releases, error)
+        :rtype: list
+        :return: the new states
+        """
+        checks = list(checks)
+        if not checks:
+            return []
+        return self._write(checks)
+
+    def get(self, dist_name):
+        """ Returns the state of a distribution.
+
+        :param dist_name: the distribution name
+        :rtype: UpdateState
+        :return: the state, None if it was never checked
+        """
+        self._reload()
+        return self._states.get(dist_key(dist_name))
+
+    def states(self):
+        """ Returns the states of all the checked distributions.
+
+        :rtype: dict
+        :return: dictionary mapping the distribution keys to the states
+        """
+        self._reload()
+        with self._lock:
+            return dict(self._states)
+
+    def outdated(self):
+        """ Returns the distributions with an update available, a compact
+        map used to show the update badges without any PyPI lookup.
+
+        :rtype: dict
+        :return: dictionary mapping the distribution keys to the installed
+                 version they were checked for
+        """
+        self._reload()
+        with self._lock:
+            return dict(self._outdated)
+
+    def has_update(self, dist):
+        """ Returns True if the last check of an installed distribution
+        found an update for the installed version.
+
+        :param dist: the pkg_resources.Distribution
+        :rtype: bool
+        """
+        self._reload()
+        return self._outdated.get(dist.key) == dist.version
+
+    def acquire_lease(self, name, owner, duration):
+        """ Acquires (or renews) a named lease, only one owner at a time
+        holds it, until it is released or it expires. The processes sharing
+        the store use it to split the work.
+
+        :param name: the lease name
+        :param owner: the owner identifier, unique for each process
+        :param duration: seconds before the lease expires
+        :rtype: bool
+        :return: True if the owner holds the lease
+        """
+        now = time.time()
+
+        if not self.persistent:
+            with self._lock:
+                holder = self._leases.get(name)
+                if holder is not None and holder[0] != owner and holder[1] > now:
+                    return False
+                self._leases[name] = (owner, now + duration)
+                return True
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT owner, expires FROM leases'
+                                   ' WHERE name = ?', (name,)).fetchone()
+                acquired = row is None or row[0] == owner or row[1] <= now
+                if acquired:
+                    conn.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)',
+                                 (name, owner, now + duration))
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        return acquired
+
+    def release_lease(self, name, owner):
+        """ Releases a lease held by the owner (see :meth:`acquire_lease`).
+
+        :param name: the lease name
+        :param owner: the owner identifier
+        """
+        if not self.persistent:
+            with self._lock:
+                if self._leases.get(name, (None,))[0] == owner:
+                    del self._leases[name]
+            return
+
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?',
+                         (name, owner))
+        finally:
+            conn.close()
+
+    def clear(self):
+        """ Removes the state of all the distributions. """
+        if self.persistent:
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('DELETE FROM updates')
+                conn.execute('UPDATE serial SET serial = serial + 1')
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+
+        with self._lock:
+            self._states = {}
+            self._outdated = {}
+            self._reloaded = 0
+
+    def stats(self):
+        """ Returns the store statistics.
+
+        :rtype: dict
+        :return: dictionary with the number of checked distributions and
+                 the count of each status
+        """
+        states = self.states()
+        counts = dict((status, 0) for status in CHECK_STATUS)
+        for state in states.values():
+            counts[state.status] += 1
+        return {'size': len(states), 'status': counts}
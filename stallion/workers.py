@@ -0,0 +1,97 @@
+"""
+.. module:: workers
+   :platform: Unix, Windows
+   :synopsis: Bounded thread and process pools for the Stallion calls.
+
+.. moduleauthor:: Christian S. Perone <christian.perone@gmail.com>
+
+:mod:`workers` -- bounded thread and process pools
+==================================================================
+"""
+import threading
+import multiprocessing
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+def imap_unordered(func, items, max_workers=8):
+    """ Calls the function for each item using at most max_workers threads
+    and yields the results as soon as each call finishes. The exceptions
+    raised by the function are yielded instead of propagated.
+
+    :param func: the function, called with a single item
+    :param items: the items
+    :param max_workers: the maximum number of concurrent calls
+    :rtype: generator
+    :return: yields (item, result, exception) tuples, in completion order
+    """
+    items = list(items)
+    if not items:
+        return
+
+    tasks = queue.Queue()
+    results = queue.Queue()
+    stop = threading.Event()
+
+    for item in items:
+        tasks.put(item)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                item = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                results.put((item, func(item), None))
+            except Exception as exc:
+                results.put((item, None, exc))
+
+    for i in range(min(max_workers, len(items))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for i in range(len(items)):
+            yield results.get()
+    finally:
+        # The consumer may stop early (ie. a closed connection)
+        stop.set()
+
+
+def map_processes(func, items, processes=None, chunksize=None):
+    """ Calls the function for each item using a pool of processes, for the
+    CPU bound calls. The function and the items must be picklable.
+
+    :param func: a module level function, called with a single item
+    :param items: the items
+    :param processes: the number of processes, None for the number of CPUs
+    :param chunksize: the number of items sent to a process at once, if None
+                      the items are split in 4 chunks per process
+    :rtype: list
+    :return: the results, in the items order
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    processes = min(processes or multiprocessing.cpu_count(), len(items))
+    if chunksize is None:
+        chunksize = max(1, len(items) // (processes * 4))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(func, items, chunksize)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return results